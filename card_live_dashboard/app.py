@@ -1,3 +1,5 @@
+from concurrent.futures import ThreadPoolExecutor
+import uuid
 from os import getcwd
 from pathlib import Path
 from typing import Union
@@ -7,9 +9,15 @@ import flask
 
 import card_live_dashboard.callbacks as callbacks
 import card_live_dashboard.layouts as layouts
+import card_live_dashboard.model as model
 import card_live_dashboard.routes as routes
+import card_live_dashboard.serialization as serialization
+from card_live_dashboard.service.AdmissionController import AdmissionController
 from card_live_dashboard.service.CardLiveDataManager import CardLiveDataManager
 from card_live_dashboard.service.ConfigManager import ConfigManager
+from card_live_dashboard.service.RequestCoalescer import RequestCoalescer
+from card_live_dashboard.service.RequestGenerations import RequestGenerations
+from card_live_dashboard.service.ResponseCompressor import ResponseCompressor
 
 DEFAULT_CARD_LIVE_HOME = Path(getcwd())
 
@@ -37,14 +45,80 @@ def build_app(card_live_home: Path = DEFAULT_CARD_LIVE_HOME) -> dash.dash.Dash:
                     external_stylesheets=layouts.external_stylesheets,
                     url_base_pathname=config['url_base_pathname'])
 
-    CardLiveDataManager.create_instance(card_live_home)
+    serialization.install(app)
 
-    app.layout = layouts.default_layout(config['url_base_pathname'])
+    model.set_world_cache_dir(card_live_home / 'db')
+
+    background_load = config['startup']['background_load']
+    compact_taxonomy = config['taxonomy']['in_memory']
+    trimmed_taxonomy = config['taxonomy']['trimmed']
+    CardLiveDataManager.create_instance(card_live_home, background_load=background_load,
+                                        compact_taxonomy=compact_taxonomy, trimmed_taxonomy=trimmed_taxonomy)
+
+    figure_building_config = config['figure_building']
+    if figure_building_config['parallel']:
+        executor = ThreadPoolExecutor(max_workers=figure_building_config['workers'], thread_name_prefix='figures')
+    else:
+        executor = None
+
+    world_geojson_url = app.get_relative_path(routes.WORLD_GEOJSON_PATH)
+
+    def serve_layout():
+        # Built on each page load so that the initial state is for the current data
+        manager = CardLiveDataManager.get_instance()
+        data_version = manager.data_version
+        if data_version is None:
+            return layouts.default_layout(config['url_base_pathname'], session_id=uuid.uuid4().hex,
+                                          loading_status=layouts.loading_message(manager.status()))
+
+        state = callbacks.initial_state(data_version, world_geojson_url, executor)
+        return layouts.default_layout(config['url_base_pathname'], initial_state=state,
+                                      session_id=uuid.uuid4().hex)
+
+    app.layout = serve_layout
     app.title = 'CARD:Live Dashboard'
-    callbacks.build_callbacks(app)
+
+    coalescing_config = config['request_coalescing']
+    if coalescing_config['enabled']:
+        lock_dir = card_live_home / 'run' / 'coalescing' if coalescing_config['per_host'] else None
+        coalescer = RequestCoalescer(timeout=coalescing_config['timeout'], lock_dir=lock_dir)
+    else:
+        coalescer = None
+
+    cancellation_config = config['request_cancellation']
+    if cancellation_config['enabled']:
+        state_dir = card_live_home / 'run' / 'sessions' if cancellation_config['per_host'] else None
+        generations = RequestGenerations(state_dir=state_dir)
+    else:
+        generations = None
+
+    admission_config = config['admission_control']
+    if admission_config['enabled']:
+        lock_dir = card_live_home / 'run' / 'admission' if admission_config['per_host'] else None
+        admission = AdmissionController(max_running=admission_config['max_running'],
+                                        max_waiting=admission_config['max_waiting'],
+                                        wait_timeout=admission_config['wait_timeout'],
+                                        retry_after=admission_config['retry_after'],
+                                        lock_dir=lock_dir)
+    else:
+        admission = None
+
+    callbacks.build_callbacks(app, coalescer=coalescer, executor=executor, generations=generations,
+                              admission=admission)
 
     routes.create_flask_routes(app.server, config['url_base_pathname'], card_live_data_dir)
 
+    compression_config = config['response_compression']
+    if compression_config['enabled']:
+        static_paths = [app.get_relative_path(f'/{app.config.assets_url_path}/'),
+                        app.get_relative_path('/_dash-component-suites/'),
+                        app.get_relative_path(routes.WORLD_GEOJSON_PATH)]
+        compressor = ResponseCompressor(min_size=compression_config['min_size'], static_paths=static_paths,
+                                        static_max_age=compression_config['static_max_age'])
+        # Compresses the Dash bundles and assets used by the dashboard page now (before forking workers, if preloading
+        # the application) so that they are not compressed on first request in each worker
+        compressor.init_app(app.server, precompress_pages=[app.get_relative_path('/')])
+
     return app
 
 
@@ -1,14 +1,28 @@
+import logging
 import re
+import threading
+import time
+from concurrent.futures import Executor, Future
 from datetime import datetime, timedelta
-from typing import List, Set, Dict
+from typing import Any, Callable, List, Optional, Set, Dict, Tuple, Union
 
 import dash
+import plotly.graph_objects as go
 from dash.dependencies import Input, Output, State
+from werkzeug.exceptions import ServiceUnavailable
 
 import card_live_dashboard.layouts.figures as figures
-from card_live_dashboard.model import world
+from card_live_dashboard.layouts import loading_message
+from card_live_dashboard.routes import WORLD_GEOJSON_PATH
 from card_live_dashboard.model.CardLiveData import CardLiveData
+from card_live_dashboard.service.AdmissionController import AdmissionController, Overloaded
 from card_live_dashboard.service.CardLiveDataManager import CardLiveDataManager
+from card_live_dashboard.service.DataVersion import DataVersion
+from card_live_dashboard.service.RequestCoalescer import RequestCoalescer
+from card_live_dashboard.service.RecentResults import RecentResults
+from card_live_dashboard.service.RequestGenerations import RequestCancelled, RequestGenerations
+
+logger = logging.getLogger(__name__)
 
 DAY = timedelta(days=1)
 WEEK = timedelta(days=7)
@@ -17,18 +31,139 @@ THREE_MONTHS = timedelta(days=365 / 4)  # 3 months is defined as a quarter year
 SIX_MONTHS = timedelta(days=365 / 2)  # 6 months is defined as half a year
 YEAR = timedelta(days=365)
 
+TIME_PERIODS = {
+    'day': DAY,
+    'week': WEEK,
+    'month': MONTH,
+    '3 months': THREE_MONTHS,
+    '6 months': SIX_MONTHS,
+    'year': YEAR,
+}
+
 ORGANISM_COLUMN = {
     'lmat': 'lmat_taxonomy',
     'rgi_kmer': 'rgi_kmer_taxonomy',
 }
 
+# The figures in the main pane, in the order of the outputs of the main dashboard callback
+MAIN_PANE_FIGURES = ['map', 'timeline', 'totals', 'rgi', 'intersections']
+
+# The number of outputs of the main dashboard callback before the figures
+MAIN_PANE_NON_FIGURE_OUTPUTS = 12
+
+# The outputs of the main dashboard callback, as 'component-id.property'
+MAIN_OUTPUTS = [
+    'global-sample-count.children',
+    'global-most-recent.children',
+    'time-period-items.options',
+    'date-picker-range.min_date_allowed',
+    'date-picker-range.max_date_allowed',
+    'organism-select.options',
+    'selected-samples-count.children',
+    'sample-count-figure.children',
+    'drug-class-select.options',
+    'amr-gene-family-select.options',
+    'resistance-mechanism-select.options',
+    'amr-gene-select.options',
+    'figure-geographic-map-id.figure',
+    'figure-timeline-id.figure',
+    'figure-totals-id.figure',
+    'figure-rgi-id.figure',
+    'figure-rgi-intersections.figure',
+    'dashboard-status.children',
+    'dashboard-applied.data',
+]
+
+# Displayed when showing the dashboard for a different selection because the server is too busy
+STALE_DASHBOARD_STATUS = 'Server busy: showing results for a similar selection'
+
+# The values of the inputs of the main dashboard callback in the default layout (except for the end date, which is the
+# current date when the initial state of the dashboard is built, see initial_state())
+DEFAULT_INPUTS = dict(rgi_cutoff_select='all',
+                      drug_classes=None,
+                      amr_gene_families=None,
+                      resistance_mechanisms=None,
+                      amr_genes=None,
+                      organism_identification_method='lmat',
+                      organism=None,
+                      time_dropdown='all',
+                      start_date=None,
+                      end_date=None,
+                      timeline_type_select='cumulative_counts',
+                      timeline_color_select='default',
+                      totals_type_select='geographic',
+                      totals_color_select='default',
+                      rgi_type_select='drug_class',
+                      rgi_color_select='default',
+                      rgi_intersection_type_select='drug_class')
+
+# How long the initial state of the dashboard can be reused for the same data, since some values
+# (e.g., the counts of samples in the last day) depend on the current time
+INITIAL_STATE_MAX_AGE = timedelta(minutes=5)
+
+# Inputs of the main dashboard callback which only change how a single figure is displayed (not which samples are
+# selected), mapped to the figure they change
+FIGURE_SETTINGS_INPUTS = {
+    'timeline_type_select': 'timeline',
+    'timeline_color_select': 'timeline',
+    'totals_type_select': 'totals',
+    'totals_color_select': 'totals',
+    'rgi_type_select': 'rgi',
+    'rgi_color_select': 'rgi',
+    'rgi_intersection_type_select': 'intersections',
+}
+
+# Top-level layout properties which are only defined for some settings of a figure, so have to be
+# removed when patching a figure which does not define them
+OPTIONAL_LAYOUT_PROPERTIES = ['annotations', 'legend', 'xaxis2', 'yaxis2']
 
-def build_callbacks(app: dash.dash.Dash) -> None:
+
+def build_callbacks(app: dash.dash.Dash, coalescer: RequestCoalescer = None, executor: Executor = None,
+                    generations: RequestGenerations = None, admission: AdmissionController = None) -> None:
     """
     Builds and sets up all callbacks for the passed dash app.
     :param app: The Dash app to setup callbacks for.
+    :param coalescer: An (optional) RequestCoalescer used to coalesce identical concurrent requests.
+    :param executor: An (optional) Executor used to build the figures concurrently.
+    :param generations: An (optional) RequestGenerations used to stop computations for requests superseded by a newer
+                        request in the same session.
+    :param admission: An (optional) AdmissionController used to limit how many dashboards are built at once. When
+                      the server is too busy, the most similar recently built dashboard is shown instead (or the
+                      request is rejected if there is none).
     :return: None.
     """
+    # The map geometry is served separately so the browser only downloads it once
+    world_geojson_url = app.get_relative_path(WORLD_GEOJSON_PATH)
+
+    recent_results = RecentResults() if admission is not None else None
+
+    @app.callback(
+        [Output('data-loading-status', 'children'),
+         Output('data-loading-ready', 'data')],
+        [Input('data-loading-interval', 'n_intervals')],
+        prevent_initial_call=True
+    )
+    def update_data_loading_status(n_intervals):
+        manager = CardLiveDataManager.get_instance()
+        if manager.data_version is None:
+            return loading_message(manager.status()), False
+        else:
+            return 'The CARD:Live data has loaded, reloading the page.', True
+
+    # Reloads the page (in the browser) once the data has loaded so the whole dashboard is displayed
+    app.clientside_callback(
+        """
+        function(ready) {
+            if (ready) {
+                window.location.reload();
+            }
+            return ready;
+        }
+        """,
+        Output('data-loading-interval', 'disabled'),
+        [Input('data-loading-ready', 'data')],
+        prevent_initial_call=True
+    )
 
     @app.callback(
         Output('rgi-parameters', 'is_open'),
@@ -67,24 +202,10 @@ def build_callbacks(app: dash.dash.Dash) -> None:
     def toggle_custom_time_period(time_period_items):
         return time_period_items == 'custom'
 
+    # The initial state of the dashboard is part of the layout (see initial_state()), so the main callback is only
+    # called once the user changes a selection
     @app.callback(
-        [Output('global-sample-count', 'children'),
-         Output('global-most-recent', 'children'),
-         Output('time-period-items', 'options'),
-         Output('date-picker-range', 'min_date_allowed'),
-         Output('date-picker-range', 'max_date_allowed'),
-         Output('organism-select', 'options'),
-         Output('selected-samples-count', 'children'),
-         Output('sample-count-figure', 'children'),
-         Output('drug-class-select', 'options'),
-         Output('amr-gene-family-select', 'options'),
-         Output('resistance-mechanism-select', 'options'),
-         Output('amr-gene-select', 'options'),
-         Output('figure-geographic-map-id', 'figure'),
-         Output('figure-timeline-id', 'figure'),
-         Output('figure-totals-id', 'figure'),
-         Output('figure-rgi-id', 'figure'),
-         Output('figure-rgi-intersections', 'figure')],
+        [Output(*prop_id.split('.')) for prop_id in MAIN_OUTPUTS],
         [Input('rgi-cutoff-select', 'value'),
          Input('drug-class-select', 'value'),
          Input('amr-gene-family-select', 'value'),
@@ -101,7 +222,10 @@ def build_callbacks(app: dash.dash.Dash) -> None:
          Input('totals-color-select', 'value'),
          Input('rgi-type-select', 'value'),
          Input('rgi-color-select', 'value'),
-         Input('rgi-intersection-type-select', 'value')]
+         Input('rgi-intersection-type-select', 'value')],
+        [State('session-id', 'data'),
+         State('dashboard-applied', 'data')],
+        prevent_initial_call=True
     )
     def update_all_figures(rgi_cutoff_select: str, drug_classes: List[str],
                            amr_gene_families: List[str], resistance_mechanisms: List[str],
@@ -110,7 +234,7 @@ def build_callbacks(app: dash.dash.Dash) -> None:
                            timeline_type_select: str, timeline_color_select: str,
                            totals_type_select: str, totals_color_select: str,
                            rgi_type_select: str, rgi_color_select: str,
-                           rgi_intersection_type_select: str):
+                           rgi_intersection_type_select: str, session_id: str, applied: Dict[str, Any]):
         """
         Main callback/controller for updating all figures based on user selections.
         :param rgi_cutoff_select: The selected RGI cutoff ('all' for all values).
@@ -119,96 +243,402 @@ def build_callbacks(app: dash.dash.Dash) -> None:
         :param time_dropdown: The time selection.
         :param timeline_type_select: The selection for the timeline type.
         :param timeline_color_select: The color selection for the timeline.
+        :param session_id: The id of the browser session (page load) making the request.
+        :param applied: The data version and selections the displayed dashboard was built for (see applied_state()).
         :return: The figures to place in the main figure region of the page.
         """
-        data = CardLiveDataManager.get_instance().card_data
-        global_samples_count = len(data)
-        global_last_updated = f'{data.latest_update(): %b %d, %Y}'
+        # Captured once so the whole request reads from one version of the data, even if new data is loaded meanwhile
+        data_version = CardLiveDataManager.get_instance().data_version
+        if data_version is None:
+            # The data is still loading, the page is reloaded once it has loaded
+            raise dash.exceptions.PreventUpdate
+        data = data_version.data
+        inputs = dict(rgi_cutoff_select=rgi_cutoff_select,
+                      drug_classes=drug_classes,
+                      amr_gene_families=amr_gene_families,
+                      resistance_mechanisms=resistance_mechanisms,
+                      amr_genes=amr_genes,
+                      organism_identification_method=organism_identification_method,
+                      organism=organism,
+                      time_dropdown=time_dropdown,
+                      start_date=start_date,
+                      end_date=end_date,
+                      timeline_type_select=timeline_type_select,
+                      timeline_color_select=timeline_color_select,
+                      totals_type_select=totals_type_select,
+                      totals_color_select=totals_color_select,
+                      rgi_type_select=rgi_type_select,
+                      rgi_color_select=rgi_color_select,
+                      rgi_intersection_type_select=rgi_intersection_type_select)
+
+        # Stops building the dashboard once the user has made a newer selection (the browser would discard the result)
+        checkpoint = generations.start(session_id) if generations is not None else None
+
+        # If only the settings of figures differ from the displayed dashboard, only those figures need to be updated.
+        # This compares against what is displayed rather than what triggered the callback, since the browser drops
+        # the results (and triggers) of requests superseded by a newer request.
+        figure_names = figures_to_update(applied, data_version.key, inputs)
+        if figure_names is not None and len(figure_names) == 0:
+            raise dash.exceptions.PreventUpdate
+        elif figure_names is None:
+            def build():
+                return build_dashboard(data, world=world_geojson_url, executor=executor, checkpoint=checkpoint,
+                                       **inputs)
+        else:
+            def build():
+                return build_figure_updates(data, world=world_geojson_url, figure_names=figure_names,
+                                            executor=executor, checkpoint=checkpoint, **inputs)
+
+        if admission is not None:
+            build_unlimited = build
+
+            def build():
+                return admission.run(build_unlimited)
+
+        key = request_key(data_version, inputs, figure_names)
+        try:
+            if coalescer is None:
+                result = build()
+            else:
+                result = coalescer.run(key=key, func=build)
+        except RequestCancelled as e:
+            logger.debug(f'Cancelled dashboard update: {e}')
+            raise dash.exceptions.PreventUpdate
+        except Overloaded as e:
+            # Update requests are only rejected (with a 503 and Retry-After) if there is no recent dashboard to show.
+            # A dashboard for other selections is marked with a status and recorded as applied for those selections,
+            # so the next update rebuilds the whole dashboard instead of patching its figures.
+            data_key, selections, _ = key
+            nearest = recent_results.nearest(data_key, selections)
+            if nearest is None:
+                logger.warning(f'Rejected dashboard update, server is overloaded: {e}')
+                raise ServiceUnavailable(retry_after=admission.retry_after)
+            else:
+                logger.warning(f'Showing a recent dashboard instead of updating, server is overloaded: {e}')
+                nearest_selections, nearest_result = nearest
+                status = '' if nearest_selections == selections else STALE_DASHBOARD_STATUS
+                return nearest_result + (status, applied_state(data_key, nearest_selections))
+
+        # Only whole dashboards can be shown in place of another (figure updates are patches of the displayed figures)
+        data_key, selections, _ = key
+        if recent_results is not None and figure_names is None:
+            recent_results.add(data_key, selections, result)
+
+        return result + ('', applied_state(data_key, selections))
+
+
+_initial_state_lock = threading.Lock()
+_initial_state_cache = None
+
+
+def initial_state(data_version: DataVersion, world: Union[str, Dict], executor: Executor = None) -> Dict[str, Any]:
+    """
+    Gets the initial state of the dashboard (the values of the outputs of the main dashboard callback for the default
+    selections), which is included in the layout sent to the browser so that the dashboard can be displayed without
+    waiting for the main callback. The state is built once for each version of the data and reused for all page loads
+    (for up to INITIAL_STATE_MAX_AGE).
+    :param data_version: The version of the data to build the dashboard from.
+    :param world: The region geometry for the map, as GeoJSON or a URL to the GeoJSON.
+    :param executor: An (optional) Executor used to build the figures concurrently.
+    :return: A dictionary mapping 'component-id.property' to the initial value of the property (including the end
+             date of the date picker the state was built for).
+    """
+    global _initial_state_cache
+
+    now = datetime.now()
+    inputs = {**DEFAULT_INPUTS, 'end_date': f'{now:%Y-%m-%d}'}
+    key = request_key(data_version, inputs)
+
+    # Concurrent page loads for the same data wait on the same state instead of each building it, while page loads for
+    # other data are not held up by it
+    with _initial_state_lock:
+        cached = _initial_state_cache
+        if cached is not None and cached[0] == key and now - cached[1] < INITIAL_STATE_MAX_AGE:
+            future = None
+        else:
+            future = Future()
+            _initial_state_cache = (key, now, future)
+
+    if future is None:
+        return cached[2].result()
+
+    try:
+        values = build_dashboard(data_version.data, world=world, executor=executor, **inputs)
+        state = dict(zip(MAIN_OUTPUTS, values))
+        state['date-picker-range.end_date'] = inputs['end_date']
+        state['dashboard-applied.data'] = applied_state(key[0], key[1])
+        future.set_result(state)
+    except Exception as e:
+        future.set_exception(e)
+        with _initial_state_lock:
+            if _initial_state_cache is not None and _initial_state_cache[2] is future:
+                _initial_state_cache = None
+        raise
+
+    return state
+
+
+def applied_state(data_key: Tuple, selections: Tuple) -> Dict[str, Any]:
+    """
+    Builds the record of the data version and selections a dashboard was built for, which is stored in the browser
+    with the dashboard (as JSON) and passed back with the next update (see figures_to_update()).
+    :param data_key: The key of the version of the data the dashboard was built from (DataVersion.key).
+    :param selections: The selections the dashboard was built for (as in the key from request_key()).
+    :return: A dictionary of the data key and the inputs of the main dashboard callback.
+    """
+    return {
+        'data': list(data_key),
+        'inputs': {name: list(value) if isinstance(value, tuple) else value for name, value in selections},
+    }
 
-        min_date_allowed = data.first_update()
-        max_date_allowed = datetime.now()
 
-        custom_date = {
-            'start': min_date_allowed,
-            'end': max_date_allowed
-        }
+def figures_to_update(applied: Optional[Dict[str, Any]], data_key: Tuple,
+                      inputs: Dict[str, Any]) -> Optional[Set[str]]:
+    """
+    Gets the figures to update if only the settings of figures (e.g., what to color by) differ from the displayed
+    dashboard.
+    :param applied: The data version and selections the displayed dashboard was built for (from applied_state()), or
+                    None if unknown.
+    :param data_key: The key of the version of the data to update the dashboard from (DataVersion.key).
+    :param inputs: The inputs of the main dashboard callback.
+    :return: The names of the figures to update (empty if nothing differs), or None if the data or anything other than
+             the settings of figures differ (meaning the whole dashboard has to be updated).
+    """
+    if applied is None or applied.get('data') != list(data_key):
+        return None
+
+    applied_inputs = applied.get('inputs', {})
+    changed = [name for name, value in inputs.items() if name not in applied_inputs or applied_inputs[name] != value]
+    if any(name not in FIGURE_SETTINGS_INPUTS for name in changed):
+        return None
+    else:
+        return {FIGURE_SETTINGS_INPUTS[name] for name in changed}
+
+
+def request_key(data_version: DataVersion, inputs: Dict[str, Any], figure_names: Set[str] = None) -> Tuple:
+    """
+    Builds a key identifying a dashboard request, used to coalesce identical concurrent requests.
+    The key is built only from plain values so it is the same across processes.
+    :param data_version: The version of the data the request is computed on.
+    :param inputs: The user selections from the dashboard.
+    :param figure_names: The names of the figures being updated, or None if the whole dashboard is being updated.
+    :return: A tuple identifying the request.
+    """
+    data_key = data_version.key
+    selections = tuple((name, tuple(value) if isinstance(value, list) else value)
+                       for name, value in sorted(inputs.items()))
+    updated = tuple(sorted(figure_names)) if figure_names is not None else None
+    return data_key, selections, updated
+
+
+def build_dashboard(data: CardLiveData, world: Union[str, Dict], rgi_cutoff_select: str, drug_classes: List[str],
+                    amr_gene_families: List[str], resistance_mechanisms: List[str],
+                    amr_genes: List[str], organism_identification_method: str, organism: str,
+                    time_dropdown: str, start_date: str, end_date: str,
+                    timeline_type_select: str, timeline_color_select: str,
+                    totals_type_select: str, totals_color_select: str,
+                    rgi_type_select: str, rgi_color_select: str,
+                    rgi_intersection_type_select: str, executor: Executor = None,
+                    checkpoint: Callable[[], None] = None) -> Tuple:
+    """
+    Builds all the values (counts, selection options and figures) displayed on the dashboard for the user selections.
+    :param data: The CardLiveData to build the dashboard from.
+    :param world: The region geometry for the map, as GeoJSON or a URL to the GeoJSON.
+    :param executor: An (optional) Executor used to build the figures concurrently.
+    :param checkpoint: An (optional) function called between stages of building the dashboard, which raises an
+                       exception to stop building the dashboard (e.g., when the request was cancelled).
+    :return: A tuple of the values, in the order of the outputs of the main dashboard callback.
+    """
+    global_samples_count = len(data)
+    global_last_updated = f'{data.latest_update(): %b %d, %Y}'
+
+    min_date_allowed = data.first_update()
+    max_date_allowed = datetime.now()
+
+    custom_date = build_custom_date(min_date_allowed, max_date_allowed, start_date, end_date)
+
+    time_subsets = apply_filters(data=data,
+                                 rgi_cutoff_select=rgi_cutoff_select,
+                                 drug_classes=drug_classes,
+                                 amr_gene_families=amr_gene_families,
+                                 resistance_mechanisms=resistance_mechanisms,
+                                 amr_genes=amr_genes,
+                                 custom_date=custom_date,
+                                 checkpoint=checkpoint)
+
+    # I have to extract the list of available organism options prior to filtering the data by the selected organism
+    # Otherwise once a user selects an organism there will be no other options available
+    category_index = data.category_index
+    organism_column = ORGANISM_COLUMN[organism_identification_method]
+    organism_options = category_index.options(organism_column, time_subsets[time_dropdown].main_df.index,
+                                              selected_options=[organism])
+
+    time_subsets = apply_organism_filter(time_subsets=time_subsets,
+                                         organism_identification_method=organism_identification_method,
+                                         organism=organism)
+    if checkpoint is not None:
+        checkpoint()
+
+    fig_settings = build_fig_settings(timeline_type_select=timeline_type_select,
+                                      timeline_color_select=timeline_color_select,
+                                      totals_type_select=totals_type_select,
+                                      totals_color_select=totals_color_select,
+                                      rgi_type_select=rgi_type_select,
+                                      rgi_color_select=rgi_color_select,
+                                      organism_identification_method=organism_identification_method,
+                                      rgi_intersection_type_select=rgi_intersection_type_select)
+
+    main_pane_figures = build_main_pane(time_subsets[time_dropdown], organism_identification_method, fig_settings,
+                                        world, executor=executor, checkpoint=checkpoint)
+
+    # Set time dropdown text to include count of samples in particular time period
+    # Should produce a list of dictionaries like [{'label': 'All (500)', 'value': 'all'}, ...]
+    time_dropdown_text = [{'label': f'All ({time_subsets["all"].samples_count()})', 'value': 'all'}]
+    for value in ['day', 'week', 'month', '3 months', '6 months', 'year']:
+        time_dropdown_text.append({
+            'label': f'Last {value} ({time_subsets[value].samples_count()})',
+            'value': value,
+        })
+    time_dropdown_text.append({'label': 'Custom', 'value': 'custom'})
+
+    selected_samples_count_string = f'{time_subsets[time_dropdown].samples_count()}'
+    samples_count_string = f'{selected_samples_count_string}/{global_samples_count}'
+
+    if checkpoint is not None:
+        checkpoint()
+
+    selected_files = time_subsets[time_dropdown].main_df.index
+    drug_class_options = category_index.options('drug_class', selected_files, rgi_cutoff_select,
+                                                selected_options=drug_classes)
+    amr_gene_families_options = category_index.options('amr_gene_family', selected_files, rgi_cutoff_select,
+                                                       selected_options=amr_gene_families)
+    resistance_mechanisms_options = category_index.options('resistance_mechanism', selected_files,
+                                                           rgi_cutoff_select,
+                                                           selected_options=resistance_mechanisms)
+    amr_gene_options = category_index.options('amr_gene', selected_files, rgi_cutoff_select,
+                                              selected_options=amr_genes)
+
+    return (global_samples_count,
+            global_last_updated,
+            time_dropdown_text,
+            min_date_allowed,
+            max_date_allowed,
+            organism_options,
+            samples_count_string,
+            selected_samples_count_string,
+            drug_class_options,
+            amr_gene_families_options,
+            resistance_mechanisms_options,
+            amr_gene_options,
+            main_pane_figures['map'],
+            main_pane_figures['timeline'],
+            main_pane_figures['totals'],
+            main_pane_figures['rgi'],
+            main_pane_figures['intersections'])
+
+
+def build_figure_updates(data: CardLiveData, world: Union[str, Dict], figure_names: Set[str],
+                         rgi_cutoff_select: str, drug_classes: List[str],
+                         amr_gene_families: List[str], resistance_mechanisms: List[str],
+                         amr_genes: List[str], organism_identification_method: str, organism: str,
+                         time_dropdown: str, start_date: str, end_date: str,
+                         timeline_type_select: str, timeline_color_select: str,
+                         totals_type_select: str, totals_color_select: str,
+                         rgi_type_select: str, rgi_color_select: str,
+                         rgi_intersection_type_select: str, executor: Executor = None,
+                         checkpoint: Callable[[], None] = None) -> Tuple:
+    """
+    Builds updates for only the passed figures, used when only the settings of these figures were changed (so the
+    selected samples and all other values displayed on the dashboard stay the same).
+    :param data: The CardLiveData to build the figures from.
+    :param world: The region geometry for the map, as GeoJSON or a URL to the GeoJSON.
+    :param figure_names: The names of the figures to update.
+    :param executor: An (optional) Executor used to build the figures concurrently.
+    :param checkpoint: An (optional) function called between stages of building the figures, which raises an
+                       exception to stop building the figures (e.g., when the request was cancelled).
+    :return: A tuple of the values, in the order of the outputs of the main dashboard callback. Values which do not
+             change are dash.no_update and the updated figures are patches of the figures displayed in the browser.
+    """
+    custom_date = build_custom_date(data.first_update(), datetime.now(), start_date, end_date)
+    selected_data = select_data(data=data,
+                                rgi_cutoff_select=rgi_cutoff_select,
+                                drug_classes=drug_classes,
+                                amr_gene_families=amr_gene_families,
+                                resistance_mechanisms=resistance_mechanisms,
+                                amr_genes=amr_genes,
+                                time_period=time_dropdown,
+                                custom_date=custom_date,
+                                organism_identification_method=organism_identification_method,
+                                organism=organism)
+
+    fig_settings = build_fig_settings(timeline_type_select=timeline_type_select,
+                                      timeline_color_select=timeline_color_select,
+                                      totals_type_select=totals_type_select,
+                                      totals_color_select=totals_color_select,
+                                      rgi_type_select=rgi_type_select,
+                                      rgi_color_select=rgi_color_select,
+                                      organism_identification_method=organism_identification_method,
+                                      rgi_intersection_type_select=rgi_intersection_type_select)
+
+    updated_figures = build_main_pane_figures([name for name in MAIN_PANE_FIGURES if name in figure_names],
+                                              selected_data, fig_settings, world, executor=executor,
+                                              checkpoint=checkpoint)
+
+    figure_updates = []
+    for name in MAIN_PANE_FIGURES:
+        if name in updated_figures:
+            figure_updates.append(build_figure_patch(updated_figures[name]))
+        else:
+            figure_updates.append(dash.no_update)
+
+    return tuple([dash.no_update] * MAIN_PANE_NON_FIGURE_OUTPUTS + figure_updates)
+
+
+def build_figure_patch(fig: go.Figure) -> Union[dash.Patch, go.Figure]:
+    """
+    Builds a patch replacing the data and layout of a figure displayed in the browser, except for the layout template
+    (which is the same for all figures so does not have to be sent again).
+    :param fig: The new figure.
+    :return: The patch, or the figure itself if it has no data (in which case it is small enough to send whole).
+    """
+    if len(fig.data) == 0:
+        return fig
+
+    fig_json = fig.to_plotly_json()
+    layout = fig_json['layout']
+
+    patch = dash.Patch()
+    patch['data'] = fig_json['data']
+    for key, value in layout.items():
+        if key != 'template':
+            patch['layout'][key] = value
+    for key in OPTIONAL_LAYOUT_PROPERTIES:
+        if key not in layout:
+            del patch['layout'][key]
+
+    return patch
+
+
+def build_custom_date(min_date: datetime, max_date: datetime, start_date: str, end_date: str) -> Dict[str, datetime]:
+    """
+    Builds the custom time period selected by the user.
+    :param min_date: The start of the time period if no start date is selected.
+    :param max_date: The end of the time period if no end date is selected.
+    :param start_date: The selected start date (as a string), or None.
+    :param end_date: The selected end date (as a string), or None.
+    :return: A dictionary with the 'start' and 'end' of the time period.
+    """
+    custom_date = {
+        'start': min_date,
+        'end': max_date
+    }
 
-        if start_date is not None:
-            start_date = datetime.strptime(re.split(r'[T ]', start_date)[0], '%Y-%m-%d')
-            custom_date['start'] = start_date
-        if end_date is not None:
-            end_date = datetime.strptime(re.split(r'[T ]', end_date)[0], '%Y-%m-%d')
-            custom_date['end'] = end_date
-
-        time_subsets = apply_filters(data=data,
-                                     rgi_cutoff_select=rgi_cutoff_select,
-                                     drug_classes=drug_classes,
-                                     amr_gene_families=amr_gene_families,
-                                     resistance_mechanisms=resistance_mechanisms,
-                                     amr_genes=amr_genes,
-                                     custom_date=custom_date)
-
-        # I have to extract the list of available organism options prior to filtering the data by the selected organism
-        # Otherwise once a user selects an organism there will be no other options available
-        organism_column = ORGANISM_COLUMN[organism_identification_method]
-        organism_options = build_options([organism],
-                                         time_subsets[time_dropdown].unique_column(organism_column))
-
-        time_subsets = apply_organism_filter(time_subsets=time_subsets,
-                                             organism_identification_method=organism_identification_method,
-                                             organism=organism)
-
-        fig_settings = build_fig_settings(timeline_type_select=timeline_type_select,
-                                          timeline_color_select=timeline_color_select,
-                                          totals_type_select=totals_type_select,
-                                          totals_color_select=totals_color_select,
-                                          rgi_type_select=rgi_type_select,
-                                          rgi_color_select=rgi_color_select,
-                                          organism_identification_method=organism_identification_method,
-                                          rgi_intersection_type_select=rgi_intersection_type_select)
-
-        main_pane_figures = build_main_pane(time_subsets[time_dropdown], organism_identification_method, fig_settings)
-
-        # Set time dropdown text to include count of samples in particular time period
-        # Should produce a list of dictionaries like [{'label': 'All (500)', 'value': 'all'}, ...]
-        time_dropdown_text = [{'label': f'All ({time_subsets["all"].samples_count()})', 'value': 'all'}]
-        for value in ['day', 'week', 'month', '3 months', '6 months', 'year']:
-            time_dropdown_text.append({
-                'label': f'Last {value} ({time_subsets[value].samples_count()})',
-                'value': value,
-            })
-        time_dropdown_text.append({'label': 'Custom', 'value': 'custom'})
-
-        selected_samples_count_string = f'{time_subsets[time_dropdown].samples_count()}'
-        samples_count_string = f'{selected_samples_count_string}/{global_samples_count}'
-
-        drug_class_options = build_options(drug_classes,
-                                           time_subsets[time_dropdown].rgi_parser.all_drugs())
-        amr_gene_families_options = build_options(amr_gene_families,
-                                                  time_subsets[time_dropdown].rgi_parser.all_amr_gene_family())
-        resistance_mechanisms_options = build_options(resistance_mechanisms,
-                                                      time_subsets[
-                                                          time_dropdown].rgi_parser.all_resistance_mechanisms())
-        amr_gene_options = build_options(amr_genes,
-                                         time_subsets[time_dropdown].rgi_parser.all_amr_genes())
-
-        return (global_samples_count,
-                global_last_updated,
-                time_dropdown_text,
-                min_date_allowed,
-                max_date_allowed,
-                organism_options,
-                samples_count_string,
-                selected_samples_count_string,
-                drug_class_options,
-                amr_gene_families_options,
-                resistance_mechanisms_options,
-                amr_gene_options,
-                main_pane_figures['map'],
-                main_pane_figures['timeline'],
-                main_pane_figures['totals'],
-                main_pane_figures['rgi'],
-                main_pane_figures['intersections'])
+    if start_date is not None:
+        custom_date['start'] = datetime.strptime(re.split(r'[T ]', start_date)[0], '%Y-%m-%d')
+    if end_date is not None:
+        custom_date['end'] = datetime.strptime(re.split(r'[T ]', end_date)[0], '%Y-%m-%d')
+
+    return custom_date
 
 
 def build_fig_settings(timeline_type_select: str, timeline_color_select: str, totals_type_select: str,
@@ -237,32 +667,78 @@ def build_fig_settings(timeline_type_select: str, timeline_color_select: str, to
 def apply_filters(data: CardLiveData, rgi_cutoff_select: str,
                   drug_classes: List[str], amr_gene_families: List[str],
                   resistance_mechanisms: List[str], amr_genes: List[str],
-                  custom_date: Dict[str, datetime]) -> Dict[str, CardLiveData]:
+                  custom_date: Dict[str, datetime],
+                  checkpoint: Callable[[], None] = None) -> Dict[str, CardLiveData]:
     time_now = datetime.now()
 
-    data = data.select(table='rgi', by='cutoff', type='row', level=rgi_cutoff_select) \
+    data = apply_rgi_filters(data=data,
+                             rgi_cutoff_select=rgi_cutoff_select,
+                             drug_classes=drug_classes,
+                             amr_gene_families=amr_gene_families,
+                             resistance_mechanisms=resistance_mechanisms,
+                             amr_genes=amr_genes)
+
+    time_subsets = {'all': data}
+    for time_period in TIME_PERIODS:
+        if checkpoint is not None:
+            checkpoint()
+        time_subsets[time_period] = select_time_period(data, time_period, custom_date, time_now)
+    time_subsets['custom'] = select_time_period(data, 'custom', custom_date, time_now)
+
+    return time_subsets
+
+
+def apply_rgi_filters(data: CardLiveData, rgi_cutoff_select: str,
+                      drug_classes: List[str], amr_gene_families: List[str],
+                      resistance_mechanisms: List[str], amr_genes: List[str]) -> CardLiveData:
+    return data.select(table='rgi', by='cutoff', type='row', level=rgi_cutoff_select) \
         .select(table='rgi', by='drug', type='file', elements=drug_classes) \
         .select(table='rgi', by='amr_gene_family', type='file', elements=amr_gene_families) \
         .select(table='rgi', by='resistance_mechanism', type='file', elements=resistance_mechanisms) \
         .select(table='rgi', by='amr_gene', type='file', elements=amr_genes)
 
-    time_subsets = {
-        'all': data,
-        'day': data.select(table='main', by='time', start=time_now - DAY, end=time_now),
-        'week': data.select(table='main', by='time', start=time_now - WEEK, end=time_now),
-        'month': data.select(table='main', by='time', start=time_now - MONTH, end=time_now),
-        '3 months': data.select(table='main', by='time', start=time_now - THREE_MONTHS, end=time_now),
-        '6 months': data.select(table='main', by='time', start=time_now - SIX_MONTHS, end=time_now),
-        'year': data.select(table='main', by='time', start=time_now - YEAR, end=time_now),
-    }
 
-    if custom_date is not None:
-        time_subsets['custom'] = data.select(table='main', by='time', start=custom_date['start'],
-                                             end=custom_date['end'])
+def select_time_period(data: CardLiveData, time_period: str, custom_date: Dict[str, datetime],
+                       time_now: datetime) -> CardLiveData:
+    """
+    Selects the data in a time period.
+    :param data: The data.
+    :param time_period: The time period ('all', 'custom' or one of TIME_PERIODS).
+    :param custom_date: The time period to use for 'custom' (or None to select all data).
+    :param time_now: The current time.
+    :return: The data in the time period.
+    """
+    if time_period == 'all':
+        return data
+    elif time_period == 'custom':
+        if custom_date is not None:
+            return data.select(table='main', by='time', start=custom_date['start'], end=custom_date['end'])
+        else:
+            return data
+    elif time_period in TIME_PERIODS:
+        return data.select(table='main', by='time', start=time_now - TIME_PERIODS[time_period], end=time_now)
     else:
-        time_subsets['custom'] = data
+        raise Exception(f'Unknown value [time_period={time_period}]')
 
-    return time_subsets
+
+def select_data(data: CardLiveData, rgi_cutoff_select: str,
+                drug_classes: List[str], amr_gene_families: List[str],
+                resistance_mechanisms: List[str], amr_genes: List[str],
+                time_period: str, custom_date: Dict[str, datetime],
+                organism_identification_method: str, organism: str) -> CardLiveData:
+    """
+    Selects the data displayed in the figures for the user selections. This is the same as the data selected
+    by apply_filters() and apply_organism_filter(), but only for the selected time period.
+    :return: The selected data.
+    """
+    data = apply_rgi_filters(data=data,
+                             rgi_cutoff_select=rgi_cutoff_select,
+                             drug_classes=drug_classes,
+                             amr_gene_families=amr_gene_families,
+                             resistance_mechanisms=resistance_mechanisms,
+                             amr_genes=amr_genes)
+    data = select_time_period(data, time_period, custom_date, datetime.now())
+    return data.select(table='main', by=ORGANISM_COLUMN[organism_identification_method], taxonomy=organism)
 
 
 def apply_organism_filter(time_subsets: Dict[str, CardLiveData],
@@ -275,39 +751,78 @@ def apply_organism_filter(time_subsets: Dict[str, CardLiveData],
     return time_subsets_filtered
 
 
-def build_options(selected_options: List[str], all_available_options: Set[str]):
-    if selected_options is None or len(selected_options) == 0:
-        selected_options_set = set()
-    elif len(selected_options) == 1 and selected_options[0] is None:
-        selected_options_set = set()
-    else:
-        selected_options_set = set(selected_options)
+def build_main_pane(data: CardLiveData, organism_identification_method: str, fig_settings: Dict[str, Dict[str, str]],
+                    world: Union[str, Dict], executor: Executor = None, checkpoint: Callable[[], None] = None):
+    return build_main_pane_figures(MAIN_PANE_FIGURES, data, fig_settings, world, executor=executor,
+                                   checkpoint=checkpoint)
 
-    if all_available_options is None or len(all_available_options) == 0:
-        all_available_options_set = set()
+
+def build_main_pane_figures(names: List[str], data: CardLiveData, fig_settings: Dict[str, Dict[str, str]],
+                            world: Union[str, Dict], executor: Executor = None,
+                            checkpoint: Callable[[], None] = None) -> Dict[str, go.Figure]:
+    """
+    Builds figures in the main pane. The figures only read from the data, so they can be built concurrently.
+    :param names: The names of the figures (from MAIN_PANE_FIGURES).
+    :param data: The data to build the figures from.
+    :param fig_settings: The settings for the figures.
+    :param world: The region geometry for the map, as GeoJSON or a URL to the GeoJSON.
+    :param executor: An (optional) Executor used to build the figures concurrently. If None, the figures are built
+                     one after another.
+    :param checkpoint: An (optional) function called before building each figure, which raises an exception to stop
+                       building the figures (e.g., when the request was cancelled).
+    :return: A dictionary mapping the names of the figures to the figures.
+    """
+    if executor is None or len(names) < 2:
+        return {name: build_timed_main_pane_figure(name, data, fig_settings, world, checkpoint) for name in names}
     else:
-        all_available_options_set = all_available_options
+        futures = {name: executor.submit(build_timed_main_pane_figure, name, data, fig_settings, world, checkpoint)
+                   for name in names}
+        return {name: future.result() for name, future in futures.items()}
 
-    return [{'label': x, 'value': x} for x in sorted(
-        all_available_options_set.union(selected_options_set))]
 
+def build_timed_main_pane_figure(name: str, data: CardLiveData, fig_settings: Dict[str, Dict[str, str]],
+                                 world: Union[str, Dict], checkpoint: Callable[[], None] = None) -> go.Figure:
+    """
+    Builds a single figure in the main pane, logging how long it took to build.
+    :param name: The name of the figure (one of MAIN_PANE_FIGURES).
+    :param data: The data to build the figure from.
+    :param fig_settings: The settings for the figures.
+    :param world: The region geometry for the map, as GeoJSON or a URL to the GeoJSON.
+    :param checkpoint: An (optional) function called before building the figure, which raises an exception to stop
+                       building the figure.
+    :return: The figure.
+    """
+    if checkpoint is not None:
+        checkpoint()
 
-def build_main_pane(data: CardLiveData, organism_identification_method: str, fig_settings: Dict[str, Dict[str, str]]):
-    fig_map = figures.choropleth_drug(data, world)
-    fig_histogram_rate = figures.build_time_histogram(data, fig_type=fig_settings['timeline']['type'],
-                                                      color_by=fig_settings['timeline']['color'])
-    fig_totals = figures.totals_figure(data, type_value=fig_settings['totals']['type'],
-                                       color_by_value=fig_settings['totals']['color'])
+    start = time.perf_counter()
+    fig = build_main_pane_figure(name, data, fig_settings, world)
+    logger.debug(f'Built figure [{name}] for [{len(data)}] samples in {time.perf_counter() - start:0.3f} seconds')
+    return fig
 
-    fig_rgi = figures.rgi_breakdown_figure(data, type_value=fig_settings['rgi']['type'],
-                                           color_by_value=fig_settings['rgi']['color'])
 
-    fig_intersections = figures.rgi_intersection_figure(data,
-                                                        type_value=fig_settings['intersections']['type'])
-    return {
-        'map': fig_map,
-        'timeline': fig_histogram_rate,
-        'totals': fig_totals,
-        'rgi': fig_rgi,
-        'intersections': fig_intersections,
-    }
+def build_main_pane_figure(name: str, data: CardLiveData, fig_settings: Dict[str, Dict[str, str]],
+                           world: Union[str, Dict]) -> go.Figure:
+    """
+    Builds a single figure in the main pane.
+    :param name: The name of the figure (one of MAIN_PANE_FIGURES).
+    :param data: The data to build the figure from.
+    :param fig_settings: The settings for the figures.
+    :param world: The region geometry for the map, as GeoJSON or a URL to the GeoJSON.
+    :return: The figure.
+    """
+    if name == 'map':
+        return figures.choropleth_drug(data, world)
+    elif name == 'timeline':
+        return figures.build_time_histogram(data, fig_type=fig_settings['timeline']['type'],
+                                            color_by=fig_settings['timeline']['color'])
+    elif name == 'totals':
+        return figures.totals_figure(data, type_value=fig_settings['totals']['type'],
+                                     color_by_value=fig_settings['totals']['color'])
+    elif name == 'rgi':
+        return figures.rgi_breakdown_figure(data, type_value=fig_settings['rgi']['type'],
+                                            color_by_value=fig_settings['rgi']['color'])
+    elif name == 'intersections':
+        return figures.rgi_intersection_figure(data, type_value=fig_settings['intersections']['type'])
+    else:
+        raise Exception(f'Unknown value [name={name}]')
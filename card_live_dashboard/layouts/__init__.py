@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Dict, List, Union
+from typing import Any, Dict, List, Union
 
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
@@ -13,17 +13,46 @@ external_stylesheets = [dbc.themes.BOOTSTRAP]
 
 LOADING = '[LOADING]'
 
+# The ids of the figure components, keyed by the name of the figure
+FIGURE_IDS = {
+    'map': 'figure-geographic-map-id',
+    'timeline': 'figure-timeline-id',
+    'totals': 'figure-totals-id',
+    'rgi': 'figure-rgi-id',
+    'intersections': 'figure-rgi-intersections',
+}
 
-def default_layout(base_pathname='/'):
+
+# How often (in milliseconds) a page displayed while the data is loading checks whether the data has loaded
+DATA_LOADING_INTERVAL = 5000
+
+
+def default_layout(base_pathname='/', initial_state: Dict[str, Any] = None, session_id: str = None,
+                   loading_status: str = None):
     """
     Builds the default layout of the CARD:Live dashboard.
     :param base_pathname: The base pathname where the CARD:Live application is running.
+    :param initial_state: The initial values of component properties (keyed by 'component-id.property'), such as
+                          the counts, options and figures for the default selections. Properties without an initial
+                          value are displayed as loading until they are filled in by the callbacks.
+    :param session_id: A unique id for this page load, sent with requests to the callbacks to tell requests from
+                       different browsers apart (or None if requests cannot be told apart).
+    :param loading_status: A message describing the progress of loading the data, if the data is still loading (in
+                           which case the page is reloaded once the data has loaded). Leave as None if the data has
+                           been loaded.
     :return: The default layout of the CARD:Live dashboard.
     """
     if base_pathname.endswith('/'):
         base_pathname = base_pathname.rstrip('/')
 
+    if initial_state is None:
+        initial_state = {}
+
     layout = html.Div(className='card-live-all container-fluid', children=[
+        dcc.Store(id='session-id', data=session_id),
+        dcc.Store(id='dashboard-applied', data=initial_state.get('dashboard-applied.data')),
+        dcc.Store(id='data-loading-ready', data=False),
+        dcc.Interval(id='data-loading-interval', interval=DATA_LOADING_INTERVAL, disabled=loading_status is None),
         html.Div(className='row', children=[
             html.Div(className='card-live-panel col-lg-3', children=[
                 html.Div(className='sticky-top', children=[
@@ -38,13 +67,18 @@ def default_layout(base_pathname='/'):
                         html.A(children=['RGI tool'], href='https://card.mcmaster.ca/analyze/rgi'),
                         '.',
                     ]),
+                    dbc.Alert(id='data-loading-status', color='info', is_open=loading_status is not None,
+                              children=loading_status),
                     html.Div(className='card-live-badges pb-3', children=[
                         html.Span(className='badge badge-secondary', children=[
-                            html.Span(id='global-sample-count', children=[LOADING]),
+                            html.Span(id='global-sample-count',
+                                      children=[initial_state.get('global-sample-count.children', LOADING)]),
                             ' samples']),
                         ' ',
                         html.Span(className='badge badge-secondary',
-                                  children=['Most recent: ', html.Span(id='global-most-recent', children=[LOADING])]),
+                                  children=['Most recent: ', html.Span(
+                                      id='global-most-recent',
+                                      children=[initial_state.get('global-most-recent.children', LOADING)])]),
                         ' ',
                         html.A(className='badge badge-primary', href=f'{base_pathname}/data/all',
                                children=['Download results'])
@@ -56,9 +90,12 @@ def default_layout(base_pathname='/'):
                             html.Div(className='card-live-badges pt-1', children=[
                                 html.Span(className='badge badge-secondary', children=[
                                     'Showing ', html.Span(id='selected-samples-count',
-                                                          children=[LOADING]),
+                                                          children=[initial_state.get(
+                                                              'selected-samples-count.children', LOADING)]),
                                     ' samples'
                                 ]),
+                                ' ',
+                                html.Span(id='dashboard-status', className='badge badge-warning'),
                             ]),
                         ]),
                     ]),
@@ -87,6 +124,7 @@ def default_layout(base_pathname='/'):
                                                    id='drug-class-select',
                                                    className='sidepanel-selection',
                                                    multi=True,
+                                                   **initial_props(initial_state, 'drug-class-select', 'options'),
                                                    placeholder='Select a drug class',
                                                ),
                                                ]),
@@ -95,6 +133,7 @@ def default_layout(base_pathname='/'):
                                                    id='amr-gene-family-select',
                                                    className='sidepanel-selection',
                                                    multi=True,
+                                                   **initial_props(initial_state, 'amr-gene-family-select', 'options'),
                                                    placeholder='Select the AMR gene family',
                                                ),
                                                ]),
@@ -103,6 +142,8 @@ def default_layout(base_pathname='/'):
                                                    id='resistance-mechanism-select',
                                                    className='sidepanel-selection',
                                                    multi=True,
+                                                   **initial_props(initial_state, 'resistance-mechanism-select',
+                                                                   'options'),
                                                    placeholder='Select the resistance mechanism',
                                                ),
                                                ]),
@@ -111,6 +152,7 @@ def default_layout(base_pathname='/'):
                                                    id='amr-gene-select',
                                                    className='sidepanel-selection',
                                                    multi=True,
+                                                   **initial_props(initial_state, 'amr-gene-select', 'options'),
                                                    placeholder='Select an AMR gene',
                                                ),
                                                ]),
@@ -139,7 +181,9 @@ def default_layout(base_pathname='/'):
                                                dcc.Dropdown(id='organism-select',
                                                             className='sidepanel-selection',
                                                             placeholder='Organism',
-                                                            clearable=True)
+                                                            clearable=True,
+                                                            **initial_props(initial_state, 'organism-select',
+                                                                            'options'))
                                                ]),
                         ]),
                     ]),
@@ -154,17 +198,24 @@ def default_layout(base_pathname='/'):
                                                dcc.Dropdown(id='time-period-items',
                                                             className='sidepanel-selection',
                                                             value='all',
-                                                            clearable=False),
+                                                            clearable=False,
+                                                            **initial_props(initial_state, 'time-period-items',
+                                                                            'options')),
                                                dbc.Collapse(id='custom-time-period', is_open=False, children=[
                                                    'Please select a custom date range:',
                                                    dcc.DatePickerRange(
                                                        id='date-picker-range',
                                                        className='sidepanel-selection',
                                                        display_format='MMM DD, YYYY',
-                                                       min_date_allowed=datetime(2020, 1, 1),
-                                                       max_date_allowed=datetime.now(),
+                                                       min_date_allowed=initial_state.get(
+                                                           'date-picker-range.min_date_allowed',
+                                                           datetime(2020, 1, 1)),
+                                                       max_date_allowed=initial_state.get(
+                                                           'date-picker-range.max_date_allowed',
+                                                           datetime.now()),
                                                        updatemode='bothdates',
-                                                       end_date=datetime.now(),
+                                                       end_date=initial_state.get('date-picker-range.end_date',
+                                                                                  datetime.now()),
                                                        with_portal=True,
                                                        clearable=True,
                                                        number_of_months_shown=2,
@@ -190,9 +241,11 @@ def default_layout(base_pathname='/'):
                 html.Div(className='container', children=[
                     html.Div(className='row', children=[
                         html.Div(className='col', id='main-pane',
-                                 # Need to display initial empty figures
+                                 # Need to display initial (possibly empty) figures
                                  # So callbacks can be linked up correctly
-                                 children=figures_layout(figures.EMPTY_FIGURE_DICT)
+                                 children=figures_layout(initial_figures(initial_state),
+                                                         initial_state.get('sample-count-figure.children',
+                                                                           LOADING))
                                  ),
                     ]),
                 ]),
@@ -203,22 +256,66 @@ def default_layout(base_pathname='/'):
     return layout
 
 
-def figures_layout(figures_dict: Dict[str, go.Figure]):
+def loading_message(status: Dict[str, Any]) -> str:
+    """
+    Builds the message displayed while the data is loading.
+    :param status: The status of loading the data (from CardLiveDataManager.status()).
+    :return: The message.
+    """
+    progress = status['progress']
+    if status['status'] == 'failed':
+        return 'The CARD:Live data could not be loaded, retrying shortly.'
+    elif progress['stage'] is None:
+        return 'Loading the CARD:Live data.'
+    elif progress['total'] is None:
+        return f'Loading the CARD:Live data ({progress["stage"]}).'
+    else:
+        return f'Loading the CARD:Live data ({progress["stage"]}: {progress["done"]}/{progress["total"]}).'
+
+
+def initial_props(initial_state: Dict[str, Any], component_id: str, *props: str) -> Dict[str, Any]:
+    """
+    Gets the properties of a component which have an initial value.
+    :param initial_state: The initial values of component properties (keyed by 'component-id.property').
+    :param component_id: The id of the component.
+    :param props: The names of the properties.
+    :return: A dictionary mapping the names of the properties with an initial value to the value.
+    """
+    prop_values = {}
+    for prop in props:
+        prop_id = f'{component_id}.{prop}'
+        if prop_id in initial_state:
+            prop_values[prop] = initial_state[prop_id]
+    return prop_values
+
+
+def initial_figures(initial_state: Dict[str, Any]) -> Dict[str, go.Figure]:
+    """
+    Gets the initial figures, using empty figures for any without an initial value.
+    :param initial_state: The initial values of component properties (keyed by 'component-id.property').
+    :return: A dictionary mapping names of figures to the figure objects.
+    """
+    return {name: initial_state.get(f'{FIGURE_IDS[name]}.figure', empty_figure)
+            for name, empty_figure in figures.EMPTY_FIGURE_DICT.items()}
+
+
+def figures_layout(figures_dict: Dict[str, go.Figure], sample_count: str = LOADING):
     """
     Builds the layout of the figures on the page.
     :param figures_dict: A dictionary mapping names of constructed figures to the figure objects.
+    :param sample_count: The count of selected samples displayed in the description of the RGI figure.
     :return: A list of figures to place on the page.
     """
     return [
         html.Div(className='cardlive-figures', children=[
             single_figure_layout(title='Map',
                                  description=['Geographic distribution of the submitted genomic samples.'],
-                                 id='figure-geographic-map-id',
+                                 id=FIGURE_IDS['map'],
                                  fig=figures_dict['map']
                                  ),
             single_figure_layout(title='Samples timeline',
                                  description=['Submission dates for genomic samples.'],
-                                 id='figure-timeline-id',
+                                 id=FIGURE_IDS['timeline'],
                                  fig=figures_dict['timeline'],
                                  dropdowns=figure_menus_layout(
                                      id_type='timeline-type-select',
@@ -240,7 +337,7 @@ def figures_layout(figures_dict: Dict[str, go.Figure]):
                                  ),
             single_figure_layout(title='Samples total',
                                  description=['Count of samples matching selection.'],
-                                 id='figure-totals-id',
+                                 id=FIGURE_IDS['totals'],
                                  fig=figures_dict['totals'],
                                  dropdowns=figure_menus_layout(
                                      id_type='totals-type-select',
@@ -260,10 +357,10 @@ def figures_layout(figures_dict: Dict[str, go.Figure]):
                                  ),
             single_figure_layout(title='RGI results',
                                  description=['Percent of selected samples (',
-                                              html.Span(id='sample-count-figure', children=[LOADING]),
+                                              html.Span(id='sample-count-figure', children=[sample_count]),
                                               ') with the chosen type of RGI results.'
                                               ],
-                                 id='figure-rgi-id',
+                                 id=FIGURE_IDS['rgi'],
                                  fig=figures_dict['rgi'],
                                  dropdowns=figure_menus_layout(
                                      id_type='rgi-type-select',
@@ -285,8 +382,8 @@ def figures_layout(figures_dict: Dict[str, go.Figure]):
                                  ),
             single_figure_layout(title='RGI intersections',
                                  description=['Patterns of co-occurrence of the selected RGI result type across genome subset'],
-                                 id='figure-rgi-intersections',
-                                 fig=figures_dict['rgi'],
+                                 id=FIGURE_IDS['intersections'],
+                                 fig=figures_dict['intersections'],
                                  dropdowns=figure_menus_layout(
                                      id_type='rgi-intersection-type-select',
                                      options_type=[
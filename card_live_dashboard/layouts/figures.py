@@ -1,17 +1,24 @@
+from __future__ import annotations
+
 import logging
 from collections import OrderedDict
-from typing import List, Dict
-import itertools
+from typing import List, Dict, Iterator, Tuple, Union, TYPE_CHECKING
 
-import geopandas
-import upsetplot
+import numpy as np
 import pandas as pd
-import plotly.express as px
+import plotly.colors
+import plotly.io as pio
 import plotly.subplots as sbp
 import plotly.graph_objects as go
 
 from card_live_dashboard.model.CardLiveData import CardLiveData
 
+# geopandas and upsetplot (which imports matplotlib) are slow to import, so upsetplot is imported when first used and
+# geopandas is only needed for type annotations
+if TYPE_CHECKING:
+    import geopandas
+    import upsetplot
+
 logger = logging.getLogger(__name__)
 
 # Creation of empty figure adapted from https://community.plotly.com/t/replacing-an-empty-graph-with-a-message/31497
@@ -78,6 +85,30 @@ RGI_D_TICK = {
 # Spacing to put between tick mark labels and plot
 TICKSPACE = ' '
 
+# Timeline (histogram) configuration
+TIMELINE_BINS = 50
+TIMELINE_RUG_MAX_POINTS = 500
+TIMELINE_DEFAULT_COLOR = '#636efa'
+TIMELINE_LABELS = {
+    'geo_area_name_standard': 'Geographic region',
+    'rgi_kmer_taxonomy': 'Organism',
+    'lmat_taxonomy': 'Organism',
+}
+
+# Labels used for axes, legends and hover text
+FIGURE_LABELS = {
+    'categories': 'Categories',
+    'count': 'Samples count',
+    'categories_total': 'Total samples in category count',
+    'categories_total_percent': 'Total samples in category percent',
+    'proportion': 'Percent of samples',
+    'geo_area_name_standard': 'Geographic region',
+    'lmat_taxonomy': 'Organism',
+    'rgi_kmer_taxonomy': 'Organism',
+}
+
+MAP_COLOR_SCALE = plotly.colors.make_colorscale(plotly.colors.sequential.YlGnBu)
+
 # upset max displayable configuration
 MAX_UPSET_CATEGORIES=40
 MAX_UPSET_INTERSECTIONS=25
@@ -105,19 +136,31 @@ def totals_figure(data: CardLiveData, type_value: str, color_by_value: str) -> g
                 order_categories(totals_df, color_col_name, by_sum=True, sum_col='count')
             )
 
-        fig = px.bar(totals_df, y=type_col_name, x='count',
-                     color=color_col_name,
-                     height=get_figure_height(len(totals_df[type_col_name].unique())),
-                     category_orders=category_orders,
-                     labels={'count': 'Samples count',
-                             'geo_area_name_standard': 'Geographic region',
-                             'lmat_taxonomy': 'Organism',
-                             'rgi_kmer_taxonomy': 'Organism'},
-                     title=TOTALS_FIGURE_TITLES[type_value],
-                     )
-        fig.update_layout(font={'size': 14},
-                          yaxis={'title': '', 'ticksuffix': TICKSPACE}
-                          )
+        hovertemplate = f'{FIGURE_LABELS["count"]}=%{{x}}<br>{FIGURE_LABELS[type_col_name]}=%{{y}}<extra></extra>'
+        if color_by_value == 'default':
+            traces = [bar_trace(totals_df[type_col_name], totals_df['count'], hovertemplate=hovertemplate)]
+        else:
+            if type_col_name == color_col_name:
+                # The color is already given by the category so is not repeated in the hover text
+                hovertemplate = (f'{FIGURE_LABELS[type_col_name]}=%{{y}}<br>'
+                                 f'{FIGURE_LABELS["count"]}=%{{x}}<extra></extra>')
+                hover_color_format = ''
+            else:
+                hover_color_format = f'{FIGURE_LABELS[color_col_name]}={{}}<br>'
+
+            traces = [bar_trace(group_df[type_col_name], group_df['count'], name=name,
+                                hovertemplate=hover_color_format.format(name) + hovertemplate)
+                      for name, group_df in groups_in_order(totals_df, color_col_name,
+                                                            category_orders[color_col_name])]
+
+        fig = build_figure(traces, bar_layout(
+            title=TOTALS_FIGURE_TITLES[type_value],
+            height=get_figure_height(len(totals_df[type_col_name].unique())),
+            xaxis={'title': {'text': FIGURE_LABELS['count']}},
+            yaxis={'title': {'text': ''}, 'categoryorder': 'array',
+                   'categoryarray': category_orders[type_col_name][::-1], 'ticksuffix': TICKSPACE},
+            legend_title=FIGURE_LABELS.get(color_col_name),
+        ))
 
     return fig
 
@@ -209,6 +252,7 @@ def prepare_intersection_data(data: CardLiveData, type_value: str) -> upsetplot.
     :return: An upsetplot.UpSet class containing the intersections and category
              memberships for creating a plotly based UpSet plot
     """
+    import upsetplot
 
     totals_df = data.rgi_parser.get_column_values(data_type=type_value,
                                                       values_name='categories',
@@ -239,33 +283,24 @@ def plotly_upset_plot(upset_data: upsetplot.UpSet, title: str, truncated: bool)
     :return: a plotly figure containing the upsetplot
     """
 
-    # get the category names in each set for hover annotation
-    set_category_annotations = []
-    for mask in upset_data.intersections.index:
-        categories_in_set = itertools.compress(\
-                                  upset_data.intersections.index.names,
-                                  mask)
-        categories_in_set = "<br>".join(sorted(categories_in_set))
-        set_category_annotations.append(categories_in_set)
-
-    set_intersections = upset_data.intersections.reset_index()\
-                            .iloc[:, :-1].astype(int).T.iloc[::-1]
-
-    # make grid for set memberships
-    grid_x = []
-    grid_y = []
-    membership_x = []
-    membership_y = []
-    names = []
-
-    for (y, row) in enumerate(set_intersections.iterrows()):
-        for (x, membership) in enumerate(row[1]):
-            grid_x.append(x)
-            grid_y.append(y)
-            if membership == 1:
-                membership_x.append(x)
-                membership_y.append(y)
-                names.append(row[0])
+    # boolean membership matrix with a row for each set (intersection) and a column for each category
+    category_names = np.array(upset_data.intersections.index.names)
+    membership = np.array(upset_data.intersections.index.tolist(), dtype=bool).reshape(-1, len(category_names))
+    num_sets = membership.shape[0]
+
+    # get the category names in each set (sorted by name) for hover annotation
+    name_order = np.argsort(category_names)
+    set_index, category_index = np.nonzero(membership[:, name_order])
+    set_names = np.split(category_names[name_order][category_index],
+                         np.cumsum(np.bincount(set_index, minlength=num_sets))[:-1])
+    set_category_annotations = ['<br>'.join(names) for names in set_names]
+
+    # make grid for set memberships, with categories displayed as rows (in reverse order) and sets as columns
+    grid_category_names = category_names[::-1]
+    grid = membership.T[::-1]
+    grid_y, grid_x = np.divmod(np.arange(grid.size), num_sets)
+    membership_y, membership_x = np.nonzero(grid)
+    names = grid_category_names[membership_y]
 
     # create subplot layout
     fig = sbp.make_subplots(rows=2, cols=2,
@@ -323,17 +358,18 @@ def plotly_upset_plot(upset_data: upsetplot.UpSet, title: str, truncated: bool)
     # there may be a better way to do this with shared/aligned axes
     # across plots that still allows zooming but I can't figure it out
     # right now!
-    fig = configure_upset_plot_axes(fig, set_intersections, truncated, title)
+    fig = configure_upset_plot_axes(fig, grid_category_names.tolist(), num_sets, truncated, title)
 
     return fig
 
 
-def configure_upset_plot_axes(fig: go.Figure, set_intersections: pd.DataFrame,
+def configure_upset_plot_axes(fig: go.Figure, category_names: List[str], num_sets: int,
                               truncated: bool, title: str) -> go.Figure:
     """
     Format and organise plot axes for upset plotly figure
     :param fig: a go.Figure containing the plotly upsetplot
-    :param set_intersections: pandas DataFrame with all set intersections
+    :param category_names: list of category names in the order displayed (bottom to top) in the membership grid
+    :param num_sets: the number of set intersections displayed
     :param truncated: boolean if the number of intersections has been truncated
                       or not (i.e. if num intersections > MAX_UPSET_INTERSECTIONS)
     :param title: str containing the plot title
@@ -358,22 +394,22 @@ def configure_upset_plot_axes(fig: go.Figure, set_intersections: pd.DataFrame,
         # grid
         xaxis2 = dict(showticklabels=False,
                       fixedrange=True,
-                      range=[-0.5, len(set_intersections.columns)-0.5]),
+                      range=[-0.5, num_sets-0.5]),
         yaxis2 = dict(showticklabels=False,
                       fixedrange=True,
-                      range=[-0.5, len(set_intersections.index)+0.5]),
+                      range=[-0.5, len(category_names)+0.5]),
 
         # membership
         xaxis3 = dict(showticklabels=False,
                       fixedrange=True,
-                      range=[-0.5, len(set_intersections.columns)-0.5]),
+                      range=[-0.5, num_sets-0.5]),
         yaxis3 = dict(
             tickmode = 'array',
-            tickvals = list(range(len(set_intersections.index))),
-            ticktext = set_intersections.index,
+            tickvals = list(range(len(category_names))),
+            ticktext = category_names,
             title=f"{title}",
             fixedrange=True,
-            range=[-0.5, len(set_intersections.index)+0.5],
+            range=[-0.5, len(category_names)+0.5],
             tickfont=dict(size = 10),
             automargin=True,
         ),
@@ -382,7 +418,7 @@ def configure_upset_plot_axes(fig: go.Figure, set_intersections: pd.DataFrame,
         xaxis4 = dict(title=f"Unique Count of<br>{title}"),
         yaxis4 = dict(showticklabels=False,
                       fixedrange=True,
-                      range=[-0.5, len(set_intersections.index)+0.5])
+                      range=[-0.5, len(category_names)+0.5])
     )
     )
     return fig
@@ -441,33 +477,44 @@ def rgi_breakdown_figure(data: CardLiveData, type_value: str, color_by_value: st
             title = RGI_TITLES[type_value]
             rgi_d_tick = RGI_D_TICK[type_value]
 
-            fig = px.bar(counts_df, y='categories', x='proportion',
-                         category_orders=category_order,
-                         height=get_figure_height(len(counts_df['categories'].unique())),
-                         color=color_by_col,
-                         labels={
-                             'categories': 'Categories',
-                             'variable': 'Type',
-                             'count': 'Samples count',
-                             'categories_total': 'Total samples in category count',
-                             'categories_total_percent': 'Total samples in category percent',
-                             'proportion': 'Percent of samples',
-                             'geo_area_name_standard': 'Geographic region',
-                             'lmat_taxonomy': 'Organism',
-                             'rgi_kmer_taxonomy': 'Organism',
-                             'match_count': 'Samples count'
-                         },
-                         hover_data=hover_data,
-                         title=title,
-                         )
-            fig.update_layout(font={'size': 14},
-                              yaxis={'title': '', 'dtick': rgi_d_tick, 'ticksuffix': TICKSPACE, 'automargin': True},
-                              xaxis={'title': 'Percent of samples', 'tickformat': '.0%'}
-                              )
+            hovertemplate = (f'{FIGURE_LABELS["proportion"]}=%{{x}}<br>{FIGURE_LABELS["categories"]}=%{{y}}<br>'
+                             + '<br>'.join(f'{FIGURE_LABELS[col]}=%{{customdata[{i}]}}'
+                                           for i, col in enumerate(hover_data))
+                             + '<extra></extra>')
+            if color_by_col is None:
+                traces = [bar_trace(counts_df['categories'], counts_df['proportion'],
+                                    customdata=counts_df[hover_data].values, hovertemplate=hovertemplate)]
+            else:
+                traces = [bar_trace(group_df['categories'], group_df['proportion'], name=name,
+                                    customdata=group_df[hover_data].values,
+                                    hovertemplate=f'{FIGURE_LABELS[color_by_col]}={name}<br>{hovertemplate}')
+                          for name, group_df in groups_in_order(counts_df, color_by_col,
+                                                                category_order[color_by_col])]
+
+            yaxis = {'title': {'text': ''}, 'categoryorder': 'array', 'categoryarray': display_category_order[::-1],
+                     'ticksuffix': TICKSPACE, 'automargin': True}
+            if rgi_d_tick is not None:
+                yaxis['dtick'] = rgi_d_tick
+
+            fig = build_figure(traces, bar_layout(
+                title=title,
+                height=get_figure_height(len(counts_df['categories'].unique())),
+                xaxis={'title': {'text': FIGURE_LABELS['proportion']}, 'tickformat': '.0%'},
+                yaxis=yaxis,
+                legend_title=FIGURE_LABELS.get(color_by_col),
+            ))
     return fig
 
 
-def choropleth_drug(data: CardLiveData, world: geopandas.GeoDataFrame):
+def choropleth_drug(data: CardLiveData, world: Union[str, Dict, geopandas.GeoDataFrame]):
+    """
+    Builds the map of sample counts by geographic region.
+    :param data: The CardLiveData to count samples from.
+    :param world: The region geometry. Either a GeoDataFrame, GeoJSON, or a URL to the GeoJSON. Passing a URL
+                  means only the counts are sent with the figure and the browser downloads (and caches) the
+                  geometry separately.
+    :return: The map figure.
+    """
     df_geo = data.sample_counts(['geo_area_code', 'geo_area_name_standard']).reset_index()
 
     # Remove N/A from counts so it doesn't mess with colors of map
@@ -476,24 +523,35 @@ def choropleth_drug(data: CardLiveData, world: geopandas.GeoDataFrame):
     if df_geo.empty or df_geo['count'].sum() == 0:
         fig = EMPTY_MAP
     else:
-        fig = px.choropleth(df_geo, geojson=world, locations='geo_area_code',
-                            featureidkey='properties.un_m49_numeric',
-                            color='count', color_continuous_scale='YlGnBu',
-                            hover_data=['geo_area_name_standard'],
-
-                            # Off-center to avoid a color fill issue with Antarctica
-                            # where the oceans get filled instead of the continent
-                            center={'lat': 0, 'lon': 0.01},
-
-                            title='Samples by geographic region',
-                            )
-
-        fig.update_traces(
-            hovertemplate=(
+        if not isinstance(world, (str, dict)):
+            world = world.__geo_interface__
+
+        fig = build_figure([{
+            'type': 'choropleth',
+            'geojson': world,
+            'featureidkey': 'properties.un_m49_numeric',
+            'locations': df_geo['geo_area_code'].values,
+            'z': df_geo['count'].values,
+            'customdata': df_geo[['geo_area_name_standard']].values,
+            'coloraxis': 'coloraxis',
+            'geo': 'geo',
+            'name': '',
+            'hovertemplate': (
                 '<b style="font-size: 125%;">%{customdata[0]}</b><br>'
                 '<b>Count:</b>  %{z}<br>'
-            )
-        )
+            ),
+        }], {
+            'title': {'text': 'Samples by geographic region'},
+            'geo': {
+                'domain': {'x': [0.0, 1.0], 'y': [0.0, 1.0]},
+
+                # Off-center to avoid a color fill issue with Antarctica
+                # where the oceans get filled instead of the continent
+                'center': {'lat': 0, 'lon': 0.01},
+            },
+            'coloraxis': {'colorscale': MAP_COLOR_SCALE},
+            'legend': {'tracegroupgap': 0},
+        })
 
     fig.update_layout(
         margin={"r": 0, "t": 35, "l": 0, "b": 0},
@@ -515,16 +573,22 @@ def choropleth_drug(data: CardLiveData, world: geopandas.GeoDataFrame):
 
 
 def build_time_histogram(data: CardLiveData, fig_type: str, color_by: str):
+    """
+    Builds the timeline (histogram) of samples by date. The binning is done here (instead of in the browser)
+    so that only the counts per bin get sent with the figure, not the timestamps of every sample.
+    :param data: The CardLiveData to build the timeline from.
+    :param fig_type: The type of timeline ('counts', 'cumulative_counts', 'percent', 'cumulative_percent').
+    :param color_by: The value to color by.
+    :return: The timeline figure.
+    """
     if data.empty:
         fig = EMPTY_FIGURE
     else:
         if fig_type == 'cumulative_counts' or fig_type == 'counts':
-            display_col = None
             yaxis_title = 'Samples count'
             tickformat = ''
-            histfunc = 'count'
-
-            hist_data = data.main_df
+            hover_value = '%{y}'
+            fraction = False
 
             if fig_type == 'counts':
                 cumulative = False
@@ -533,17 +597,10 @@ def build_time_histogram(data: CardLiveData, fig_type: str, color_by: str):
             else:
                 raise Exception(f'Unknown value [fig_type={fig_type}]')
         elif fig_type == 'cumulative_percent' or fig_type == 'percent':
-            display_col = 'time_fraction'
             yaxis_title = 'Percent of samples'
             tickformat = '.0%'
-            histfunc = 'sum'
-
-            # I add in a fraction of the total number of samples here
-            # This is so I can make the histogram report a percentage
-            # of values instead of a count (by taking the sum of
-            # (time_fraction) in a given time period).
-            hist_data = data.main_df.copy()
-            hist_data[display_col] = 1 / len(hist_data)
+            hover_value = '%{y:.1%}'
+            fraction = True
 
             if fig_type == 'percent':
                 cumulative = False
@@ -554,43 +611,122 @@ def build_time_histogram(data: CardLiveData, fig_type: str, color_by: str):
         else:
             raise Exception(f'Unknown value [fig_type={fig_type}]')
 
+        hist_data = data.main_df
         color_col_name = TOTALS_COLUMN_DATAFRAME_NAMES[color_by]
+        category_orders = order_categories(hist_data, color_col_name)
 
-        if color_by == 'default':
-            marginal = 'rug'
+        if color_col_name is None:
+            groups = None
+            color_label = None
         else:
-            # I get rid of marginal here since I found the plot became messy
-            # when coloring by many categories
-            marginal = None
-
-        category_orders = order_categories(hist_data, color_col_name)
+            groups = pd.Categorical(hist_data[color_col_name], categories=category_orders[color_col_name])
+            color_label = TIMELINE_LABELS[color_col_name]
+
+        bin_centers, bin_width, counts = bin_timeline(hist_data['timestamp'], groups=groups,
+                                                      nbins=TIMELINE_BINS, cumulative=cumulative, fraction=fraction)
+
+        layout = {
+            'font': {'size': 14},
+            'title': {'text': 'Samples by date'},
+            'barmode': 'relative',
+            'xaxis': {'title': {'text': 'Date'}},
+            'yaxis': {'title': {'text': yaxis_title}, 'tickformat': tickformat, 'ticksuffix': TICKSPACE},
+        }
+        if groups is None:
+            traces = [
+                {'type': 'bar', 'x': bin_centers, 'y': counts[0], 'width': bin_width,
+                 'marker': {'color': TIMELINE_DEFAULT_COLOR},
+                 'hovertemplate': f'Date=%{{x}}<br>{yaxis_title}={hover_value}<extra></extra>',
+                 'showlegend': False},
+
+                # I include a (downsampled) rug plot only when not coloring by categories since I found the
+                # plot became messy when coloring by many categories
+                {'type': 'box', 'x': downsample_timestamps(hist_data['timestamp'], TIMELINE_RUG_MAX_POINTS),
+                 'boxpoints': 'all', 'jitter': 0, 'hoveron': 'points',
+                 'fillcolor': 'rgba(255,255,255,0)', 'line': {'color': 'rgba(255,255,255,0)'},
+                 'marker': {'color': TIMELINE_DEFAULT_COLOR, 'symbol': 'line-ns-open'},
+                 'hovertemplate': 'Date=%{x}<extra></extra>',
+                 'showlegend': False, 'xaxis': 'x2', 'yaxis': 'y2'},
+            ]
+            layout['yaxis']['domain'] = [0.0, 0.8316]
+            layout['xaxis2'] = {'anchor': 'y2', 'domain': [0.0, 1.0], 'matches': 'x', 'showticklabels': False,
+                                'showgrid': True}
+            layout['yaxis2'] = {'anchor': 'x2', 'domain': [0.8416, 1.0], 'matches': 'y2',
+                                'showticklabels': False, 'showline': False, 'ticks': '', 'showgrid': False}
+        else:
+            traces = [{'type': 'bar', 'x': bin_centers, 'y': group_counts, 'width': bin_width, 'name': name,
+                       'legendgroup': name,
+                       'hovertemplate': (f'{color_label}={name}<br>Date=%{{x}}<br>'
+                                         f'{yaxis_title}={hover_value}<extra></extra>')}
+                      for name, group_counts in zip(groups.categories, counts)]
+            layout['legend'] = {'title': {'text': color_label}, 'tracegroupgap': 0}
 
-        fig = px.histogram(hist_data, x='timestamp', y=display_col,
-                           nbins=50,
-                           marginal=marginal,
-                           cumulative=cumulative,
-                           color=color_col_name,
-                           category_orders=category_orders,
-                           labels={'time_fraction': 'Percent of samples',
-                                   'timestamp': 'Date',
-                                   'geo_area_name_standard': 'Geographic region',
-                                   'rgi_kmer_taxonomy': 'Organism',
-                                   'lmat_taxonomy': 'Organism'},
-                           title='Samples by date',
-                           histfunc=histfunc,
-                           )
-        fig.update_layout(font={'size': 14},
-                          yaxis={'title': yaxis_title, 'tickformat': tickformat, 'ticksuffix': TICKSPACE}
-                          )
-
-        # This replaces the text in the hover 'sum of Percent of samples' to 'Percent of samples'
-        for d in fig.data:
-            d.hovertemplate = d.hovertemplate.replace('sum of ', '')
-            d.hovertemplate = d.hovertemplate.replace('count', 'Samples count')
+        fig = build_figure(traces, layout)
 
     return fig
 
 
+def bin_timeline(timestamps: pd.Series, groups: pd.Categorical = None, nbins: int = TIMELINE_BINS,
+                 cumulative: bool = False, fraction: bool = False) -> Tuple[pd.DatetimeIndex, float, np.ndarray]:
+    """
+    Bins timestamps into equal-width bins, counting the number of timestamps in each bin for each group.
+    :param timestamps: The timestamps.
+    :param groups: The (optional) group of each timestamp. Timestamps with a missing group are not counted.
+    :param nbins: The number of bins.
+    :param cumulative: Whether or not to return the cumulative counts.
+    :param fraction: Whether or not to return the counts as a fraction of the total number of timestamps.
+    :return: A tuple of (bin centers, bin width in milliseconds, counts) where counts is an array with a row for
+             each group (in order of the group categories) and a column for each bin. If groups is None, there
+             is a single row.
+    """
+    times = timestamps.values.astype('datetime64[ns]').astype(np.int64)
+    start = times.min()
+    end = times.max()
+    if start == end:
+        # Center a single day around the timestamps
+        half_day = np.timedelta64(12, 'h').astype('timedelta64[ns]').astype(np.int64)
+        start = start - half_day
+        end = end + half_day
+
+    bin_size = (end - start) / nbins
+    bin_index = np.minimum(((times - start) // bin_size).astype(np.int64), nbins - 1)
+
+    if groups is None:
+        ngroups = 1
+        group_codes = np.zeros(len(times), dtype=np.int64)
+    else:
+        ngroups = len(groups.categories)
+        group_codes = np.asarray(groups.codes, dtype=np.int64)
+
+    valid = group_codes >= 0
+    counts = np.bincount(group_codes[valid] * nbins + bin_index[valid],
+                         minlength=ngroups * nbins).reshape(ngroups, nbins).astype(np.float64)
+
+    if cumulative:
+        counts = counts.cumsum(axis=1)
+    if fraction:
+        counts = counts / len(times)
+
+    bin_centers = pd.to_datetime(start + bin_size * (np.arange(nbins) + 0.5))
+    bin_width_ms = bin_size / 1e6
+
+    return bin_centers, bin_width_ms, counts
+
+
+def downsample_timestamps(timestamps: pd.Series, max_points: int) -> pd.DatetimeIndex:
+    """
+    Downsamples timestamps to at most max_points, keeping evenly spaced points in sorted order
+    (so that the overall distribution of timestamps is preserved).
+    :param timestamps: The timestamps.
+    :param max_points: The maximum number of points to keep.
+    :return: The downsampled timestamps (sorted).
+    """
+    times = np.sort(timestamps.dropna().values)
+    if len(times) > max_points:
+        times = times[np.linspace(0, len(times) - 1, max_points).astype(np.int64)]
+    return pd.DatetimeIndex(times)
+
+
 def order_categories(df: pd.DataFrame, col: str, by_sum: bool = False, sum_col: str = None) -> Dict[str, List[str]]:
     """
     Reorders categories in the dataframe by the total counts in the passed column.
@@ -610,6 +746,101 @@ def order_categories(df: pd.DataFrame, col: str, by_sum: bool = False, sum_col:
         return {col: ordered_list}
 
 
+def build_figure(traces: List[Dict], layout: Dict) -> go.Figure:
+    """
+    Builds a figure from already-aggregated traces (defined as dictionaries). This skips the per-property validation
+    done by plotly.express and the go.* constructors, which otherwise takes most of the time spent building a figure.
+    Since nothing is validated, the traces and layout must only contain valid plotly properties.
+    :param traces: The traces, each a dictionary including the trace 'type'.
+    :param layout: The layout. The (shared) default template is used unless a 'template' is given.
+    :return: The figure.
+    """
+    return go.Figure(data=traces, layout={'template': figure_template(), **layout}, _validate=False)
+
+
+def figure_template() -> Dict:
+    """
+    Gets the current default plotly template as a dictionary. This is converted once and reused across figures
+    instead of being copied into each new figure.
+    :return: The default template.
+    """
+    name = pio.templates.default
+    if name not in _FIGURE_TEMPLATES:
+        _FIGURE_TEMPLATES[name] = pio.templates[name].to_plotly_json()
+    return _FIGURE_TEMPLATES[name]
+
+
+_FIGURE_TEMPLATES = {}
+
+
+def bar_trace(y: pd.Series, x: pd.Series, hovertemplate: str, name: str = None, **kwargs) -> Dict:
+    """
+    Defines a horizontal bar trace, with the same properties plotly.express would use for a bar chart.
+    :param y: The categories.
+    :param x: The values.
+    :param hovertemplate: The hover template.
+    :param name: The name of the trace (the category being colored by), or None if not coloring.
+    :param kwargs: Any other trace properties.
+    :return: The trace as a dictionary.
+    """
+    return {
+        'type': 'bar',
+        'orientation': 'h',
+        'x': x.values,
+        'y': y.values,
+        'xaxis': 'x',
+        'yaxis': 'y',
+        'name': '' if name is None else name,
+        'legendgroup': '' if name is None else name,
+        'offsetgroup': '' if name is None else name,
+        'alignmentgroup': 'True',
+        'showlegend': name is not None,
+        'textposition': 'auto',
+        'hovertemplate': hovertemplate,
+        **kwargs,
+    }
+
+
+def bar_layout(title: str, height: int, xaxis: Dict, yaxis: Dict, legend_title: str = None) -> Dict:
+    """
+    Defines the layout for a horizontal bar chart, with the same properties plotly.express would use.
+    :param title: The figure title.
+    :param height: The figure height.
+    :param xaxis: The x axis properties.
+    :param yaxis: The y axis properties.
+    :param legend_title: The legend title, or None if not coloring.
+    :return: The layout as a dictionary.
+    """
+    legend = {'tracegroupgap': 0}
+    if legend_title is not None:
+        legend['title'] = {'text': legend_title}
+
+    return {
+        'title': {'text': title},
+        'height': height,
+        'font': {'size': 14},
+        'barmode': 'relative',
+        'legend': legend,
+        'xaxis': {'anchor': 'y', 'domain': [0.0, 1.0], **xaxis},
+        'yaxis': {'anchor': 'x', 'domain': [0.0, 1.0], **yaxis},
+    }
+
+
+def groups_in_order(df: pd.DataFrame, col: str, order: List[str]) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """
+    Splits a data frame into groups by the values in a column, in the passed order (used to create one trace for
+    each category being colored by). Categories with no rows are skipped.
+    :param df: The data frame.
+    :param col: The column to group by.
+    :param order: The order of the categories.
+    :return: A generator of (category, data frame) tuples.
+    """
+    groups = df.groupby(col, sort=False)
+    for name in order:
+        if name in groups.groups:
+            yield name, groups.get_group(name)
+
+
 def get_figure_height(number_categories: int) -> int:
     """
     Given a number of categories to plot gets an appropriate figure height.
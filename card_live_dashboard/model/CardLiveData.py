@@ -1,10 +1,12 @@
 from __future__ import annotations
 
+import threading
 from datetime import datetime
 from typing import Set, List, Union
 
 import pandas as pd
 
+from card_live_dashboard.model.CategoryIndex import CategoryIndex
 from card_live_dashboard.model.RGIParser import RGIParser
 
 
@@ -19,6 +21,8 @@ class CardLiveData:
         self._rgi_kmer_df = rgi_kmer_df
         self._lmat_df = lmat_df
         self._mlst_df = mlst_df
+        self._category_index = None
+        self._category_index_lock = threading.Lock()
 
     def select(self, table: str, by: str, **kwargs) -> CardLiveData:
         """
@@ -144,6 +148,30 @@ class CardLiveData:
     def empty(self) -> bool:
         return len(self) == 0
 
+    def __getstate__(self):
+        # The category index is not pickled (e.g., when sharing data between processes) since it can be rebuilt
+        state = self.__dict__.copy()
+        state['_category_index'] = None
+        del state['_category_index_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._category_index_lock = threading.Lock()
+
+    @property
+    def category_index(self) -> CategoryIndex:
+        """
+        Gets an index of the categories (e.g., drug classes) found in each file, built the first time it is used
+        (once, even if first used by concurrent requests).
+        :return: The CategoryIndex.
+        """
+        if self._category_index is None:
+            with self._category_index_lock:
+                if self._category_index is None:
+                    self._category_index = CategoryIndex(self.main_df, self.rgi_parser)
+        return self._category_index
+
     @property
     def main_df(self) -> pd.DataFrame:
         return self._main_df
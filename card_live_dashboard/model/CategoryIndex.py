@@ -0,0 +1,154 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from card_live_dashboard.model.RGIParser import RGIParser
+
+
+class CategoryIndex:
+    # Categories taken from the RGI results, mapped to the column (and whether the column has to be split into
+    # multiple values)
+    RGI_CATEGORIES = {
+        'drug_class': ('rgi_main.Drug Class', True),
+        'amr_gene_family': ('rgi_main.AMR Gene Family', True),
+        'resistance_mechanism': ('rgi_main.Resistance Mechanism', True),
+        'amr_gene': ('rgi_main.Best_Hit_ARO', False),
+    }
+
+    # Categories taken from the main table (one value per file)
+    MAIN_CATEGORIES = ['lmat_taxonomy', 'rgi_kmer_taxonomy']
+
+    CACHE_SIZE = 256
+
+    def __init__(self, main_df: pd.DataFrame, rgi_parser: RGIParser):
+        """
+        Builds a new CategoryIndex, which indexes the categories (e.g., drug classes) found in each file so that the
+        categories found in any subset of the files can be quickly looked up (e.g., to build the options available
+        for selection in the dashboard). Each category is split and sorted only once, when building the index.
+        :param main_df: The main table of data (indexed by file name).
+        :param rgi_parser: The RGI results for the files.
+        """
+        self._files = main_df.index
+
+        rgi_df = rgi_parser.df_rgi
+        self._rgi_row_files = self._files_positions(rgi_df.index)
+        self._rgi_row_cutoffs = rgi_df['rgi_main.Cut_Off'].str.lower().values
+
+        # For each category type, the (sorted) categories and pairs of (file or RGI row position, category code)
+        self._categories: Dict[str, Tuple[pd.Index, np.ndarray, np.ndarray]] = {}
+        for category_type, (column, split) in self.RGI_CATEGORIES.items():
+            if split:
+                values = rgi_parser.explode_values(column)
+            else:
+                values = rgi_df[column].reset_index(drop=True).dropna()
+            self._add_categories(category_type, values)
+
+        for column in self.MAIN_CATEGORIES:
+            if column in main_df:
+                self._add_categories(column, main_df[column].reset_index(drop=True).dropna())
+
+        self._options_cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _files_positions(self, files: pd.Index) -> np.ndarray:
+        """
+        Gets the positions of the passed files in the index. Files not in the index are given the position just
+        past the last file.
+        :param files: The files.
+        :return: The positions of the files.
+        """
+        positions = self._files.get_indexer(files)
+        positions[positions < 0] = len(self._files)
+        return positions
+
+    def _add_categories(self, category_type: str, values: pd.Series) -> None:
+        """
+        Adds the categories for a category type.
+        :param category_type: The category type.
+        :param values: The category values, indexed by the position of the file or RGI row they are found in.
+        :return: None.
+        """
+        categorical = pd.Categorical(values.values)
+        self._categories[category_type] = (categorical.categories,
+                                           values.index.values.astype(np.int64),
+                                           categorical.codes.astype(np.int64))
+
+    def categories(self, category_type: str, files: pd.Index, rgi_cutoff: str = 'all') -> List[str]:
+        """
+        Gets the categories found in a subset of the files.
+        :param category_type: The category type (e.g., 'drug_class', or a column in the main table like
+                              'lmat_taxonomy').
+        :param files: The subset of files.
+        :param rgi_cutoff: The RGI cutoff ('all' for all RGI results) for categories taken from the RGI results.
+        :return: The (sorted) categories.
+        """
+        return self._categories_in_files(category_type, self._files_positions(files), rgi_cutoff)
+
+    def _categories_in_files(self, category_type: str, files_positions: np.ndarray, rgi_cutoff: str) -> List[str]:
+        """
+        Gets the categories found in a subset of the files.
+        :param category_type: The category type.
+        :param files_positions: The positions of the subset of files (from _files_positions()).
+        :param rgi_cutoff: The RGI cutoff.
+        :return: The (sorted) categories.
+        """
+        if category_type not in self._categories:
+            raise Exception(f'Unknown value [category_type={category_type}]')
+
+        categories, positions, codes = self._categories[category_type]
+
+        selected_files = np.zeros(len(self._files) + 1, dtype=bool)
+        selected_files[files_positions] = True
+        selected_files[-1] = False
+
+        if category_type in self.RGI_CATEGORIES:
+            selected = selected_files[self._rgi_row_files]
+            if rgi_cutoff is not None and rgi_cutoff != 'all':
+                selected &= self._rgi_row_cutoffs == rgi_cutoff
+        else:
+            selected = selected_files[:-1]
+
+        return categories[np.unique(codes[selected[positions]])].tolist()
+
+    def options(self, category_type: str, files: pd.Index, rgi_cutoff: str = 'all',
+                selected_options: List[str] = None) -> List[Dict[str, str]]:
+        """
+        Gets the options (for a dropdown menu) for the categories found in a subset of the files.
+        Options are cached for each subset of files so that they can be reused across requests.
+        :param category_type: The category type (e.g., 'drug_class', or a column in the main table like
+                              'lmat_taxonomy').
+        :param files: The subset of files.
+        :param rgi_cutoff: The RGI cutoff ('all' for all RGI results) for categories taken from the RGI results.
+        :param selected_options: The currently selected options, which are always included in the returned options.
+        :return: A list of options (sorted by value) like [{'label': 'value1', 'value': 'value1'}, ...].
+                 The returned list should not be modified.
+        """
+        files_positions = np.sort(self._files_positions(files))
+        files_digest = hashlib.sha1(files_positions.tobytes()).hexdigest()
+        key = (category_type, rgi_cutoff if category_type in self.RGI_CATEGORIES else None, files_digest)
+
+        with self._lock:
+            options = self._options_cache.get(key)
+            if options is not None:
+                self._options_cache.move_to_end(key)
+
+        if options is None:
+            options = [{'label': x, 'value': x}
+                       for x in self._categories_in_files(category_type, files_positions, rgi_cutoff)]
+            with self._lock:
+                self._options_cache[key] = options
+                if len(self._options_cache) > self.CACHE_SIZE:
+                    self._options_cache.popitem(last=False)
+
+        if selected_options is not None:
+            selected_options = {x for x in selected_options if x is not None}
+            missing_options = selected_options - {o['value'] for o in options}
+            if len(missing_options) > 0:
+                options = sorted(options + [{'label': x, 'value': x} for x in missing_options],
+                                 key=lambda o: o['value'])
+
+        return options
@@ -253,16 +253,26 @@ class RGIParser:
         :return: The expanded data frame.
         """
         df_rgi_no_index = self._df_rgi.reset_index()
-        exploded_df = df_rgi_no_index[col].replace(r'^\s*$', pd.NA, regex=True).dropna()
-        exploded_df = exploded_df.replace(re.compile(f'\\s*{col}\\s*'), col, regex=True).dropna()
-        exploded_df = exploded_df.astype({col: 'object'})
-        exploded_df = exploded_df.str.split(sep).apply(
-            lambda x: [y.strip() for y in x]).explode().rename(col + '_exploded').to_frame()
+        exploded_df = self.explode_values(col, sep=sep).rename(col + '_exploded').to_frame()
         exploded_df = df_rgi_no_index.merge(
             exploded_df, how='left', left_index=True, right_index=True).set_index('filename')
 
         return exploded_df
 
+    def explode_values(self, col: str, sep: str = ';') -> pd.Series:
+        """
+        Splits the values of a column (e.g., 'rgi_main.Drug Class') in the underlying dataframe based on the passed
+        separator, with one value per row of the returned series. Empty values are dropped.
+        :param col: The column to split.
+        :param sep: The separator character.
+        :return: The split values, indexed by the position of the row in the underlying dataframe they come from.
+        """
+        values = self._df_rgi[col].reset_index(drop=True)
+        values = values.replace(r'^\s*$', pd.NA, regex=True).dropna()
+        values = values.replace(re.compile(f'\\s*{col}\\s*'), col, regex=True).dropna()
+        values = values.astype('object')
+        return values.str.split(sep).apply(lambda x: [y.strip() for y in x]).explode()
+
     def all_drugs(self) -> Set[str]:
         """
         Gets a set of all possible drug classes.
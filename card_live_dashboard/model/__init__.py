@@ -1,5 +1,46 @@
+import threading
+from pathlib import Path
+
 from card_live_dashboard.model.GeographicSummaries import GeographicSummaries
 from card_live_dashboard.service import region_codes
 
-world = region_codes.get_un_m49_regions_naturalearth()
 geographic_summaries = GeographicSummaries(region_codes)
+
+# The map region geometry (world, world_geojson) takes a while to build (reading the Natural Earth shapefile and
+# dissolving the countries into regions), so it is built when first used instead of when this module is imported
+_world_lock = threading.RLock()
+_world = {}
+_world_cache_dir = None
+
+
+def set_world_cache_dir(cache_dir: Path) -> None:
+    """
+    Sets the directory used to cache the map region geometry (world_geojson), so that it is only built once and read
+    from the cache afterwards (see GeographicRegionCodesService.get_un_m49_regions_geojson()).
+    :param cache_dir: The directory.
+    :return: None.
+    """
+    global _world_cache_dir
+    with _world_lock:
+        _world_cache_dir = cache_dir
+
+
+def _build_world(name: str):
+    """
+    Builds the map region geometry.
+    :param name: The name of the geometry ('world' for the GeoDataFrame or 'world_geojson' for the GeoJSON).
+    :return: The geometry.
+    """
+    with _world_lock:
+        if name not in _world:
+            if name == 'world':
+                _world[name] = region_codes.get_un_m49_regions_naturalearth()
+            else:
+                _world[name] = region_codes.get_un_m49_regions_geojson(cache_dir=_world_cache_dir)
+        return _world[name]
+
+
+def __getattr__(name: str):
+    if name in ('world', 'world_geojson'):
+        return _build_world(name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -4,26 +4,59 @@ from pathlib import Path
 from card_live_dashboard.model.CardLiveData import CardLiveData
 from card_live_dashboard.model.RGIParser import RGIParser
 from card_live_dashboard.model.data_modifiers.CardLiveDataModifier import CardLiveDataModifier
+from card_live_dashboard.service.CompactTaxonomy import CompactTaxonomy
+from card_live_dashboard.service.TaxonCache import TaxonCache
 from card_live_dashboard.service.TaxonomicParser import TaxonomicParser
+from card_live_dashboard.service.TrimmedTaxonomy import TrimmedTaxonomy
 
 logger = logging.getLogger(__name__)
 
 
 class AddTaxonomyModifier(CardLiveDataModifier):
 
-    def __init__(self, ncbi_taxa_file: Path):
+    def __init__(self, ncbi_taxa_file: Path, taxon_cache_dir: Path = None, compact_taxonomy: bool = False,
+                 trimmed_taxa_file: Path = None):
         """
         Builds a new modifier which will add in taxonomy categories.
 
         :param ncbi_taxa_file: The ete3 NCBI taxa SQLite database file.
+        :param taxon_cache_dir: An (optional) directory used to cache the taxonomic ids resolved from the NCBI taxa
+                                database between loads of the data. Leave as None to not cache taxonomic ids.
+        :param compact_taxonomy: Whether to read the NCBI taxa database into memory (kept between loads of the data)
+                                 and look up taxonomic ids there instead of querying the database.
+        :param trimmed_taxa_file: An (optional) file storing a trimmed copy of the NCBI taxa database with only the
+                                  taxonomic ids in the data (see TrimmedTaxonomy), which is extended with the new
+                                  taxonomic ids in the data and used in place of the full database.
         """
         super().__init__()
-        self._ncbi_taxa_file = ncbi_taxa_file
+        if trimmed_taxa_file is not None:
+            self._trimmed_taxonomy = TrimmedTaxonomy(ncbi_taxa_file, trimmed_taxa_file)
+            self._ncbi_taxa_file = trimmed_taxa_file
+        else:
+            self._trimmed_taxonomy = None
+            self._ncbi_taxa_file = ncbi_taxa_file
+
+        # The trimmed database gives the same results as the full database it is copied from, so cached taxonomic ids
+        # are keyed by the full database (which is not changed each time the trimmed database is extended). Without
+        # the full database, the trimmed database is no longer extended so is used as the key instead.
+        if trimmed_taxa_file is not None and not ncbi_taxa_file.exists():
+            taxon_cache_key_file = trimmed_taxa_file
+        else:
+            taxon_cache_key_file = ncbi_taxa_file
+        self._taxon_cache = TaxonCache(taxon_cache_dir, taxon_cache_key_file) if taxon_cache_dir is not None else None
+        self._compact_taxonomy = CompactTaxonomy(self._ncbi_taxa_file) if compact_taxonomy else None
 
     def modify(self, data: CardLiveData) -> CardLiveData:
         logger.debug(f'Main df before {data.main_df}')
-        taxonomy_parser = TaxonomicParser(ncbi_taxa_file=self._ncbi_taxa_file, df_rgi_kmer=data.rgi_kmer_df,
-                                          df_lmat=data.lmat_df)
+        if self._trimmed_taxonomy is not None:
+            self._trimmed_taxonomy.extend(data.lmat_df['lmat.ncbi_taxon_id'].dropna().unique())
+
+        if self._compact_taxonomy is not None:
+            taxonomy_parser = TaxonomicParser(compact_taxonomy=self._compact_taxonomy, df_rgi_kmer=data.rgi_kmer_df,
+                                              df_lmat=data.lmat_df, taxon_cache=self._taxon_cache)
+        else:
+            taxonomy_parser = TaxonomicParser(ncbi_taxa_file=self._ncbi_taxa_file, df_rgi_kmer=data.rgi_kmer_df,
+                                              df_lmat=data.lmat_df, taxon_cache=self._taxon_cache)
         matches_df = taxonomy_parser.create_file_matches().rename(
             columns={'lmat.taxonomy_label': 'lmat_taxonomy',
                      'rgi_kmer.taxonomy_label': 'rgi_kmer_taxonomy'
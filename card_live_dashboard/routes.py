@@ -1,14 +1,27 @@
+import hashlib
+import threading
 from pathlib import Path
 
 import flask
 
+import card_live_dashboard.model as model
+from card_live_dashboard import serialization
 from card_live_dashboard.service.CardLiveDataManager import CardLiveDataManager
 
+# Path (under the base path) to the region geometry used by the map
+WORLD_GEOJSON_PATH = '/data/world.geojson'
+
+# Time (in seconds) browsers can cache the region geometry
+WORLD_GEOJSON_MAX_AGE = 24 * 60 * 60
+
+# Path (under the base path) reporting whether the application is ready to serve requests
+READY_PATH = '/ready'
+
 
 def create_flask_routes(flask_app: flask.app.Flask, base_pathname: str, card_live_data_dir: Path) -> None:
     """
     Creates flask routes outside of Dash application. Mainly used to provided a route to
-    download all data.
+    download all data, to serve the region geometry for the map and to report readiness (e.g., to a load balancer).
     :param flask_app: The Flask application.
     :param base_pathname: The base path the application is running under.
     :param card_live_data_dir: The data directory containing CARD:Live data.
@@ -23,7 +36,36 @@ def create_flask_routes(flask_app: flask.app.Flask, base_pathname: str, card_liv
     @flask_app.route(f'{base_pathname}/data/all')
     def download_data():
         flask_app.logger.info(f'Request to download all data from [{card_live_data_dir}]')
+        if CardLiveDataManager.get_instance().card_data is None:
+            flask.abort(503)
         archive = CardLiveDataManager.get_instance().data_archive_generator()
         response = flask.Response(archive, mimetype='application/zip')
         response.headers['Content-Disposition'] = 'attachment; filename=card-live-data.zip'
         return response
+
+    # Serialized once (on the first request) since the geometry does not change while the application is running
+    world_geojson_lock = threading.Lock()
+    world_geojson_response = {}
+
+    @flask_app.route(f'{base_pathname}{WORLD_GEOJSON_PATH}')
+    def download_world_geojson():
+        with world_geojson_lock:
+            if 'content' not in world_geojson_response:
+                content = serialization.dumps(model.world_geojson)
+                world_geojson_response['content'] = content
+                world_geojson_response['etag'] = hashlib.sha1(content).hexdigest()
+
+        response = flask.Response(world_geojson_response['content'], mimetype='application/json')
+        response.set_etag(world_geojson_response['etag'])
+        response.cache_control.public = True
+        response.cache_control.max_age = WORLD_GEOJSON_MAX_AGE
+        return response.make_conditional(flask.request)
+
+    @flask_app.route(f'{base_pathname}{READY_PATH}')
+    def ready():
+        # Ready (200) as soon as there is data to serve
+        status = CardLiveDataManager.get_instance().status()
+        response = flask.Response(serialization.dumps(status), mimetype='application/json',
+                                  status=200 if status['data_version'] is not None else 503)
+        response.cache_control.no_store = True
+        return response
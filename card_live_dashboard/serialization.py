@@ -0,0 +1,99 @@
+import importlib
+import logging
+from typing import Any
+
+import dash
+import numpy as np
+import orjson
+import pandas as pd
+from flask.json.provider import DefaultJSONProvider
+from plotly.basedatatypes import BaseFigure
+from plotly.utils import PlotlyJSONEncoder
+
+logger = logging.getLogger(__name__)
+
+# Modules in Dash which serialize responses (callback outputs, the layout and the callback list). These are private to
+# Dash (as are the figure properties read in _default()), so the versions of dash and plotly are limited in setup.py
+# and test_serialization.py checks that they are still there.
+DASH_SERIALIZING_MODULES = ['dash._callback', 'dash.dash', 'dash._validate']
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Serializes an object (including Dash components, plotly figures, numpy arrays and pandas objects) to JSON.
+    Uses orjson, which encodes numpy arrays natively, and falls back to the plotly JSON encoder for any types orjson
+    cannot handle itself.
+    :param obj: The object to serialize.
+    :return: The JSON as UTF-8 encoded bytes.
+    """
+    return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+
+
+def to_json(obj: Any) -> str:
+    """
+    Serializes an object to a JSON string. A replacement for the function of the same name in Dash.
+    :param obj: The object to serialize.
+    :return: The JSON string.
+    """
+    return dumps(obj).decode('utf-8')
+
+
+def loads(s: Any) -> Any:
+    """
+    Deserializes JSON.
+    :param s: The JSON as a string or bytes.
+    :return: The deserialized object.
+    """
+    return orjson.loads(s)
+
+
+def _default(obj: Any) -> Any:
+    """
+    Converts objects orjson cannot serialize natively to something it can (orjson applies this recursively).
+    :param obj: The object to convert.
+    :return: The converted object.
+    """
+    if isinstance(obj, BaseFigure):
+        # Avoids the deep copy of all figure properties done by BaseFigure.to_plotly_json()
+        return {'data': obj._data, 'layout': obj._layout}
+    elif hasattr(obj, 'to_plotly_json'):
+        return obj.to_plotly_json()
+    elif isinstance(obj, np.ndarray):
+        # Arrays of objects (e.g., strings) or arrays which are not contiguous in memory
+        return obj.tolist()
+    elif isinstance(obj, (pd.Series, pd.Index)):
+        return obj.values
+    else:
+        return PlotlyJSONEncoder().default(obj)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """
+    A Flask JSON provider which uses the same serialization as the Dash responses.
+    """
+
+    def dumps(self, obj: Any, **kwargs) -> str:
+        return to_json(obj)
+
+    def loads(self, s: Any, **kwargs) -> Any:
+        return loads(s)
+
+
+def install(app: dash.Dash) -> None:
+    """
+    Uses this serialization for the JSON responses of the passed Dash application and its Flask server.
+    :param app: The Dash application.
+    :return: None.
+    """
+    # Dash has no option to configure how responses are serialized, so the function it imports is replaced
+    for module_name in DASH_SERIALIZING_MODULES:
+        module = importlib.import_module(module_name)
+        if not hasattr(module, 'to_json'):
+            raise Exception(f'Could not find to_json in [{module_name}], this version of dash [{dash.__version__}] '
+                            'is not supported')
+        module.to_json = to_json
+
+    app.server.json = JSONProvider(app.server)
+
@@ -0,0 +1,179 @@
+import fcntl
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """
+    Raised when a computation is not admitted because too many computations are already running or waiting.
+    """
+    pass
+
+
+class AdmissionController:
+    SLOT_POLL_INTERVAL = 0.05
+
+    def __init__(self, max_running: int = 2, max_waiting: int = 4, wait_timeout: float = 30, retry_after: int = 5,
+                 lock_dir: Path = None):
+        """
+        Creates a new AdmissionController, used to limit how many expensive computations (e.g., building the
+        dashboard) run at once so that a spike in traffic does not tie up every worker. Computations past the limit
+        wait (in a bounded queue) for a running computation to finish, and computations which cannot be queued or
+        which wait too long are rejected right away by raising Overloaded.
+
+        Computations are limited within a process using threads and, if [lock_dir] is set, across processes on the
+        same host using file locks (one lock file for each running or waiting slot).
+
+        :param max_running: The maximum number of computations running at once.
+        :param max_waiting: The maximum number of computations waiting to run.
+        :param wait_timeout: The maximum time (in seconds) a computation waits to run before it is rejected.
+        :param retry_after: The time (in seconds) clients are asked to wait before retrying a rejected request.
+        :param lock_dir: An (optional) directory used to store the lock files for limiting computations across
+                         processes on the same host. Leave as None to only limit computations within this process.
+        """
+        if max_running is None or max_running < 1:
+            raise Exception(f'Invalid value [max_running={max_running}], must be a positive number')
+        if max_waiting is None or max_waiting < 0:
+            raise Exception(f'Invalid value [max_waiting={max_waiting}], must be a non-negative number')
+        if wait_timeout is None or wait_timeout < 0:
+            raise Exception(f'Invalid value [wait_timeout={wait_timeout}], must be a non-negative number')
+
+        self._max_running = max_running
+        self._max_waiting = max_waiting
+        self._wait_timeout = wait_timeout
+        self._retry_after = retry_after
+        self._lock_dir = lock_dir
+
+        self._condition = threading.Condition()
+        self._running = 0
+        self._waiting = 0
+
+        if self._lock_dir is not None:
+            self._lock_dir.mkdir(parents=True, exist_ok=True)
+            self._running_slots = [self._lock_dir / f'running-{i}.lock' for i in range(max_running)]
+            self._waiting_slots = [self._lock_dir / f'waiting-{i}.lock' for i in range(max_waiting)]
+
+        # Lock files of the slots, opened once in each process (and not shared with forked processes, since a lock on
+        # a file opened before forking would be shared by both processes), and the slots taken by this process
+        self._slot_files = {}
+        self._slot_files_pid = None
+        self._slots_taken = set()
+
+    @property
+    def retry_after(self) -> int:
+        return self._retry_after
+
+    def run(self, func: Callable[[], Any]) -> Any:
+        """
+        Runs the passed function once it is admitted.
+        :param func: The function (taking no arguments) performing the computation.
+        :return: The result of the computation.
+        """
+        if self._lock_dir is None:
+            return self._run_process(func)
+        else:
+            return self._run_host(func)
+
+    def _run_process(self, func: Callable[[], Any]) -> Any:
+        """
+        Runs the passed function once it is admitted, limiting computations within this process.
+        :param func: The function performing the computation.
+        :return: The result of the computation.
+        """
+        with self._condition:
+            if self._running >= self._max_running:
+                if self._waiting >= self._max_waiting:
+                    raise Overloaded(f'Too many computations running [{self._running}] and waiting '
+                                     f'[{self._waiting}]')
+
+                self._waiting += 1
+                try:
+                    admitted = self._condition.wait_for(lambda: self._running < self._max_running,
+                                                        timeout=self._wait_timeout)
+                finally:
+                    self._waiting -= 1
+
+                if not admitted:
+                    raise Overloaded(f'Timed out after {self._wait_timeout}s waiting to run computation')
+
+            self._running += 1
+
+        try:
+            return func()
+        finally:
+            with self._condition:
+                self._running -= 1
+                self._condition.notify()
+
+    def _run_host(self, func: Callable[[], Any]) -> Any:
+        """
+        Runs the passed function once it is admitted, limiting computations across processes on this host.
+        :param func: The function performing the computation.
+        :return: The result of the computation.
+        """
+        running_slot = self._acquire_slot(self._running_slots)
+        if running_slot is None:
+            waiting_slot = self._acquire_slot(self._waiting_slots)
+            if waiting_slot is None:
+                raise Overloaded('Too many computations running and waiting on this host')
+
+            try:
+                deadline = time.monotonic() + self._wait_timeout
+                while running_slot is None:
+                    if time.monotonic() >= deadline:
+                        raise Overloaded(f'Timed out after {self._wait_timeout}s waiting to run computation')
+                    time.sleep(self.SLOT_POLL_INTERVAL)
+                    running_slot = self._acquire_slot(self._running_slots)
+            finally:
+                self._release_slot(waiting_slot)
+
+        try:
+            return func()
+        finally:
+            self._release_slot(running_slot)
+
+    def _acquire_slot(self, slots: List[Path]) -> Optional[Path]:
+        """
+        Acquires the first free slot (by locking its lock file).
+        :param slots: The lock files of the slots.
+        :return: The lock file of the acquired slot, or None if all slots are taken.
+        """
+        with self._condition:
+            if self._slot_files_pid != os.getpid():
+                self._slot_files = {}
+                self._slot_files_pid = os.getpid()
+                self._slots_taken = set()
+
+            for slot in slots:
+                # A lock held through the same open file is not exclusive between threads, so slots taken by other
+                # threads in this process are skipped
+                if slot in self._slots_taken:
+                    continue
+
+                if slot not in self._slot_files:
+                    self._slot_files[slot] = open(slot, 'a')
+                try:
+                    fcntl.flock(self._slot_files[slot], fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    self._slots_taken.add(slot)
+                    return slot
+                except BlockingIOError:
+                    pass
+        return None
+
+    def _release_slot(self, slot: Path) -> None:
+        """
+        Releases a slot.
+        :param slot: The lock file of the slot (from _acquire_slot()).
+        :return: None.
+        """
+        with self._condition:
+            try:
+                fcntl.flock(self._slot_files[slot], fcntl.LOCK_UN)
+            finally:
+                self._slots_taken.discard(slot)
@@ -13,6 +13,7 @@ import zipstream
 from card_live_dashboard.model.CardLiveData import CardLiveData
 from card_live_dashboard.model.RGIParser import RGIParser
 from card_live_dashboard.model.data_modifiers.CardLiveDataModifier import CardLiveDataModifier
+from card_live_dashboard.service.LoadProgress import LoadProgress
 
 logger = logging.getLogger(__name__)
 
@@ -46,10 +47,11 @@ class CardLiveDataLoader:
         """
         self._data_modifiers.extend(data_modifiers)
 
-    def read_or_update_data(self, existing_data: CardLiveData = None) -> CardLiveData:
+    def read_or_update_data(self, existing_data: CardLiveData = None, progress: LoadProgress = None) -> CardLiveData:
         """
         Given an existing data object, updates the data object with any new files.
         :param existing_data: The existing data object (None if all data should be read).
+        :param progress: An (optional) LoadProgress used to report the progress of reading the data.
         :return: The original (unmodified) data object if no updates, otherwise a new data object with additional data.
         """
         input_files = [Path(self._directory) / f for f in listdir(self._directory) if
@@ -57,7 +59,7 @@ class CardLiveDataLoader:
         input_files.sort()
 
         if existing_data is None:
-            return self.read_data(input_files)
+            return self.read_data(input_files, progress=progress)
         elif not self._directory.exists():
             raise Exception(f'Data directory [card_live_dir={self._directory}] does not exist')
         else:
@@ -72,16 +74,20 @@ class CardLiveDataLoader:
                 return existing_data
             else:
                 logger.info(f'{len(files_new)} additional samples found.')
-                return self.read_data(input_files)
+                return self.read_data(input_files, progress=progress)
 
-    def read_data(self, input_files: list = None) -> CardLiveData:
+    def read_data(self, input_files: list = None, progress: LoadProgress = None) -> CardLiveData:
         """
         Reads in the data and constructs a CardLiveData object.
         :param input_files: The (optional) list of input files. Leave as None to read from the configured directory.
                             The optional list is used so I don't have to re-read the directory after running
                             read_or_update_data().
+        :param progress: An (optional) LoadProgress used to report the progress of reading the data.
         :return: The CardLiveData object.
         """
+        if progress is None:
+            progress = LoadProgress()
+
         if input_files is None:
             if not self._directory.exists():
                 raise Exception(f'Data directory [card_live_dir={self._directory}] does not exist')
@@ -90,6 +96,7 @@ class CardLiveDataLoader:
                                path.isfile(Path(self._directory) / f)]
                 input_files.sort()
 
+        progress.start('reading files', total=len(input_files))
         json_data = []
         for input_file in input_files:
             filename = path.basename(input_file)
@@ -100,7 +107,9 @@ class CardLiveDataLoader:
                     json_data.append(json_obj)
                 except Exception:
                     logger.warning(f'File [{input_file}] is not a proper CARD:Live JSON file, skipping file.')
+            progress.advance()
 
+        progress.start('building tables')
         full_df = pd.json_normalize(json_data).set_index('filename')
         full_df = self._replace_empty_list_na(full_df, self.JSON_DATA_FIELDS)
         full_df = self._create_analysis_valid_column(full_df, self.JSON_DATA_FIELDS)
@@ -124,6 +133,7 @@ class CardLiveDataLoader:
 
         # apply data modifiers
         for modifier in self._data_modifiers:
+            progress.start(f'applying {type(modifier).__name__}')
             data = modifier.modify(data)
 
         return data
@@ -1,13 +1,13 @@
 from __future__ import annotations
 
 import logging
+import os
+import signal
+import threading
 from pathlib import Path
-from typing import Generator, List, Set, Union
+from typing import Any, Dict, Generator, List, Optional, Set, Union
 
 import numpy as np
-from apscheduler.executors.pool import ThreadPoolExecutor
-from apscheduler.jobstores.memory import MemoryJobStore
-from apscheduler.schedulers.background import BackgroundScheduler
 
 from card_live_dashboard.model.CardLiveData import CardLiveData
 from card_live_dashboard.model.data_modifiers.AddGeographicNamesModifier import AddGeographicNamesModifier
@@ -15,6 +15,8 @@ from card_live_dashboard.model.data_modifiers.AddTaxonomyModifier import AddTaxo
 from card_live_dashboard.model.data_modifiers.AntarcticaNAModifier import AntarcticaNAModifier
 from card_live_dashboard.service import region_codes
 from card_live_dashboard.service.CardLiveDataLoader import CardLiveDataLoader
+from card_live_dashboard.service.DataVersion import DataVersion
+from card_live_dashboard.service.LoadProgress import LoadProgress
 
 logger = logging.getLogger(__name__)
 
@@ -22,18 +24,35 @@ logger = logging.getLogger(__name__)
 class CardLiveDataManager:
     INSTANCE = None
 
-    def __init__(self, cardlive_home: Path):
-        ncbi_db_path = cardlive_home / 'db' / 'taxa.sqlite'
-        card_live_data_dir = cardlive_home / 'data' / 'card_live'
+    def __init__(self, cardlive_home: Path, background_load: bool = False, compact_taxonomy: bool = False,
+                 trimmed_taxonomy: bool = False):
+        """
+        Creates a new CardLiveDataManager, which loads the CARD:Live data and keeps it up to date.
+        :param cardlive_home: The CARD:Live home directory.
+        :param background_load: Whether to load the data in the background instead of waiting for it to load. Until
+                                the data is loaded, no data is served (see status()).
+        :param compact_taxonomy: Whether to look up the taxonomy of samples from an in-memory copy of the NCBI
+                                 Taxonomy database (see CompactTaxonomy) instead of querying the database.
+        :param trimmed_taxonomy: Whether to look up the taxonomy of samples from a trimmed copy of the NCBI Taxonomy
+                                 database with only the taxonomic ids in the data (see TrimmedTaxonomy).
+        """
+        self._data_loader = self.create_data_loader(cardlive_home, compact_taxonomy=compact_taxonomy,
+                                                    trimmed_taxonomy=trimmed_taxonomy)
+        self._master_pid = None
+        self._workers_forked = False
 
-        self._data_loader = CardLiveDataLoader(card_live_data_dir)
-        self._data_loader.add_data_modifiers([
-            AntarcticaNAModifier(np.datetime64('2020-07-20')),
-            AddGeographicNamesModifier(region_codes),
-            AddTaxonomyModifier(ncbi_db_path),
-        ])
+        # Held while switching to new data, so that gunicorn workers are not forked from this process part way through
+        # it (see reload_workers_on_update())
+        self._fork_lock = threading.Lock()
 
-        self._card_live_data = self._data_loader.read_or_update_data()
+        self._data_version = None
+        self._load_error = None
+        self._progress = LoadProgress()
+
+        # Imported here since only processes keeping the data up to date need it
+        from apscheduler.executors.pool import ThreadPoolExecutor
+        from apscheduler.jobstores.memory import MemoryJobStore
+        from apscheduler.schedulers.background import BackgroundScheduler
 
         self._scheduler = BackgroundScheduler(
             jobstores={
@@ -46,21 +65,156 @@ class CardLiveDataManager:
                 'max_instances': 1
             }
         )
+
+        if background_load:
+            threading.Thread(target=self._initial_load, name='card-live-data-loader', daemon=True).start()
+        else:
+            self._initial_load(raise_errors=True)
+
+    def _initial_load(self, raise_errors: bool = False) -> None:
+        """
+        Loads the current data when starting, then schedules the jobs keeping the data up to date.
+        :param raise_errors: Whether to raise errors when loading the data (otherwise errors are logged and the data is
+                             loaded by the scheduled jobs instead).
+        :return: None.
+        """
+        try:
+            data = self._data_loader.read_or_update_data(progress=self._progress)
+            self._swap_data(1, data)
+            self._progress.start('loaded')
+        except Exception as e:
+            if raise_errors:
+                raise
+            self._load_error = str(e)
+            self._progress.start('failed')
+            logger.exception(e)
+
         self._scheduler.add_job(self.update_job, 'interval', minutes=10)
         self._scheduler.start()
 
+    @staticmethod
+    def create_data_loader(cardlive_home: Path, compact_taxonomy: bool = False,
+                           trimmed_taxonomy: bool = False) -> CardLiveDataLoader:
+        """
+        Creates the loader (with all data modifiers) for the CARD:Live data.
+        :param cardlive_home: The CARD:Live home directory.
+        :param compact_taxonomy: Whether to look up the taxonomy of samples from an in-memory copy of the NCBI
+                                 Taxonomy database instead of querying the database.
+        :param trimmed_taxonomy: Whether to look up the taxonomy of samples from a trimmed copy of the NCBI Taxonomy
+                                 database with only the taxonomic ids in the data.
+        :return: The CardLiveDataLoader.
+        """
+        db_dir = cardlive_home / 'db'
+        ncbi_db_path = db_dir / 'taxa.sqlite'
+        trimmed_ncbi_db_path = db_dir / 'taxa-trimmed.sqlite' if trimmed_taxonomy else None
+        card_live_data_dir = cardlive_home / 'data' / 'card_live'
+
+        data_loader = CardLiveDataLoader(card_live_data_dir)
+        data_loader.add_data_modifiers([
+            AntarcticaNAModifier(np.datetime64('2020-07-20')),
+            AddGeographicNamesModifier(region_codes),
+            AddTaxonomyModifier(ncbi_db_path, taxon_cache_dir=db_dir, compact_taxonomy=compact_taxonomy,
+                                trimmed_taxa_file=trimmed_ncbi_db_path),
+        ])
+
+        return data_loader
+
     def update_job(self):
         logger.debug('Updating CARD:Live data.')
         try:
-            new_data = self._data_loader.read_or_update_data(self._card_live_data)
-            if new_data is not self._card_live_data:
-                logger.debug(f'Old data has {len(self._card_live_data)} samples, new data has {len(new_data)} samples')
-                self._card_live_data = new_data
+            old_data = self.card_data
+            new_data = self._data_loader.read_or_update_data(old_data)
+            if new_data is not old_data:
+                logger.debug(f'Old data has {self._samples()} samples, new data has {len(new_data)} samples')
+                version = self._data_version.version + 1 if self._data_version is not None else 1
+                self._swap_data(version, new_data)
         except Exception as e:
             logger.info('An exeption occured when attempting to load new data. Skipping new data.')
             logger.exception(e)
         logger.debug('Finished updating CARD:Live data.')
 
+    def _swap_data(self, version: int, data: CardLiveData) -> None:
+        """
+        Makes new data the current version. Requests already running keep reading the version they started with.
+        :param version: The version number of the new data.
+        :param data: The new data.
+        :return: None.
+        """
+        if self._master_pid is not None:
+            # Built before switching to the data, so that the workers forked with the data share it
+            data.category_index
+
+        with self._fork_lock:
+            self._data_version = DataVersion(version, data)
+            self._load_error = None
+            reload_workers = self._workers_forked
+        logger.info(f'Switched to data version [{version}] with {len(data)} samples')
+
+        if reload_workers:
+            self._reload_workers()
+
+    def reload_workers_on_update(self, master_pid: int) -> None:
+        """
+        Used when the application is preloaded in the gunicorn master process (preload_app), so that the data is loaded
+        once in the master and shared (copy-on-write) with the forked workers. The data is kept up to date in the master
+        and once new data is loaded, gunicorn is signalled (SIGHUP) to fork new workers sharing the new data and to
+        gracefully stop the old workers.
+
+        Workers are forked right away, even while data is loading (serving the previous data or the loading page until
+        they are replaced). A worker forked while another thread is switching to new data could inherit locks held by
+        that thread which are never released in the worker, so forking only waits for the (short) switch to finish
+        and the load progress (updated while loading) is given a new lock in the worker.
+        :param master_pid: The process id of the gunicorn master (this process).
+        :return: None.
+        """
+        self._master_pid = master_pid
+        self._prepare_for_workers()
+        os.register_at_fork(before=self._before_fork, after_in_parent=self._after_fork_in_parent,
+                            after_in_child=self._after_fork_in_child)
+
+    def _before_fork(self) -> None:
+        """
+        Called before forking a worker, waits for any switch to new data to finish.
+        :return: None.
+        """
+        self._fork_lock.acquire()
+        self._prepare_for_workers()
+
+    def _after_fork_in_parent(self) -> None:
+        """
+        Called in the master after forking a worker.
+        :return: None.
+        """
+        self._workers_forked = True
+        self._fork_lock.release()
+
+    def _after_fork_in_child(self) -> None:
+        """
+        Called in a worker after it is forked.
+        :return: None.
+        """
+        self._fork_lock.release()
+        self._progress.after_fork_in_child()
+
+    def _prepare_for_workers(self) -> None:
+        """
+        Builds everything derived from the data which the workers would otherwise each build themselves after being
+        forked, so that it is shared with the workers.
+        :return: None.
+        """
+        if self._data_version is not None:
+            self._data_version.data.category_index
+
+    def _reload_workers(self) -> None:
+        """
+        Signals gunicorn to replace the workers with workers forked with the current data, if the data is shared with
+        the workers from the master process.
+        :return: None.
+        """
+        if self._master_pid is not None:
+            logger.info(f'Reloading gunicorn workers with new data (master pid [{self._master_pid}])')
+            os.kill(self._master_pid, signal.SIGHUP)
+
     def data_archive_generator(self, file_names: Union[List[str], Set[str]] = None) -> Generator[bytes, None, None]:
         """
         Get the CARD:Live JSON files as a zipstream generator.
@@ -72,13 +226,48 @@ class CardLiveDataManager:
 
         return self._data_loader.data_archive_generator(file_names)
 
+    def _samples(self) -> int:
+        data_version = self._data_version
+        return len(data_version.data) if data_version is not None else 0
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Gets the status of loading the data.
+        :return: A dictionary with the status ('ready' once the data is loaded, 'loading' while no data can be served
+                 yet, or 'failed' if loading failed and no data can be served), the version and number of samples of the
+                 data being served and the progress of loading the data.
+        """
+        data_version = self._data_version
+        if data_version is not None:
+            status = 'ready'
+        else:
+            status = 'failed' if self._load_error is not None else 'loading'
+
+        return {
+            'status': status,
+            'data_version': data_version.version if data_version is not None else None,
+            'samples': len(data_version.data) if data_version is not None else None,
+            'error': self._load_error,
+            'progress': self._progress.as_dict(),
+        }
+
+    @property
+    def data_version(self) -> Optional[DataVersion]:
+        """
+        The current version of the data. A request should get this once and only read from the returned DataVersion,
+        so that it sees the same data throughout.
+        :return: The current DataVersion, or None if no data has been loaded yet.
+        """
+        return self._data_version
+
     @property
-    def card_data(self) -> CardLiveData:
-        return self._card_live_data
+    def card_data(self) -> Optional[CardLiveData]:
+        data_version = self._data_version
+        return data_version.data if data_version is not None else None
 
     @classmethod
-    def create_instance(cls, cardlive_home: Path) -> None:
-        cls.INSTANCE = CardLiveDataManager(cardlive_home)
+    def create_instance(cls, cardlive_home: Path, **kwargs) -> None:
+        cls.INSTANCE = CardLiveDataManager(cardlive_home, **kwargs)
 
     @classmethod
     def get_instance(cls) -> CardLiveDataManager:
@@ -0,0 +1,177 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, NamedTuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class TaxonomyTables(NamedTuple):
+    # Parent of each taxonomic id (indexed by taxonomic id), 0 for the root and -1 for ids not in the taxonomy
+    parents: np.ndarray
+    # Rank of each taxonomic id, as an index into rank_names (-1 for ids not in the taxonomy)
+    ranks: np.ndarray
+    rank_names: Dict[str, int]
+    # Name of taxonomic id t is names[name_offsets[t]:name_offsets[t + 1]] (UTF-8 encoded)
+    name_offsets: np.ndarray
+    names: bytes
+    # Taxonomic ids which were merged into other ids (sorted by the old id)
+    merged_old: np.ndarray
+    merged_new: np.ndarray
+
+
+class CompactTaxonomy:
+    READ_BATCH_SIZE = 100000
+
+    def __init__(self, ncbi_taxa_file: Path):
+        """
+        Creates a new CompactTaxonomy, an in-memory copy of the parts of the NCBI Taxonomy database needed to limit
+        taxonomic ids to a rank and to name them. The parent and rank of each taxonomic id are stored in numpy arrays
+        indexed by the taxonomic id (and the names in a single string), so the ancestors of many taxonomic ids can be
+        followed at once. As it only reads from numpy arrays, a CompactTaxonomy (unlike an NCBITaxa object) can be used
+        from any thread.
+
+        The taxonomy is read from the database file on first use, and read again if the file is updated.
+
+        :param ncbi_taxa_file: The ete3 NCBI taxa SQLite database file.
+        """
+        self._ncbi_taxa_file = ncbi_taxa_file
+        self._lock = threading.Lock()
+        self._tables = None
+        self._tables_key = None
+
+    def limit_to_rank(self, taxon_ids: Iterable[int], min_rank: str) -> Dict[int, int]:
+        """
+        Given taxonomic ids and a rank limit each taxonomic id so that it is at the specified rank or higher.
+        :param taxon_ids: The taxonomic ids.
+        :param min_rank: The minimum limit for the rank (e.g., 'species', or 'family').
+        :return: A dictionary mapping each passed taxonomic id to the taxonomic id that is at or above the passed
+                 min_rank (the ancestor at that rank nearest the root), or the original id if the passed rank was not
+                 found in the lineage (or the id is not in the taxonomy).
+        """
+        tables = self._get_tables()
+        original_ids = np.fromiter(taxon_ids, dtype=np.int64)
+        limited_ids = original_ids.copy()
+
+        rank = tables.rank_names.get(min_rank)
+        current = self._translate_merged(original_ids, tables)
+        active = self._in_taxonomy(current, tables)
+
+        # Follows the parents of all ids at once up to the root, recording the ids at the rank along the way (so the
+        # last one recorded is the one nearest the root)
+        positions = np.flatnonzero(active)
+        current = current[positions]
+        while rank is not None and len(positions) > 0:
+            at_rank = tables.ranks[current] == rank
+            limited_ids[positions[at_rank]] = current[at_rank]
+
+            parents = tables.parents[current]
+            has_parent = (parents > 0) & (parents != current)
+            positions = positions[has_parent]
+            current = parents[has_parent]
+
+        return dict(zip(original_ids.tolist(), limited_ids.tolist()))
+
+    def get_names(self, taxon_ids: Iterable[int]) -> Dict[int, str]:
+        """
+        Gets the names of taxonomic ids (merged ids are given the name of the id they were merged into).
+        :param taxon_ids: The taxonomic ids.
+        :return: A dictionary mapping each of the passed taxonomic ids in the taxonomy to its name.
+        """
+        tables = self._get_tables()
+        original_ids = np.fromiter(taxon_ids, dtype=np.int64)
+        current = self._translate_merged(original_ids, tables)
+        found = self._in_taxonomy(current, tables)
+
+        starts = tables.name_offsets[current[found]]
+        ends = tables.name_offsets[current[found] + 1]
+        return {taxon_id: tables.names[start:end].decode('utf-8')
+                for taxon_id, start, end in zip(original_ids[found].tolist(), starts.tolist(), ends.tolist())}
+
+    def _in_taxonomy(self, taxon_ids: np.ndarray, tables: TaxonomyTables) -> np.ndarray:
+        """
+        Finds which taxonomic ids are in the taxonomy.
+        :param taxon_ids: The taxonomic ids.
+        :param tables: The taxonomy tables.
+        :return: A boolean array which is True for the ids in the taxonomy.
+        """
+        in_range = (taxon_ids > 0) & (taxon_ids < len(tables.parents))
+        found = in_range.copy()
+        found[in_range] = tables.parents[taxon_ids[in_range]] >= 0
+        return found
+
+    def _translate_merged(self, taxon_ids: np.ndarray, tables: TaxonomyTables) -> np.ndarray:
+        """
+        Translates taxonomic ids which were merged into other ids.
+        :param taxon_ids: The taxonomic ids.
+        :param tables: The taxonomy tables.
+        :return: An array with the ids merged into other ids replaced with the new ids.
+        """
+        if len(tables.merged_old) == 0:
+            return taxon_ids.copy()
+
+        positions = np.minimum(np.searchsorted(tables.merged_old, taxon_ids), len(tables.merged_old) - 1)
+        merged = tables.merged_old[positions] == taxon_ids
+        return np.where(merged, tables.merged_new[positions], taxon_ids)
+
+    def _get_tables(self) -> TaxonomyTables:
+        """
+        Gets the taxonomy tables, reading them from the database file on first use or if the file was updated.
+        :return: The taxonomy tables.
+        """
+        stat = os.stat(self._ncbi_taxa_file)
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if self._tables_key != key:
+                self._tables = self._read_tables()
+                self._tables_key = key
+            return self._tables
+
+    def _read_tables(self) -> TaxonomyTables:
+        """
+        Reads the taxonomy tables from the database file.
+        :return: The taxonomy tables.
+        """
+        start_time = time.time()
+        db = sqlite3.connect(f'file:{self._ncbi_taxa_file}?mode=ro', uri=True)
+        try:
+            max_taxid = db.execute('SELECT MAX(taxid) FROM species').fetchone()[0] or 0
+            parents = np.full(max_taxid + 1, -1, dtype=np.int32)
+            ranks = np.full(max_taxid + 1, -1, dtype=np.int16)
+            name_lengths = np.zeros(max_taxid + 1, dtype=np.int64)
+            rank_names = {}
+            names = []
+
+            # Ordered by taxonomic id so that the names are concatenated in the order of the ids
+            cursor = db.execute('SELECT taxid, CAST(parent AS INTEGER), rank, spname FROM species ORDER BY taxid')
+            while True:
+                rows = cursor.fetchmany(self.READ_BATCH_SIZE)
+                if len(rows) == 0:
+                    break
+
+                taxids, batch_parents, batch_ranks, batch_names = zip(*rows)
+                taxids = np.array(taxids, dtype=np.int64)
+                parents[taxids] = batch_parents
+                ranks[taxids] = [rank_names.setdefault(rank, len(rank_names)) for rank in batch_ranks]
+
+                encoded_names = [(name or '').encode('utf-8') for name in batch_names]
+                name_lengths[taxids] = [len(name) for name in encoded_names]
+                names.extend(encoded_names)
+
+            merged = np.array(db.execute('SELECT taxid_old, taxid_new FROM merged').fetchall(),
+                              dtype=np.int64).reshape(-1, 2)
+            merged = merged[np.argsort(merged[:, 0], kind='stable')]
+        finally:
+            db.close()
+
+        tables = TaxonomyTables(parents=parents, ranks=ranks, rank_names=rank_names,
+                                name_offsets=np.concatenate([[0], np.cumsum(name_lengths)]),
+                                names=b''.join(names), merged_old=merged[:, 0], merged_new=merged[:, 1])
+        logger.info(f'Read {len(names)} taxonomic ids from [{self._ncbi_taxa_file}] in '
+                    f'{time.time() - start_time:0.1f} seconds')
+        return tables
@@ -11,6 +11,45 @@ logger = logging.getLogger(__name__)
 
 
 class ConfigManager:
+    REQUEST_COALESCING_DEFAULTS = {
+        'enabled': True,
+        'timeout': 60,
+        'per_host': True,
+    }
+
+    RESPONSE_COMPRESSION_DEFAULTS = {
+        'enabled': True,
+        'min_size': 1024,
+        'static_max_age': 3600,
+    }
+
+    REQUEST_CANCELLATION_DEFAULTS = {
+        'enabled': True,
+        'per_host': True,
+    }
+
+    ADMISSION_CONTROL_DEFAULTS = {
+        'enabled': True,
+        'max_running': 2,
+        'max_waiting': 4,
+        'wait_timeout': 30,
+        'retry_after': 5,
+        'per_host': True,
+    }
+
+    STARTUP_DEFAULTS = {
+        'background_load': True,
+    }
+
+    FIGURE_BUILDING_DEFAULTS = {
+        'parallel': False,
+        'workers': 5,
+    }
+
+    TAXONOMY_DEFAULTS = {
+        'in_memory': False,
+        'trimmed': False,
+    }
 
     def __init__(self, card_live_home: Path):
         if card_live_home is None:
@@ -40,6 +79,21 @@ class ConfigManager:
             elif not config['url_base_pathname'].endswith('/'):
                 config['url_base_pathname'] = config['url_base_pathname'] + '/'
 
+            config['request_coalescing'] = {**self.REQUEST_COALESCING_DEFAULTS,
+                                            **(config.get('request_coalescing') or {})}
+            config['response_compression'] = {**self.RESPONSE_COMPRESSION_DEFAULTS,
+                                              **(config.get('response_compression') or {})}
+            config['request_cancellation'] = {**self.REQUEST_CANCELLATION_DEFAULTS,
+                                              **(config.get('request_cancellation') or {})}
+            config['admission_control'] = {**self.ADMISSION_CONTROL_DEFAULTS,
+                                           **(config.get('admission_control') or {})}
+            config['startup'] = {**self.STARTUP_DEFAULTS,
+                                 **(config.get('startup') or {})}
+            config['figure_building'] = {**self.FIGURE_BUILDING_DEFAULTS,
+                                         **(config.get('figure_building') or {})}
+            config['taxonomy'] = {**self.TAXONOMY_DEFAULTS,
+                                  **(config.get('taxonomy') or {})}
+
             return config
 
     def write_example_config(self):
@@ -0,0 +1,53 @@
+import logging
+import weakref
+from typing import Hashable
+
+from card_live_dashboard.model.CardLiveData import CardLiveData
+
+logger = logging.getLogger(__name__)
+
+
+class DataVersion:
+    __slots__ = ('_version', '_data', '_key', '__weakref__')
+
+    def __init__(self, version: int, data: CardLiveData):
+        """
+        Creates a new DataVersion, an immutable pairing of a version of the CARD:Live data with its version number.
+        A request captures the current DataVersion once when it starts and reads only from it, so that it sees a
+        single consistent version of the data even if newer data is loaded while the request is running. An old
+        version is released (by reference counting) once the last request reading it finishes.
+        :param version: The version number, which increases each time new data is loaded.
+        :param data: The data.
+        """
+        self._version = version
+        self._data = data
+
+        # Includes the contents of the data so the key is only shared by processes which loaded the same data, even if
+        # each process numbers the versions it loads itself
+        self._key = (version, len(data), str(data.latest_update()))
+
+        weakref.finalize(self, logger.debug, f'Released data version [{version}]')
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def data(self) -> CardLiveData:
+        return self._data
+
+    @property
+    def key(self) -> Hashable:
+        """
+        The key identifying this version of the data, to be used for all caches of results computed from the data.
+        :return: The key.
+        """
+        return self._key
+
+    def __setattr__(self, name, value):
+        if hasattr(self, '_key'):
+            raise AttributeError(f'{type(self).__name__} is immutable')
+        super().__setattr__(name, value)
+
+    def __repr__(self) -> str:
+        return f'DataVersion(version={self._version}, samples={len(self._data)})'
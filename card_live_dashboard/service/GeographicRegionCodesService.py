@@ -1,11 +1,22 @@
+from __future__ import annotations
+
+import hashlib
+import importlib.util
+import json
 import logging
+import os
+import tempfile
 from pathlib import Path
-from typing import Dict, Union, Callable
+from typing import Any, Dict, Union, Callable, TYPE_CHECKING
 
-import geopandas
 import numpy as np
 import pandas as pd
-import shapely.geometry.multipolygon as multipolygon
+
+# geopandas and shapely are slow to import and only needed to build the map region geometry, so they are imported
+# when first used
+if TYPE_CHECKING:
+    import geopandas
+    import shapely.geometry.multipolygon as multipolygon
 
 logger = logging.getLogger(__name__)
 
@@ -16,12 +27,27 @@ class GeographicRegionCodesService:
     COUNTRY_CODE = 'geo_area_iso3_code'
     NAME_COL = 'geo_area_name_standard'
 
+    # Increase when changing how the regions are built, so that regions cached by older versions are not used
+    REGIONS_CACHE_VERSION = 1
+
     def __init__(self, unm49_filepath: Path, use_default_additional_mappings: bool = True):
+        self._unm49_filepath = unm49_filepath
         self._unm49_data = pd.read_csv(unm49_filepath, dtype=str)
         self._unm49_mapping = self._load_unm49_region_mapping_table(self._unm49_data)
 
+        # Region names (and the codes as in the UN M49 table) looked up by the position of the code in
+        # _region_name_codes, with a missing value at the end for codes which are not found (position -1)
+        region_names = self._unm49_mapping[[self.TOP_REGION_NAME, self.NAME_COL]].dropna().drop_duplicates(
+            subset=self.TOP_REGION_NAME, keep='first')
+        self._region_name_codes = pd.Index(region_names[self.TOP_REGION_NAME].astype('int64').values)
+        self._region_names = np.append(region_names[self.NAME_COL].values.astype(object), np.nan)
+        self._region_code_names = np.append(region_names[self.TOP_REGION_NAME].values.astype(object), np.nan)
+
         self._mapping_functions = []
 
+        # Names given by the mapping functions to codes which are not UN M49 codes
+        self._na_names = {}
+
         if use_default_additional_mappings:
             self.insert_geo_name_na_mapping(lambda x: 'Multiple regions' if int(x) == 0 else None)
             self.insert_geo_name_na_mapping(lambda x: 'N/A' if int(x) < 0 else None)
@@ -42,6 +68,7 @@ class GeographicRegionCodesService:
         :return: None
         """
         self._mapping_functions.append(function)
+        self._na_names = {}
 
     def _load_unm49_region_mapping_table(self, df: pd.DataFrame) -> pd.DataFrame:
         df_global = df[['Global Code', 'Global Name', 'M49 Code', 'ISO-alpha3 Code']].rename(
@@ -71,28 +98,48 @@ class GeographicRegionCodesService:
         return pd.concat([df_global, df_region, df_sub_region, df_intermediate_region, df_m49]).drop_duplicates(
             keep='first')
 
-    def _apply_mapping_functions(self, data: pd.DataFrame, region_column: str):
-        for mapping_function in self._mapping_functions:
-            data.loc[data[self.NAME_COL].isna(),
-                     self.NAME_COL] = data.loc[data[self.NAME_COL].isna(),
-                                               region_column].apply(mapping_function)
-
-        return data
+    def _na_name(self, code: Any) -> Union[str, float]:
+        """
+        Gets the name given by the mapping functions to a code which is not a UN M49 code.
+        :param code: The code.
+        :return: The name from the first mapping function giving a name, or NaN if none does.
+        """
+        name = self._na_names.get(code)
+        if name is None:
+            name = np.nan
+            for mapping_function in self._mapping_functions:
+                mapped_name = mapping_function(code)
+                if mapped_name is not None:
+                    name = mapped_name
+                    break
+            self._na_names[code] = name
+
+        return name
 
     def add_region_standard_names(self, data: pd.DataFrame, region_column: str) -> pd.DataFrame:
-        original_type = data[region_column].dtype
-        data = data.astype({region_column: str})
-        region_standard_names = self._unm49_mapping[[self.TOP_REGION_NAME, self.NAME_COL]].drop_duplicates(
-            keep='first').dropna()
+        """
+        Adds the standard names of the UN M49 regions (and the region codes as in the UN M49 table) to the data.
+        Codes which are not UN M49 codes are named using the mapping functions (see insert_geo_name_na_mapping()),
+        which are called once for each distinct code.
+        :param data: The data.
+        :param region_column: The column containing the (numeric) region codes.
+        :return: A copy of the data with the added columns.
+        """
+        codes = data[region_column]
+        if not pd.api.types.is_integer_dtype(codes.dtype):
+            codes = pd.to_numeric(codes, errors='coerce')
 
-        data_expanded = data.reset_index().merge(region_standard_names, how='left', left_on=region_column,
-                                                 right_on=self.TOP_REGION_NAME).astype({region_column: original_type})
-        if not data.index.empty:
-            data_expanded = data_expanded.set_index(data.index.name)
+        positions = self._region_name_codes.get_indexer(codes)
+        names = self._region_names.take(positions)
 
-        data_expanded = self._apply_mapping_functions(data_expanded, region_column)
+        not_found = positions == -1
+        if not_found.any():
+            not_found_codes = data[region_column].values[not_found]
+            na_names = {code: self._na_name(code) for code in pd.unique(not_found_codes)}
+            names[not_found] = pd.Series(not_found_codes).map(na_names).values
 
-        return data_expanded
+        return data.assign(**{self.TOP_REGION_NAME: self._region_code_names.take(positions),
+                              self.NAME_COL: names})
 
     def expand_to_country_codes(self, data: pd.DataFrame, region_column: str) -> pd.DataFrame:
         data = data.astype({region_column: str})
@@ -130,7 +177,129 @@ class GeographicRegionCodesService:
 
         return world
 
+    def regions_geojson(self, world: geopandas.GeoDataFrame, tolerance: float = 0.05,
+                        precision: int = 2) -> Dict[str, Any]:
+        """
+        Builds a compact GeoJSON representation of the passed regions, meant to be sent once to the browser
+        instead of embedding the full geometry in every map figure. Geometries are simplified and coordinates
+        rounded to the passed precision.
+
+        :param world: The GeoDataFrame of regions (e.g., from get_un_m49_regions_naturalearth()).
+        :param tolerance: The tolerance (in coordinate units, degrees) used to simplify geometries.
+        :param precision: The number of decimal places to round coordinates to.
+        :return: A dictionary of the GeoJSON FeatureCollection.
+        """
+        world_simplified = world.copy()
+        world_simplified['geometry'] = world_simplified.geometry.simplify(tolerance, preserve_topology=True)
+
+        geojson = world_simplified.__geo_interface__
+        geojson.pop('bbox', None)
+        for feature in geojson['features']:
+            feature.pop('bbox', None)
+            feature['geometry']['coordinates'] = self._round_coordinates(feature['geometry']['coordinates'],
+                                                                         precision)
+
+        return geojson
+
+    def _round_coordinates(self, coordinates, precision: int) -> list:
+        """
+        Rounds the (nested) list of coordinates of a GeoJSON geometry.
+        :param coordinates: The coordinates.
+        :param precision: The number of decimal places to round to.
+        :return: The rounded coordinates, as (nested) lists.
+        """
+        if len(coordinates) > 0 and isinstance(coordinates[0], (int, float)):
+            return [round(c, precision) for c in coordinates]
+        else:
+            return [self._round_coordinates(c, precision) for c in coordinates]
+
+    def get_un_m49_regions_geojson(self, cache_dir: Path = None, tolerance: float = 0.05,
+                                   precision: int = 2) -> Dict[str, Any]:
+        """
+        Gets the compact GeoJSON of the UN M49 regions (see get_un_m49_regions_naturalearth() and regions_geojson()).
+        Building the regions takes a while and always gives the same result for the same inputs, so the GeoJSON is
+        cached in a file keyed by a hash of the inputs (the Natural Earth map, the UN M49 codes and the parameters)
+        and read from there afterwards.
+
+        :param cache_dir: The (optional) directory storing the cached GeoJSON. Leave as None to not cache the GeoJSON.
+        :param tolerance: The tolerance (in coordinate units, degrees) used to simplify geometries.
+        :param precision: The number of decimal places to round coordinates to.
+        :return: A dictionary of the GeoJSON FeatureCollection.
+        """
+        if cache_dir is None:
+            return self.regions_geojson(self.get_un_m49_regions_naturalearth(), tolerance=tolerance,
+                                        precision=precision)
+
+        cache_file = cache_dir / f'un-m49-regions-{self._regions_cache_key(tolerance, precision)}.json'
+        try:
+            with open(cache_file, 'rb') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f'Could not read cached regions [{cache_file}], building regions instead: {e}')
+
+        geojson = self.regions_geojson(self.get_un_m49_regions_naturalearth(), tolerance=tolerance,
+                                       precision=precision)
+        try:
+            self._write_regions_cache(cache_file, geojson)
+        except OSError as e:
+            logger.warning(f'Could not write cached regions [{cache_file}]: {e}')
+
+        return geojson
+
+    def _regions_cache_key(self, tolerance: float, precision: int) -> str:
+        """
+        Builds the key identifying the inputs of the regions GeoJSON.
+        :param tolerance: The tolerance used to simplify geometries.
+        :param precision: The number of decimal places coordinates are rounded to.
+        :return: The key.
+        """
+        digest = hashlib.sha1(f'{self.REGIONS_CACHE_VERSION}:{tolerance}:{precision}'.encode('utf-8'))
+        for input_file in sorted(self._naturalearth_dir().glob('naturalearth_lowres.*')) + [self._unm49_filepath]:
+            with open(input_file, 'rb') as f:
+                digest.update(hashlib.sha1(f.read()).digest())
+
+        return digest.hexdigest()
+
+    def _naturalearth_dir(self) -> Path:
+        """
+        Gets the directory of the Natural Earth map included with geopandas (without importing geopandas).
+        :return: The directory.
+        """
+        spec = importlib.util.find_spec('geopandas')
+        return Path(spec.submodule_search_locations[0], 'datasets', 'naturalearth_lowres')
+
+    def _write_regions_cache(self, cache_file: Path, geojson: Dict[str, Any]) -> None:
+        """
+        Atomically writes the cached regions GeoJSON, removing regions cached for other inputs.
+        :param cache_file: The file to write.
+        :param geojson: The regions GeoJSON.
+        :return: None.
+        """
+        cache_dir = cache_file.parent
+        cache_dir.mkdir(parents=True, exist_ok=True)
+
+        fd, tmp_file = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(geojson, f, separators=(',', ':'))
+            os.replace(tmp_file, cache_file)
+        except Exception:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+
+        for old_cache_file in cache_dir.glob('un-m49-regions-*.json'):
+            if old_cache_file != cache_file:
+                try:
+                    old_cache_file.unlink()
+                except FileNotFoundError:
+                    pass
+
     def get_un_m49_regions_naturalearth(self) -> geopandas.GeoDataFrame:
+        import geopandas
+
         world = geopandas.read_file(geopandas.datasets.get_path('naturalearth_lowres'))
 
         # Fix ISO-alpha3 codes which are not set.
@@ -156,6 +325,8 @@ class GeographicRegionCodesService:
         :param world: The GeoDataFrame representing the world.
         :return: A new GeoDataFrame with France and French Guiana split (or the original data frame if some error occured).
         """
+        import geopandas
+
         world_new = world
 
         if len(world[world['iso_a3'] == 'GUF']) != 0:
@@ -215,5 +386,7 @@ class GeographicRegionCodesService:
                            )
             return None
         else:
+            import shapely.geometry.multipolygon as multipolygon
+
             split_regions['FRA'] = multipolygon.MultiPolygon(split_regions['FRA'])
             return split_regions
@@ -0,0 +1,61 @@
+import threading
+import time
+from typing import Any, Dict
+
+
+class LoadProgress:
+
+    def __init__(self):
+        """
+        Creates a new LoadProgress, used to keep track of how far along loading the CARD:Live data is so that it can
+        be reported (e.g., to a load balancer or to users waiting on the dashboard) while the data loads.
+        """
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._stage = None
+        self._done = None
+        self._total = None
+
+    def after_fork_in_child(self) -> None:
+        """
+        Replaces the lock in a forked process, since it may have been held by another thread (loading the data) in the
+        parent process when forking.
+        :return: None.
+        """
+        self._lock = threading.Lock()
+
+    def start(self, stage: str, total: int = None) -> None:
+        """
+        Starts a new stage of loading the data.
+        :param stage: A description of the stage (e.g., 'reading files').
+        :param total: The (optional) number of steps in the stage, if the stage can report its progress.
+        :return: None.
+        """
+        with self._lock:
+            self._stage = stage
+            self._done = 0 if total is not None else None
+            self._total = total
+
+    def advance(self, steps: int = 1) -> None:
+        """
+        Records steps completed in the current stage.
+        :param steps: The number of steps completed.
+        :return: None.
+        """
+        with self._lock:
+            if self._done is not None:
+                self._done += steps
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Gets the progress as a dictionary.
+        :return: A dictionary with the current stage (and the steps done and total steps in the stage, if known) and
+                 the time (in seconds) since loading started.
+        """
+        with self._lock:
+            return {
+                'stage': self._stage,
+                'done': self._done,
+                'total': self._total,
+                'elapsed': round(time.monotonic() - self._started, 1),
+            }
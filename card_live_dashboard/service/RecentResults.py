@@ -0,0 +1,61 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+class RecentResults:
+
+    def __init__(self, max_size: int = 32):
+        """
+        Creates a new RecentResults, which keeps the most recently computed dashboards so that a dashboard for a
+        similar selection can be shown when the server is too busy to compute a new one.
+        :param max_size: The maximum number of results to keep.
+        """
+        if max_size is None or max_size < 1:
+            raise Exception(f'Invalid value [max_size={max_size}], must be a positive number')
+
+        self._max_size = max_size
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, data_key: Hashable, selections: Tuple[Tuple[str, Any], ...], result: Any) -> None:
+        """
+        Adds a result.
+        :param data_key: The key identifying the version of the data the result was computed from.
+        :param selections: The selections the result was computed for, as (sorted) pairs of (name, value).
+        :param result: The result.
+        :return: None.
+        """
+        key = (data_key, selections)
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            if len(self._results) > self._max_size:
+                self._results.popitem(last=False)
+
+    def nearest(self, data_key: Hashable,
+                selections: Tuple[Tuple[str, Any], ...]) -> Optional[Tuple[Tuple[Tuple[str, Any], ...], Any]]:
+        """
+        Gets the result for the selections nearest to the passed selections (the one with the fewest different
+        selections, or the most recent for ties) for the same version of the data.
+        :param data_key: The key identifying the version of the data.
+        :param selections: The selections, as (sorted) pairs of (name, value).
+        :return: A tuple of (selections, result) for the nearest result, or None if there are no results for this
+                 version of the data.
+        """
+        selections_dict = dict(selections)
+
+        nearest = None
+        nearest_distance = None
+        with self._lock:
+            # Most recent first so that ties go to the most recent result
+            for (result_data_key, result_selections), result in reversed(self._results.items()):
+                if result_data_key != data_key:
+                    continue
+
+                distance = sum(1 for name, value in result_selections if selections_dict.get(name) != value)
+                if nearest_distance is None or distance < nearest_distance:
+                    nearest = (result_selections, result)
+                    nearest_distance = distance
+
+        return nearest
@@ -0,0 +1,241 @@
+import fcntl
+import hashlib
+import logging
+import os
+import pickle
+import stat
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _InFlight:
+    """
+    Keeps track of a single in-flight computation within this process.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RequestCoalescer:
+    LOCK_POLL_INTERVAL = 0.05
+
+    # Lock files are shared between keys by the first characters of the key digest
+    # so that the number of lock files stays bounded. The computation holding a lock marks which key it is running
+    # (with a '.running' file), and requests for the same key wait on this marker (not the shared lock) so that they
+    # never wait on computations for other keys sharing the lock.
+    LOCK_STRIPE_CHARS = 2
+
+    # File suffixes for computations which are running, being waited on, and their results
+    HOST_FILE_SUFFIXES = ['.running', '.waiting', '.pickle']
+
+    def __init__(self, timeout: float = 60, lock_dir: Path = None):
+        """
+        Creates a new RequestCoalescer, used to make concurrent requests with identical inputs wait on a single
+        computation instead of each running the computation independently (e.g., when a link to the dashboard
+        gets shared and many identical requests arrive at once).
+
+        Requests are coalesced within a process using threads and, if [lock_dir] is set, across processes on the
+        same host using file locks (so that separate gunicorn workers can share a single computation).
+
+        :param timeout: The maximum time (in seconds) to wait on an in-flight computation before falling back to
+                        running the computation directly.
+        :param lock_dir: An (optional) directory used to store lock files and results for coalescing requests across
+                         processes on the same host. Leave as None to only coalesce requests within this process.
+                         Results are pickled, so only results written by this user (and not writable by others) are
+                         read, but anyone able to write to this directory as this user can run code in this process.
+        """
+        if timeout is None or timeout <= 0:
+            raise Exception(f'Invalid value [timeout={timeout}], must be a positive number')
+
+        self._timeout = timeout
+        self._lock_dir = lock_dir
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Hashable, _InFlight] = {}
+        self._last_cleanup = time.monotonic()
+
+        if self._lock_dir is not None:
+            self._lock_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+    def run(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """
+        Runs the passed function, or waits on an already in-flight call of a function with the same key.
+        :param key: The key identifying the computation. Must have a stable repr() if coalescing across processes.
+        :param func: The function (taking no arguments) performing the computation.
+        :return: The result of the computation.
+        """
+        with self._lock:
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _InFlight()
+                self._in_flight[key] = flight
+
+        if leader:
+            try:
+                flight.result = self._run_host(key, func)
+                return flight.result
+            except Exception as e:
+                flight.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._in_flight[key]
+                flight.done.set()
+        else:
+            if not flight.done.wait(self._timeout):
+                logger.warning(f'Timed out after {self._timeout}s waiting on in-flight request, running request '
+                               'directly.')
+                return func()
+            elif flight.error is not None:
+                logger.debug(f'In-flight request failed with [{flight.error}], running request directly.')
+                return func()
+            else:
+                return flight.result
+
+    def _run_host(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """
+        Runs the passed function, coalescing with identical computations in other processes on the same host.
+        :param key: The key identifying the computation.
+        :param func: The function performing the computation.
+        :return: The result of the computation.
+        """
+        if self._lock_dir is None:
+            return func()
+
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        lock_file = self._lock_dir / f'{digest[:self.LOCK_STRIPE_CHARS]}.lock'
+        running_file = self._lock_dir / f'{digest}.running'
+        waiting_file = self._lock_dir / f'{digest}.waiting'
+        result_file = self._lock_dir / f'{digest}.pickle'
+
+        with open(lock_file, 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                if not running_file.exists():
+                    # The lock is held by a computation for a different key which shares the lock file
+                    logger.debug('Request lock held for a different request, running request directly.')
+                    return func()
+                return self._wait_host(running_file, waiting_file, result_file, func)
+
+            try:
+                running_file.touch()
+                result = func()
+
+                # Only share the result if other processes are waiting on it
+                if waiting_file.exists():
+                    self._write_result(result_file, result)
+                    self._unlink(waiting_file)
+
+                return result
+            finally:
+                self._unlink(running_file)
+                fcntl.flock(lock, fcntl.LOCK_UN)
+                self._remove_expired_files()
+
+    def _wait_host(self, running_file: Path, waiting_file: Path, result_file: Path, func: Callable[[], Any]) -> Any:
+        """
+        Waits on a computation for the same key running in another process on this host.
+        :param running_file: The file marking that the other process is running the computation (removed once it
+                             finishes).
+        :param waiting_file: A file used to signal to the other process that its result is being waited on.
+        :param result_file: The file the other process writes its result to.
+        :param func: The function performing the computation, used if waiting times out or no result is available.
+        :return: The result of the computation.
+        """
+        wait_start = time.time()
+        waiting_file.touch()
+
+        deadline = time.monotonic() + self._timeout
+        while True:
+            # Checked before the marker, since the result is written before the marker is removed
+            running = running_file.exists()
+            result = self._read_result(result_file, wait_start)
+            if result is not None:
+                return result[0]
+            elif not running:
+                logger.debug('No result available from request in another process, running request directly.')
+                return func()
+            elif time.monotonic() >= deadline:
+                logger.warning(f'Timed out after {self._timeout}s waiting on request in another process, '
+                               'running request directly.')
+                return func()
+            time.sleep(self.LOCK_POLL_INTERVAL)
+
+    def _read_result(self, result_file: Path, wait_start: float) -> Optional[Tuple[Any]]:
+        """
+        Reads the result of a computation written by another process.
+        :param result_file: The file the result is written to.
+        :param wait_start: The time waiting on the result started (older results are not used).
+        :return: A tuple containing the result, or None if no result is available.
+        """
+        try:
+            if result_file.exists() and result_file.stat().st_mtime >= wait_start:
+                with open(result_file, 'rb') as f:
+                    # Unpickling can run arbitrary code, so only results written by this user are read
+                    file_stat = os.fstat(f.fileno())
+                    if file_stat.st_uid != os.getuid() or file_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+                        logger.warning(f'Not reading result [{result_file}], which is not owned by this user or is '
+                                       'writable by others')
+                        return None
+                    return (pickle.load(f),)
+        except Exception as e:
+            logger.debug(f'Could not read result [{result_file}] from another process: {e}')
+        return None
+
+    def _remove_expired_files(self) -> None:
+        """
+        Removes files (results, and markers of running or waited on computations) left by previous computations which
+        are too old for any process to still be using (e.g., from waits which timed out or processes which exited
+        while computing). Runs at most once per timeout in each process.
+        :return: None.
+        """
+        with self._lock:
+            if time.monotonic() - self._last_cleanup < self._timeout:
+                return
+            self._last_cleanup = time.monotonic()
+
+        expired_time = time.time() - 2 * self._timeout
+        for suffix in self.HOST_FILE_SUFFIXES:
+            for host_file in self._lock_dir.glob(f'*{suffix}'):
+                try:
+                    if host_file.stat().st_mtime < expired_time:
+                        host_file.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def _unlink(self, file: Path) -> None:
+        """
+        Removes a file, if it exists.
+        :param file: The file.
+        :return: None.
+        """
+        try:
+            file.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _write_result(self, result_file: Path, result: Any) -> None:
+        """
+        Atomically writes the result of a computation so it can be read by other processes.
+        :param result_file: The file to write to.
+        :param result: The result to write.
+        :return: None.
+        """
+        fd, tmp_file = tempfile.mkstemp(dir=self._lock_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, result_file)
+        except Exception as e:
+            logger.warning(f'Could not write result to [{result_file}]: {e}')
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
@@ -0,0 +1,134 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class RequestCancelled(Exception):
+    """
+    Raised when a request is cancelled because a newer request was made in the same session.
+    """
+    pass
+
+
+class RequestGenerations:
+    # The maximum number of sessions tracked within a process
+    MAX_SESSIONS = 10000
+
+    # Generation files of sessions without requests for this long (in seconds) are removed
+    SESSION_EXPIRY = 24 * 60 * 60
+
+    def __init__(self, state_dir: Path = None):
+        """
+        Creates a new RequestGenerations, used to keep track of the latest request (generation) in each session so
+        that computations for older requests in the session (whose results will be thrown away by the browser)
+        can be stopped early.
+
+        Each new request in a session supersedes all earlier ones. Requests are ordered by the time they start, which
+        matches the order they were made in by the browser as long as requests are not made faster than they are
+        received by the server.
+
+        :param state_dir: An (optional) directory used to store the latest generation of each session so that
+                          requests are tracked across processes on the same host. Leave as None to only track
+                          requests within this process.
+        """
+        self._state_dir = state_dir
+        self._lock = threading.Lock()
+        self._generations = OrderedDict()
+        self._last_cleanup = time.time()
+
+        if self._state_dir is not None:
+            self._state_dir.mkdir(parents=True, exist_ok=True)
+
+    def start(self, session_id: str) -> Callable[[], None]:
+        """
+        Starts a new request in a session, superseding all earlier requests in the session.
+        :param session_id: The id of the session, or None if the request is not part of a session.
+        :return: A checkpoint function, to be called between stages of the computation for the request. The
+                 checkpoint raises RequestCancelled if a newer request was started in the session.
+        """
+        if session_id is None:
+            return _no_checkpoint
+
+        generation = f'{time.time_ns()}-{os.getpid()}-{threading.get_ident()}'
+        key = hashlib.sha1(str(session_id).encode('utf-8')).hexdigest()
+
+        if self._state_dir is None:
+            with self._lock:
+                self._generations[key] = generation
+                self._generations.move_to_end(key)
+                if len(self._generations) > self.MAX_SESSIONS:
+                    self._generations.popitem(last=False)
+        else:
+            self._remove_expired_sessions()
+            self._write_generation(key, generation)
+
+        def checkpoint():
+            latest = self._latest_generation(key)
+            if latest is not None and latest != generation:
+                raise RequestCancelled(f'Request [{generation}] superseded by request [{latest}]')
+
+        return checkpoint
+
+    def _latest_generation(self, key: str) -> str:
+        """
+        Gets the latest generation in a session.
+        :param key: The key of the session.
+        :return: The latest generation, or None if it is unknown (in which case the request is not cancelled).
+        """
+        if self._state_dir is None:
+            with self._lock:
+                return self._generations.get(key)
+        else:
+            try:
+                with open(self._state_dir / f'{key}.generation') as f:
+                    return f.read()
+            except OSError:
+                return None
+
+    def _write_generation(self, key: str, generation: str) -> None:
+        """
+        Atomically writes the latest generation in a session so it can be read by other processes.
+        :param key: The key of the session.
+        :param generation: The generation.
+        :return: None.
+        """
+        fd, tmp_file = tempfile.mkstemp(dir=self._state_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(generation)
+            os.replace(tmp_file, self._state_dir / f'{key}.generation')
+        except Exception as e:
+            logger.warning(f'Could not write generation for session [{key}]: {e}')
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    def _remove_expired_sessions(self) -> None:
+        """
+        Removes the generation files of sessions without any recent requests (at most once an hour).
+        :return: None.
+        """
+        now = time.time()
+        with self._lock:
+            if now - self._last_cleanup < 60 * 60:
+                return
+            self._last_cleanup = now
+
+        expired_time = now - self.SESSION_EXPIRY
+        for generation_file in self._state_dir.glob('*.generation'):
+            try:
+                if generation_file.stat().st_mtime < expired_time:
+                    generation_file.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _no_checkpoint() -> None:
+    pass
@@ -0,0 +1,253 @@
+import gzip
+import hashlib
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import flask
+from werkzeug.datastructures import Accept
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCompressor:
+    COMPRESSIBLE_MIMETYPES = {
+        'application/json',
+        'application/javascript',
+        'application/geo+json',
+        'image/svg+xml',
+    }
+
+    # Compression levels used for responses compressed on each request, and for static files compressed only once
+    GZIP_LEVEL = 6
+    GZIP_STATIC_LEVEL = 9
+    BROTLI_QUALITY = 4
+    BROTLI_STATIC_QUALITY = 11
+
+    # Finds the URLs of the scripts and stylesheets in a page
+    PAGE_URL_PATTERN = re.compile(r'(?:src|href)="([^"]+)"')
+
+    def __init__(self, min_size: int = 1024, static_paths: List[str] = None, static_max_age: int = 3600,
+                 static_cache_size: int = 256):
+        """
+        Creates a new ResponseCompressor, used to compress (with brotli or gzip) the responses of a Flask application
+        for clients which accept compressed responses.
+
+        Responses for static files (e.g., the Dash JavaScript bundles and files under assets/) are compressed once
+        with the highest compression level and cached (by URL path, ignoring the query string, for up to
+        [static_cache_size] files and encodings), while all other responses (e.g., callback responses) are compressed
+        on each request. The static files used by the pages of the application can be compressed ahead of time (see
+        init_app()).
+
+        :param min_size: The minimum size (in bytes) of a response to compress.
+        :param static_paths: The URL path prefixes for static files.
+        :param static_max_age: The time (in seconds) browsers can cache static files which do not already define
+                               how long they can be cached.
+        :param static_cache_size: The maximum number of compressed static files (for each encoding) to keep, the
+                                  least recently used are removed past this.
+        """
+        if min_size is None or min_size < 0:
+            raise Exception(f'Invalid value [min_size={min_size}], must be a non-negative number')
+        if static_cache_size is None or static_cache_size < 1:
+            raise Exception(f'Invalid value [static_cache_size={static_cache_size}], must be a positive number')
+
+        self._min_size = min_size
+        self._static_paths = tuple(static_paths) if static_paths is not None else tuple()
+        self._static_max_age = static_max_age
+        self._static_cache_size = static_cache_size
+        self._static_cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, flask_app: flask.Flask, precompress_pages: List[str] = None) -> None:
+        """
+        Compresses the responses of the passed Flask application.
+        :param flask_app: The Flask application.
+        :param precompress_pages: The (optional) URL paths of pages whose static files (the scripts and stylesheets
+                                  they link to) are compressed now instead of on first request.
+        :return: None.
+        """
+        if brotli is None:
+            logger.info('brotli is not installed, only gzip will be used for compressing responses')
+
+        flask_app.after_request(self.compress)
+
+        if precompress_pages is not None:
+            self.precompress(flask_app, precompress_pages)
+
+    def precompress(self, flask_app: flask.Flask, pages: List[str]) -> None:
+        """
+        Compresses (with each encoding) the static files linked to from the passed pages, so they are served from the
+        cache from the first request on.
+        :param flask_app: The Flask application.
+        :param pages: The URL paths of the pages.
+        :return: None.
+        """
+        encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+        client = flask_app.test_client()
+        for page in pages:
+            try:
+                response = client.get(page)
+                if response.status_code != 200:
+                    logger.warning(f'Could not precompress static files for page [{page}], got status '
+                                   f'[{response.status_code}]')
+                    continue
+
+                urls = {url for url in self.PAGE_URL_PATTERN.findall(response.get_data(as_text=True))
+                        if url.startswith(self._static_paths)}
+                for url in sorted(urls):
+                    for encoding in encodings:
+                        client.get(url, headers={'Accept-Encoding': encoding}).close()
+                logger.info(f'Precompressed {len(urls)} static files for page [{page}]')
+            except Exception as e:
+                logger.warning(f'Could not precompress static files for page [{page}]: {e}')
+
+    def compress(self, response: flask.Response) -> flask.Response:
+        """
+        Compresses the passed response for the current request, if it can be compressed.
+        :param response: The response.
+        :return: The (possibly compressed) response.
+        """
+        static = flask.request.path.startswith(self._static_paths)
+        if static and response.status_code in (200, 304):
+            self._set_static_cache_control(response)
+
+        if not self._is_compressible(response):
+            return response
+
+        response.vary.add('Accept-Encoding')
+
+        encoding = self._select_encoding(flask.request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if static:
+            response = self._compress_static(response, encoding)
+        else:
+            if response.is_streamed:
+                return response
+
+            data = response.get_data()
+            if len(data) < self._min_size:
+                return response
+
+            response.set_data(self._compress_data(data, encoding, static=False))
+            response.headers['Content-Encoding'] = encoding
+
+            etag, weak = response.get_etag()
+            if etag is not None:
+                response.set_etag(f'{etag}-{encoding}', weak=weak)
+
+        return response
+
+    def _set_static_cache_control(self, response: flask.Response) -> None:
+        """
+        Lets browsers cache a static file, unless the response already defines how long it can be cached.
+        :param response: The response.
+        :return: None.
+        """
+        response.cache_control.public = True
+        if response.cache_control.max_age is None:
+            response.cache_control.max_age = self._static_max_age
+        response.cache_control.no_cache = None
+
+    def _compress_static(self, response: flask.Response, encoding: str) -> flask.Response:
+        """
+        Compresses a response for a static file, using the cached compressed file if available.
+        :param response: The response.
+        :param encoding: The encoding to use.
+        :return: The compressed response.
+        """
+        # The query string is ignored so that requests for the same file with different query strings (e.g., cache
+        # busting parameters) share one cached file
+        key = (flask.request.path, encoding)
+        validator = response.get_etag()[0] or response.headers.get('Last-Modified')
+
+        with self._lock:
+            cached = self._static_cache.get(key)
+            if cached is not None:
+                self._static_cache.move_to_end(key)
+
+        if cached is not None and validator is not None and cached[0] == validator:
+            compressed = cached[1]
+
+            # The file does not need to be read
+            if hasattr(response.response, 'close'):
+                response.response.close()
+        else:
+            # Static files are sent directly from the file by Flask, so have to be read into memory first
+            response.direct_passthrough = False
+            data = response.get_data()
+            if len(data) < self._min_size:
+                return response
+
+            if validator is None:
+                validator = hashlib.sha1(data).hexdigest()
+
+            if cached is not None and cached[0] == validator:
+                compressed = cached[1]
+            else:
+                compressed = self._compress_data(data, encoding, static=True)
+                with self._lock:
+                    self._static_cache[key] = (validator, compressed)
+                    self._static_cache.move_to_end(key)
+                    while len(self._static_cache) > self._static_cache_size:
+                        self._static_cache.popitem(last=False)
+
+        response.direct_passthrough = False
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+
+        # A different ETag for each encoding so that caches do not mix up compressed and uncompressed files
+        response.set_etag(f'{hashlib.sha1(validator.encode("utf-8")).hexdigest()}-{encoding}')
+
+        return response.make_conditional(flask.request)
+
+    def _is_compressible(self, response: flask.Response) -> bool:
+        """
+        Whether or not the passed response can be compressed.
+        :param response: The response.
+        :return: True if the response can be compressed, False otherwise.
+        """
+        if response.status_code != 200 or 'Content-Encoding' in response.headers:
+            return False
+        elif response.content_length is not None and response.content_length < self._min_size:
+            return False
+        else:
+            mimetype = response.mimetype
+            return mimetype is not None and (mimetype.startswith('text/') or
+                                             mimetype in self.COMPRESSIBLE_MIMETYPES)
+
+    def _select_encoding(self, accept_encodings: Accept) -> Optional[str]:
+        """
+        Selects the encoding to use given the encodings accepted by the client.
+        :param accept_encodings: The encodings accepted by the client (from the Accept-Encoding header).
+        :return: The encoding ('br' or 'gzip'), or None if no encodings are supported by the client.
+        """
+        if brotli is not None and accept_encodings.quality('br') > 0:
+            return 'br'
+        elif accept_encodings.quality('gzip') > 0:
+            return 'gzip'
+        else:
+            return None
+
+    def _compress_data(self, data: bytes, encoding: str, static: bool) -> bytes:
+        """
+        Compresses data.
+        :param data: The data.
+        :param encoding: The encoding ('br' or 'gzip').
+        :param static: Whether the data is for a static file (compressed once with the highest compression level).
+        :return: The compressed data.
+        """
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.BROTLI_STATIC_QUALITY if static else self.BROTLI_QUALITY)
+        elif encoding == 'gzip':
+            return gzip.compress(data, compresslevel=self.GZIP_STATIC_LEVEL if static else self.GZIP_LEVEL)
+        else:
+            raise Exception(f'Unknown value [encoding={encoding}]')
@@ -0,0 +1,137 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A resolved taxon, as a tuple of (adjusted taxonomic id, name of the adjusted taxonomic id)
+ResolvedTaxon = Tuple[str, Optional[str]]
+
+
+class TaxonCache:
+    CACHE_VERSION = 1
+    LOCK_FILE = 'taxa-cache.lock'
+
+    def __init__(self, cache_dir: Path, ncbi_taxa_file: Path):
+        """
+        Creates a new TaxonCache, used to store how taxonomic ids were resolved (limited to a minimum rank and named)
+        from the NCBI Taxonomy database so that each taxonomic id is only looked up in the database once. The resolved
+        taxonomic ids are stored in a file shared by all processes (and kept between loads of the data), keyed by the
+        modification time and size of the database file so that the cache is replaced when the database is updated.
+
+        :param cache_dir: The directory storing the cached taxonomic ids.
+        :param ncbi_taxa_file: The ete3 NCBI taxa SQLite database file the taxonomic ids are resolved from.
+        """
+        self._cache_dir = cache_dir
+        self._ncbi_taxa_file = ncbi_taxa_file
+
+    def lookup(self, taxon_ids: Iterable[int], min_rank: str) -> Dict[int, ResolvedTaxon]:
+        """
+        Looks up previously resolved taxonomic ids.
+        :param taxon_ids: The taxonomic ids.
+        :param min_rank: The minimum rank the taxonomic ids were limited to.
+        :return: A dictionary mapping each of the passed taxonomic ids found in the cache to the resolved taxon, as a
+                 tuple of (adjusted taxonomic id, name).
+        """
+        cache_file = self._cache_file(min_rank)
+        if cache_file is None:
+            return {}
+
+        cached = self._read(cache_file)
+        return {taxon_id: cached[taxon_id] for taxon_id in taxon_ids if taxon_id in cached}
+
+    def add(self, resolved: Dict[int, ResolvedTaxon], min_rank: str) -> None:
+        """
+        Adds resolved taxonomic ids to the cache.
+        :param resolved: A dictionary mapping taxonomic ids to the resolved taxon, as a tuple of
+                         (adjusted taxonomic id, name).
+        :param min_rank: The minimum rank the taxonomic ids were limited to.
+        :return: None.
+        """
+        cache_file = self._cache_file(min_rank)
+        if cache_file is None or len(resolved) == 0:
+            return
+
+        try:
+            self._cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(self._cache_dir / self.LOCK_FILE, 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    # Re-read so that ids added by other processes are kept
+                    cached = self._read(cache_file)
+                    cached.update(resolved)
+                    self._write_atomic(cache_file, cached)
+                    self._remove_other_caches(cache_file, min_rank)
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        except OSError as e:
+            logger.warning(f'Could not write cached taxonomic ids [{cache_file}]: {e}')
+            return
+
+        logger.debug(f'Added {len(resolved)} taxonomic ids to [{cache_file}]')
+
+    def _cache_file(self, min_rank: str) -> Optional[Path]:
+        """
+        Gets the file caching taxonomic ids resolved from the current NCBI Taxonomy database.
+        :param min_rank: The minimum rank the taxonomic ids were limited to.
+        :return: The file, or None if the NCBI Taxonomy database file does not exist (so nothing should be cached).
+        """
+        try:
+            stat = os.stat(self._ncbi_taxa_file)
+        except OSError:
+            return None
+
+        key = f'{self.CACHE_VERSION}:{stat.st_mtime_ns}:{stat.st_size}'
+        return self._cache_dir / f'taxa-cache-{min_rank}-{hashlib.sha1(key.encode("utf-8")).hexdigest()}.json'
+
+    def _read(self, cache_file: Path) -> Dict[int, ResolvedTaxon]:
+        """
+        Reads the cached taxonomic ids.
+        :param cache_file: The cache file.
+        :return: A dictionary of the cached taxonomic ids (empty if the file does not exist or could not be read).
+        """
+        try:
+            with open(cache_file, 'rb') as f:
+                return {int(taxon_id): tuple(taxon) for taxon_id, taxon in json.load(f).items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f'Could not read cached taxonomic ids [{cache_file}]: {e}')
+            return {}
+
+    def _write_atomic(self, cache_file: Path, cached: Dict[int, ResolvedTaxon]) -> None:
+        """
+        Atomically writes the cached taxonomic ids, so that readers never see a partially written file.
+        :param cache_file: The file to write.
+        :param cached: The cached taxonomic ids.
+        :return: None.
+        """
+        fd, tmp_file = tempfile.mkstemp(dir=self._cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({str(taxon_id): list(taxon) for taxon_id, taxon in cached.items()}, f,
+                          separators=(',', ':'))
+            os.replace(tmp_file, cache_file)
+        except Exception:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+
+    def _remove_other_caches(self, cache_file: Path, min_rank: str) -> None:
+        """
+        Removes taxonomic ids (limited to the same rank) cached for other versions of the NCBI Taxonomy database.
+        :param cache_file: The current cache file (which is kept).
+        :param min_rank: The minimum rank the taxonomic ids were limited to.
+        :return: None.
+        """
+        for other_file in self._cache_dir.glob(f'taxa-cache-{min_rank}-*.json'):
+            if other_file != cache_file:
+                try:
+                    other_file.unlink()
+                except FileNotFoundError:
+                    pass
@@ -1,9 +1,18 @@
+from __future__ import annotations
+
 import logging
 import warnings
 from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Set
 
 import pandas as pd
-from ete3 import NCBITaxa
+
+from card_live_dashboard.service.CompactTaxonomy import CompactTaxonomy
+from card_live_dashboard.service.TaxonCache import TaxonCache, ResolvedTaxon
+
+# ete3 is slow to import and only needed when loading the data, so it is imported when first used
+if TYPE_CHECKING:
+    from ete3 import NCBITaxa
 
 logger = logging.getLogger(__name__)
 
@@ -11,30 +20,41 @@ logger = logging.getLogger(__name__)
 class TaxonomicParser:
 
     def __init__(self, df_rgi_kmer: pd.DataFrame, df_lmat: pd.DataFrame,
-                 ncbi_taxa: NCBITaxa = None, ncbi_taxa_file: Path = None):
+                 ncbi_taxa: NCBITaxa = None, ncbi_taxa_file: Path = None, compact_taxonomy: CompactTaxonomy = None,
+                 taxon_cache: TaxonCache = None):
         """
         Creates a new TaxonomicParser used to parse and interpret taxonomic assignments.
-        You must set one (but not both) of [ncbi_taxa] or [ncbi_taxa_file]. ncbi_taxa_file is the actual SQLite taxonomy
-        file for the ete3 toolkit. NCBITaxa is the ete3 object that reads the file. I have both options here as setting
-        the NCBITaxa object directly is useful for unit tests (where I can set a stub object) but I need to create a
-        new NCBITaxa object in production due to multithreading issues (two threads cannot reference the same SQLite
-        database).
+        You must set one (and only one) of [ncbi_taxa], [ncbi_taxa_file] or [compact_taxonomy]. ncbi_taxa_file is the
+        actual SQLite taxonomy file for the ete3 toolkit. NCBITaxa is the ete3 object that reads the file. I have both
+        options here as setting the NCBITaxa object directly is useful for unit tests (where I can set a stub object)
+        but I need to create a new NCBITaxa object in production due to multithreading issues (two threads cannot
+        reference the same SQLite database). The NCBITaxa object for ncbi_taxa_file is only created if there are
+        taxonomic ids to look up which are not in the [taxon_cache]. compact_taxonomy is an in-memory copy of the
+        taxonomy (which can be used from any thread) that looks up all taxonomic ids at once instead of querying the
+        SQLite database.
 
         :param df_rgi_kmer: The RGI Kmer data frame.
         :param df_lmat: The LMAT data frame.
         :param ncbi_taxa: An (optional) NCBITaxa object referencing the NCBI Taxonomy database.
-                          Cannot be set with ncbi_taxa_file.
+                          Cannot be set with ncbi_taxa_file or compact_taxonomy.
         :param ncbi_taxa_file: The (optional) file containing the NCBI Taxonomy database for the ete3 toolkit.
-                               Cannot be set with ncbi_taxa.
+                               Cannot be set with ncbi_taxa or compact_taxonomy.
+        :param compact_taxonomy: An (optional) in-memory copy of the NCBI Taxonomy database.
+                                 Cannot be set with ncbi_taxa or ncbi_taxa_file.
+        :param taxon_cache: An (optional) cache of taxonomic ids resolved from the NCBI Taxonomy database, so that only
+                            taxonomic ids not resolved before are looked up in the database.
         """
-        if ncbi_taxa is None and ncbi_taxa_file is None:
-            raise Exception('Must set one of [ncbi_taxa] or [ncbi_taxa_file]')
-        elif ncbi_taxa is not None and ncbi_taxa_file is not None:
-            raise Exception(f'Can only set one of ncbi_taxa=[{ncbi_taxa}] or ncbi_taxa_file=[{ncbi_taxa_file}]')
-        elif ncbi_taxa is not None:
-            self._ncbi_taxa = ncbi_taxa
-        else:
-            self._ncbi_taxa = NCBITaxa(dbfile=ncbi_taxa_file)
+        taxonomies_set = sum(x is not None for x in [ncbi_taxa, ncbi_taxa_file, compact_taxonomy])
+        if taxonomies_set == 0:
+            raise Exception('Must set one of [ncbi_taxa], [ncbi_taxa_file] or [compact_taxonomy]')
+        elif taxonomies_set > 1:
+            raise Exception(f'Can only set one of ncbi_taxa=[{ncbi_taxa}], ncbi_taxa_file=[{ncbi_taxa_file}] or '
+                            f'compact_taxonomy=[{compact_taxonomy}]')
+
+        self._ncbi_taxa = ncbi_taxa
+        self._ncbi_taxa_file = ncbi_taxa_file
+        self._compact_taxonomy = compact_taxonomy
+        self._taxon_cache = taxon_cache
 
         self._df_rgi_kmer = df_rgi_kmer[['rgi_kmer.CARD*kmer Prediction']]
         self._df_lmat = df_lmat[['lmat.count', 'lmat.taxonomy_label', 'lmat.ncbi_taxon_id']].astype(
@@ -58,39 +78,94 @@ class TaxonomicParser:
         """
         ncbi_id_col = 'lmat.ncbi_taxon_id'
         taxonomy_id_adj = 'lmat.ncbi_taxon_id_adjusted'
-        taxonomy_label = 'lmat.taxonomy_label'
         taxonomy_label_adj = 'lmat.taxonomy_label_adjusted'
 
         df_new = df.reset_index()
-        df_new[taxonomy_id_adj] = df_new[ncbi_id_col]
-        df_new[taxonomy_id_adj] = df_new.loc[
-            ~df_new[ncbi_id_col].isna(), ncbi_id_col].apply(
-            self._limit_taxon_to, min_rank=min_rank)
-        df_new[taxonomy_label_adj] = df_new[taxonomy_label]
-        df_new[taxonomy_label_adj] = df_new.loc[~df_new[taxonomy_id_adj].isna(), taxonomy_id_adj].apply(
-            lambda x: self._ncbi_taxa.get_taxid_translator([int(x)]).get(int(x), pd.NA))
+
+        # Taxonomic ids are resolved once for each distinct id (with batched database queries) and mapped back to the
+        # rows, since there are far more rows (one per contig) than distinct ids
+        taxon_ids = df_new[ncbi_id_col].dropna().unique()
+        resolved = self._resolve_taxa({int(x) for x in taxon_ids}, min_rank=min_rank)
+        df_new[taxonomy_id_adj] = df_new[ncbi_id_col].map({x: resolved[int(x)][0] for x in taxon_ids})
+        df_new[taxonomy_label_adj] = df_new[ncbi_id_col].map(
+            {x: resolved[int(x)][1] if resolved[int(x)][1] is not None else pd.NA for x in taxon_ids})
 
         return df_new.set_index('filename')
 
-    def _limit_taxon_to(self, taxon_id: int, min_rank: str) -> str:
+    def _get_ncbi_taxa(self) -> NCBITaxa:
+        """
+        Gets the NCBITaxa object, creating it (for the ncbi_taxa_file) on first use.
+        :return: The NCBITaxa object.
+        """
+        if self._ncbi_taxa is None:
+            from ete3 import NCBITaxa
+
+            self._ncbi_taxa = NCBITaxa(dbfile=self._ncbi_taxa_file)
+        return self._ncbi_taxa
+
+    def _resolve_taxa(self, taxon_ids: Set[int], min_rank: str) -> Dict[int, ResolvedTaxon]:
+        """
+        Resolves taxonomic ids (limited to the specified rank, see _limit_taxa_to()) and the names of the resolved ids,
+        reading previously resolved ids from the taxon cache and only looking up the rest in the NCBI taxonomy (the
+        compact taxonomy, if set, or the NCBI database).
+        :param taxon_ids: The taxonomic ids.
+        :param min_rank: The minimum limit for the rank (e.g., 'species', or 'family').
+        :return: A dictionary mapping each of the passed taxonomic ids to a tuple of (adjusted taxonomic id, name of
+                 the adjusted taxonomic id or None if it has no name).
+        """
+        resolved = self._taxon_cache.lookup(taxon_ids, min_rank) if self._taxon_cache is not None else {}
+
+        unseen_ids = taxon_ids - resolved.keys()
+        if len(unseen_ids) > 0:
+            if self._compact_taxonomy is not None:
+                limited_ids = {taxon_id: str(limited_id) for taxon_id, limited_id in
+                               self._compact_taxonomy.limit_to_rank(unseen_ids, min_rank=min_rank).items()}
+                names = self._compact_taxonomy.get_names({int(x) for x in limited_ids.values()})
+            else:
+                limited_ids = self._limit_taxa_to(unseen_ids, min_rank=min_rank)
+                names = self._get_ncbi_taxa().get_taxid_translator([int(x) for x in set(limited_ids.values())])
+            newly_resolved = {taxon_id: (limited_id, names.get(int(limited_id)))
+                              for taxon_id, limited_id in limited_ids.items()}
+
+            logger.debug(f'Resolved {len(newly_resolved)} taxonomic ids from the NCBI taxonomy '
+                         f'({len(resolved)} from the cache)')
+            resolved.update(newly_resolved)
+            if self._taxon_cache is not None:
+                self._taxon_cache.add(newly_resolved, min_rank)
+
+        return resolved
+
+    def _limit_taxa_to(self, taxon_ids: Set[int], min_rank: str) -> Dict[int, str]:
         """
-        Given a taxonomic id and a rank limit the taxonomic id so that it is at the specified rank or higher.
-        :param taxon_id: The taxonomic id.
+        Given taxonomic ids and a rank limit each taxonomic id so that it is at the specified rank or higher.
+        :param taxon_ids: The (distinct) taxonomic ids.
         :param min_rank: The minimum limit for the rank (e.g., 'species', or 'family').
-        :return: The taxonomic id that is at or above the passed min_rank, or the original id if the passed rank was
-                 not found in the lineage.
+        :return: A dictionary mapping each passed taxonomic id to the taxonomic id that is at or above the passed
+                 min_rank, or the original id if the passed rank was not found in the lineage.
         """
-        taxon_id = int(taxon_id)
-        try:
-            lineages = self._ncbi_taxa.get_lineage(taxon_id)
-            ranks = self._ncbi_taxa.get_rank(lineages)
-            for lineage in lineages:
-                if ranks[lineage] == min_rank:
-                    return str(lineage)
-        except ValueError as e:
-            logger.debug(f'Error when looking up lineage for taxon_id={taxon_id} in NCBI database.', e)
-
-        return str(taxon_id)
+        ncbi_taxa = self._get_ncbi_taxa()
+
+        # Looks up all lineages in one query. Ids missing from the result (e.g., ids which were merged into another
+        # id) are looked up individually, which translates merged ids.
+        lineages = ncbi_taxa.get_lineage_translator(taxon_ids)
+        for taxon_id in taxon_ids - lineages.keys():
+            try:
+                lineages[taxon_id] = ncbi_taxa.get_lineage(taxon_id)
+            except ValueError as e:
+                logger.debug(f'Error when looking up lineage for taxon_id={taxon_id} in NCBI database.', e)
+
+        lineage_ids = {lineage for lineage_list in lineages.values() if lineage_list for lineage in lineage_list}
+        ranks = ncbi_taxa.get_rank(list(lineage_ids)) if lineage_ids else {}
+
+        limited_ids = {}
+        for taxon_id in taxon_ids:
+            limited_ids[taxon_id] = str(taxon_id)
+            for lineage in lineages.get(taxon_id) or []:
+                if ranks.get(lineage) == min_rank:
+                    limited_ids[taxon_id] = str(lineage)
+                    break
+
+        return limited_ids
 
     def _create_contigs_lmat_score(self, df: pd.DataFrame, name: str) -> pd.DataFrame:
         df_sum = df['lmat.count'].groupby('filename').sum().rename('lmat_count_sum').to_frame()
@@ -0,0 +1,156 @@
+import fcntl
+import logging
+import os
+import sqlite3
+from pathlib import Path
+from typing import Iterable, Set
+
+logger = logging.getLogger(__name__)
+
+
+class TrimmedTaxonomy:
+    # The same tables as the ete3 NCBI taxa database (so it can be read the same way), and a table recording which
+    # version of the full database the taxa were copied from
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS stats (version INT PRIMARY KEY);
+        CREATE TABLE IF NOT EXISTS species (taxid INT PRIMARY KEY, parent INT, spname VARCHAR(50) COLLATE NOCASE,
+                                            common VARCHAR(50) COLLATE NOCASE, rank VARCHAR(50), track TEXT);
+        CREATE TABLE IF NOT EXISTS synonym (taxid INT,spname VARCHAR(50) COLLATE NOCASE, PRIMARY KEY (spname, taxid));
+        CREATE TABLE IF NOT EXISTS merged (taxid_old INT, taxid_new INT);
+        CREATE INDEX IF NOT EXISTS spname1 ON species (spname COLLATE NOCASE);
+        CREATE INDEX IF NOT EXISTS spname2 ON synonym (spname COLLATE NOCASE);
+        CREATE INDEX IF NOT EXISTS merged1 ON merged (taxid_old);
+        CREATE TABLE IF NOT EXISTS trimmed_from (mtime_ns INT, size INT);
+    '''
+
+    def __init__(self, ncbi_taxa_file: Path, trimmed_taxa_file: Path):
+        """
+        Creates a new TrimmedTaxonomy, used to keep a small copy of the NCBI Taxonomy database containing only the
+        taxonomic ids seen in the CARD:Live data (and their lineages). The copy is in the same format as the ete3 NCBI
+        taxa database, so taxonomic ids are looked up in it the same way (with the same results) as in the full
+        database while opening and reading far less from disk.
+
+        The copy is extended as new taxonomic ids are seen, and rebuilt if the full database is updated. Once built,
+        the full database is optional: taxonomic ids already in the copy are looked up without it, and an error is
+        logged for new taxonomic ids (which cannot be looked up until the full database is restored).
+
+        :param ncbi_taxa_file: The full ete3 NCBI taxa SQLite database file.
+        :param trimmed_taxa_file: The file of the trimmed copy of the database.
+        """
+        self._ncbi_taxa_file = ncbi_taxa_file
+        self._trimmed_taxa_file = trimmed_taxa_file
+
+    @property
+    def trimmed_taxa_file(self) -> Path:
+        return self._trimmed_taxa_file
+
+    def extend(self, taxon_ids: Iterable[int]) -> int:
+        """
+        Adds taxonomic ids (and their lineages) which are not already in the trimmed database.
+        :param taxon_ids: The taxonomic ids.
+        :return: The number of the passed taxonomic ids added to the trimmed database (ids not in the full database
+                 are not added).
+        """
+        taxon_ids = {int(taxon_id) for taxon_id in taxon_ids}
+
+        if not self._ncbi_taxa_file.exists():
+            if self._trimmed_taxa_file.exists():
+                self._log_missing_ids(taxon_ids)
+                return 0
+            else:
+                raise Exception(f'Cannot build trimmed NCBI taxa database [{self._trimmed_taxa_file}], NCBI taxa '
+                                f'database [{self._ncbi_taxa_file}] does not exist')
+
+        self._trimmed_taxa_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._trimmed_taxa_file.with_name(self._trimmed_taxa_file.name + '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                return self._extend_locked(taxon_ids)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _log_missing_ids(self, taxon_ids: Set[int]) -> None:
+        """
+        Logs an error for taxonomic ids which are not in the trimmed database, when they cannot be added since the full
+        database does not exist.
+        :param taxon_ids: The taxonomic ids.
+        :return: None.
+        """
+        db = sqlite3.connect(f'file:{self._trimmed_taxa_file}?mode=ro', uri=True)
+        try:
+            missing_ids = taxon_ids - self._trimmed_ids(db)
+        finally:
+            db.close()
+
+        if len(missing_ids) > 0:
+            logger.error(f'{len(missing_ids)} taxonomic ids are not in the trimmed NCBI taxa database '
+                         f'[{self._trimmed_taxa_file}] and cannot be added since the NCBI taxa database '
+                         f'[{self._ncbi_taxa_file}] does not exist, so the taxonomy of samples with these ids is not '
+                         f'looked up: {sorted(missing_ids)}. Restore [{self._ncbi_taxa_file}] (e.g., with '
+                         'card-live-dash-init) to add them.')
+
+    def _extend_locked(self, taxon_ids: Set[int]) -> int:
+        """
+        Adds taxonomic ids to the trimmed database (while holding the lock).
+        :param taxon_ids: The taxonomic ids.
+        :return: The number of taxonomic ids added to the trimmed database.
+        """
+        stat = os.stat(self._ncbi_taxa_file)
+        source_key = (stat.st_mtime_ns, stat.st_size)
+
+        db = sqlite3.connect(f'file:{self._trimmed_taxa_file}', uri=True)
+        try:
+            db.executescript(self.SCHEMA)
+            db.execute('ATTACH DATABASE ? AS full', (f'file:{self._ncbi_taxa_file}?mode=ro',))
+
+            # Everything in the transaction below is seen by readers all at once
+            with db:
+                if db.execute('SELECT mtime_ns, size FROM trimmed_from').fetchone() != source_key:
+                    # Copied from an older version of the full database, so copy all the taxonomic ids again
+                    taxon_ids |= self._trimmed_ids(db)
+                    for table in ['stats', 'species', 'merged', 'trimmed_from']:
+                        db.execute(f'DELETE FROM main.{table}')
+                    db.execute('INSERT INTO main.stats SELECT * FROM full.stats')
+                    db.execute('INSERT INTO main.trimmed_from (mtime_ns, size) VALUES (?, ?)', source_key)
+
+                missing_ids = taxon_ids - self._trimmed_ids(db)
+                if len(missing_ids) == 0:
+                    return 0
+
+                db.execute('CREATE TEMP TABLE missing (taxid INT PRIMARY KEY)')
+                db.executemany('INSERT INTO temp.missing (taxid) VALUES (?)', [(x,) for x in missing_ids])
+
+                # Merged ids are added along with the ids they were merged into
+                db.execute('INSERT INTO main.merged SELECT * FROM full.merged '
+                           'WHERE taxid_old IN (SELECT taxid FROM temp.missing)')
+                db.execute('INSERT OR IGNORE INTO temp.missing (taxid) SELECT taxid_new FROM full.merged '
+                           'WHERE taxid_old IN (SELECT taxid FROM temp.missing)')
+
+                # Adds each id with its lineage (the track of an id lists the ids in its lineage)
+                lineage_ids = set()
+                for track, in db.execute('SELECT track FROM full.species '
+                                         'WHERE taxid IN (SELECT taxid FROM temp.missing)'):
+                    lineage_ids.update(int(x) for x in track.split(',') if x != '')
+                db.execute('DELETE FROM temp.missing')
+                db.executemany('INSERT INTO temp.missing (taxid) VALUES (?)', [(x,) for x in lineage_ids])
+                db.execute('INSERT OR IGNORE INTO main.species SELECT * FROM full.species '
+                           'WHERE taxid IN (SELECT taxid FROM temp.missing)')
+                db.execute('DROP TABLE temp.missing')
+
+                # Ids not in the full database are not added
+                added_ids = missing_ids & self._trimmed_ids(db)
+        finally:
+            db.close()
+
+        logger.info(f'Added {len(added_ids)} taxonomic ids to [{self._trimmed_taxa_file}]')
+        return len(added_ids)
+
+    def _trimmed_ids(self, db: sqlite3.Connection) -> Set[int]:
+        """
+        Gets the taxonomic ids in the trimmed database.
+        :param db: The connection to the trimmed database.
+        :return: The taxonomic ids (including the merged ids).
+        """
+        taxon_ids = {taxid for taxid, in db.execute('SELECT taxid FROM main.species')}
+        taxon_ids.update(taxid for taxid, in db.execute('SELECT taxid_old FROM main.merged'))
+        return taxon_ids
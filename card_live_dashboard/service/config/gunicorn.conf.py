@@ -1,3 +1,4 @@
+import gc
 from os import path
 from pathlib import Path
 
@@ -5,6 +6,9 @@ root_path = Path(path.dirname(__file__)) / '..'
 
 bind = '127.0.0.1:8050'
 workers = 2
+# Each worker handles up to this many requests at once (so that requests waiting on a dashboard being built, see
+# 'admission_control' and 'request_coalescing' in cardlive.yaml, do not hold up every other request)
+threads = 4
 proc_name = 'cardlive'
 timeout = 600
 loglevel = 'debug'
@@ -12,3 +16,26 @@ accesslog = str(root_path / 'access.log')
 errorlog = str(root_path / 'prod.log')
 daemon = True
 pidfile = str(root_path / 'cardlive.pid')
+
+# Loads the application (and the CARD:Live data) once in the master process before forking the workers, which then
+# share the loaded data. The master keeps the data up to date and replaces the workers when new data is loaded.
+# Workers are started right away while the data loads in the background (serving the loading page, or the previous
+# data) and are replaced once it has loaded.
+# Set to False to have each worker load the data itself.
+preload_app = True
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        import card_live_dashboard.model as model
+        from card_live_dashboard.service.CardLiveDataManager import CardLiveDataManager
+        CardLiveDataManager.get_instance().reload_workers_on_update(server.pid)
+
+        # The map region geometry is otherwise built on first use, so build it here to share it with the workers
+        model.world_geojson
+
+
+def pre_fork(server, worker):
+    # Keeps the garbage collector in the workers from touching (and so copying) the memory shared with the master
+    if server.cfg.preload_app:
+        gc.freeze()
@@ -0,0 +1,219 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import dash
+import plotly.graph_objects as go
+import pytest
+
+import card_live_dashboard.callbacks as callbacks
+from card_live_dashboard.service.DataVersion import DataVersion
+
+
+DATA_KEY = (1, 10, '2020-08-01 00:00:00')
+
+
+def applied(**inputs):
+    return callbacks.applied_state(DATA_KEY, tuple(sorted({**callbacks.DEFAULT_INPUTS, **inputs}.items())))
+
+
+def test_figures_to_update():
+    displayed = applied()
+    assert set() == callbacks.figures_to_update(displayed, DATA_KEY, callbacks.DEFAULT_INPUTS)
+    assert {'totals'} == callbacks.figures_to_update(displayed, DATA_KEY,
+                                                     {**callbacks.DEFAULT_INPUTS, 'totals_color_select': 'rgi'})
+    assert {'timeline', 'rgi'} == callbacks.figures_to_update(displayed, DATA_KEY,
+                                                              {**callbacks.DEFAULT_INPUTS,
+                                                               'timeline_type_select': 'counts',
+                                                               'rgi_color_select': 'organism'})
+
+
+def test_figures_to_update_other_inputs():
+    displayed = applied(drug_classes=['a'])
+    assert callbacks.figures_to_update(None, DATA_KEY, callbacks.DEFAULT_INPUTS) is None
+    assert callbacks.figures_to_update(displayed, DATA_KEY, callbacks.DEFAULT_INPUTS) is None
+    assert callbacks.figures_to_update(displayed, DATA_KEY, {**callbacks.DEFAULT_INPUTS, 'drug_classes': ['a', 'b'],
+                                                             'totals_color_select': 'rgi'}) is None
+    assert {'totals'} == callbacks.figures_to_update(displayed, DATA_KEY,
+                                                     {**callbacks.DEFAULT_INPUTS, 'drug_classes': ['a'],
+                                                      'totals_color_select': 'rgi'})
+
+
+def test_figures_to_update_other_data():
+    assert callbacks.figures_to_update(applied(), (2, 10, '2020-08-01 00:00:00'), callbacks.DEFAULT_INPUTS) is None
+
+
+def test_figures_to_update_superseded_requests():
+    displayed = applied()
+
+    # A drug class change superseded by a totals color change (the browser drops the drug class result and only
+    # triggers the callback for the totals color) rebuilds the whole dashboard
+    inputs = {**callbacks.DEFAULT_INPUTS, 'drug_classes': ['a'], 'totals_color_select': 'rgi'}
+    assert callbacks.figures_to_update(displayed, DATA_KEY, inputs) is None
+
+    # A totals color change superseded by a RGI color change updates both figures
+    inputs = {**callbacks.DEFAULT_INPUTS, 'totals_color_select': 'rgi', 'rgi_color_select': 'organism'}
+    assert {'totals', 'rgi'} == callbacks.figures_to_update(displayed, DATA_KEY, inputs)
+
+
+def test_applied_state_json():
+    data_key, selections, _ = callbacks.request_key(DataVersion(1, InitialStateData(1)),
+                                                    {**callbacks.DEFAULT_INPUTS, 'drug_classes': ['a']})
+    state = json.loads(json.dumps(callbacks.applied_state(data_key, selections)))
+    assert {'totals'} == callbacks.figures_to_update(state, data_key,
+                                                     {**callbacks.DEFAULT_INPUTS, 'drug_classes': ['a'],
+                                                      'totals_color_select': 'rgi'})
+
+
+def test_build_figure_patch():
+    fig = go.Figure(go.Bar(x=[1, 2], y=['a', 'b']), layout={'title': {'text': 'Title'}, 'legend': {'title': 'L'}})
+    patch = callbacks.build_figure_patch(fig)
+
+    assert isinstance(patch, dash.Patch)
+    operations = {(op['operation'], tuple(op['location'])): op['params'].get('value')
+                  for op in patch.to_plotly_json()['operations']}
+
+    assert [1, 2] == list(operations[('Assign', ('data',))][0]['x'])
+    assert {'text': 'Title'} == operations[('Assign', ('layout', 'title'))]
+    assert ('Assign', ('layout', 'legend')) in operations
+    assert ('Assign', ('layout', 'template')) not in operations
+    assert ('Delete', ('layout', 'xaxis2')) in operations
+    assert ('Delete', ('layout', 'legend')) not in operations
+
+
+def test_build_figure_patch_empty_figure():
+    fig = go.Figure(layout={'annotations': [{'text': 'No data'}]})
+    assert fig is callbacks.build_figure_patch(fig)
+
+
+def test_request_key_figure_names():
+    class Data:
+        def __len__(self):
+            return 1
+
+        def latest_update(self):
+            return '2020-08-01'
+
+    data_version = DataVersion(1, Data())
+    inputs = {'drug_classes': ['a'], 'totals_color_select': 'default'}
+    assert callbacks.request_key(data_version, inputs) != callbacks.request_key(data_version, inputs, {'totals'})
+    assert callbacks.request_key(data_version, inputs, {'totals', 'rgi'}) == callbacks.request_key(
+        data_version, inputs, {'rgi', 'totals'})
+
+
+def test_request_key_data_version():
+    class Data:
+        def __len__(self):
+            return 1
+
+        def latest_update(self):
+            return '2020-08-01'
+
+    data = Data()
+    inputs = {'drug_classes': ['a']}
+    assert callbacks.request_key(DataVersion(1, data), inputs) == callbacks.request_key(DataVersion(1, data), inputs)
+    assert callbacks.request_key(DataVersion(1, data), inputs) != callbacks.request_key(DataVersion(2, data), inputs)
+
+
+class InitialStateData:
+    def __init__(self, count):
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def latest_update(self):
+        return '2020-08-01'
+
+
+def test_initial_state_cached(monkeypatch):
+    calls = []
+
+    def build_dashboard(data, world, executor, **inputs):
+        calls.append(inputs)
+        return tuple(range(len(callbacks.MAIN_OUTPUTS)))
+
+    monkeypatch.setattr(callbacks, 'build_dashboard', build_dashboard)
+    monkeypatch.setattr(callbacks, '_initial_state_cache', None)
+
+    state = callbacks.initial_state(DataVersion(1, InitialStateData(1)), 'world.geojson')
+    assert 0 == state['global-sample-count.children']
+    assert callbacks.MAIN_OUTPUTS.index('figure-rgi-intersections.figure') == state['figure-rgi-intersections.figure']
+    # Built for the same inputs as the default layout, which has the current date as the end date
+    end_date = f'{datetime.now():%Y-%m-%d}'
+    assert [{**callbacks.DEFAULT_INPUTS, 'end_date': end_date}] == calls
+    assert end_date == state['date-picker-range.end_date']
+    # Patching figures is compared against the selections of the initial dashboard
+    data_key = DataVersion(1, InitialStateData(1)).key
+    assert set() == callbacks.figures_to_update(state['dashboard-applied.data'], data_key,
+                                                {**callbacks.DEFAULT_INPUTS, 'end_date': end_date})
+
+    assert state is callbacks.initial_state(DataVersion(1, InitialStateData(1)), 'world.geojson')
+    assert 1 == len(calls)
+
+    callbacks.initial_state(DataVersion(2, InitialStateData(2)), 'world.geojson')
+    assert 2 == len(calls)
+
+
+def test_initial_state_other_data_not_blocked(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def build_dashboard(data, world, executor, **inputs):
+        calls.append(len(data))
+        if len(data) == 1:
+            release.wait(5)
+        return tuple([len(data)] * len(callbacks.MAIN_OUTPUTS))
+
+    monkeypatch.setattr(callbacks, 'build_dashboard', build_dashboard)
+    monkeypatch.setattr(callbacks, '_initial_state_cache', None)
+
+    states = []
+    thread = threading.Thread(target=lambda: states.append(
+        callbacks.initial_state(DataVersion(1, InitialStateData(1)), 'world.geojson')))
+    thread.start()
+    while len(calls) == 0:
+        release.wait(0.01)
+
+    # The state for other data is built while the state for the first data is still being built
+    state = callbacks.initial_state(DataVersion(2, InitialStateData(2)), 'world.geojson')
+    assert 2 == state['global-sample-count.children']
+
+    release.set()
+    thread.join(5)
+    assert 1 == states[0]['global-sample-count.children']
+    assert [1, 2] == calls
+
+
+def test_build_main_pane_figures_executor(monkeypatch):
+    def build_main_pane_figure(name, data, fig_settings, world):
+        return f'{name}-{data}'
+
+    monkeypatch.setattr(callbacks, 'build_main_pane_figure', build_main_pane_figure)
+    names = ['totals', 'rgi', 'map']
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        figs = callbacks.build_main_pane_figures(names, 'data', {}, 'world.geojson', executor=executor)
+
+    assert {'totals': 'totals-data', 'rgi': 'rgi-data', 'map': 'map-data'} == figs
+    assert figs == callbacks.build_main_pane_figures(names, 'data', {}, 'world.geojson')
+
+
+def test_build_main_pane_figures_checkpoint(monkeypatch):
+    built = []
+
+    def build_main_pane_figure(name, data, fig_settings, world):
+        built.append(name)
+        return name
+
+    def checkpoint():
+        if len(built) == 2:
+            raise Exception('Cancelled')
+
+    monkeypatch.setattr(callbacks, 'build_main_pane_figure', build_main_pane_figure)
+
+    with pytest.raises(Exception, match='Cancelled'):
+        callbacks.build_main_pane_figures(['totals', 'rgi', 'map'], 'data', {}, 'world.geojson',
+                                          checkpoint=checkpoint)
+    assert ['totals', 'rgi'] == built
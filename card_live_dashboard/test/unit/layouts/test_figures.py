@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+
+import card_live_dashboard.layouts.figures as figures
+from card_live_dashboard.model.CardLiveData import CardLiveData
+from card_live_dashboard.model.RGIParser import RGIParser
+
+MAIN_DF = pd.DataFrame(
+    columns=['filename', 'timestamp', 'geo_area_code', 'geo_area_name_standard', 'lmat_taxonomy'],
+    data=[['file1', '2020-08-01 00:00:00', 10, 'Antarctica', 'Salmonella enterica'],
+          ['file2', '2020-08-02 00:00:00', 10, 'Antarctica', 'Enterobacteriaceae'],
+          ['file3', '2020-08-02 00:00:00', 15, 'Northern Africa', 'Salmonella enterica'],
+          ['file4', '2020-08-11 00:00:00', 15, 'Northern Africa', 'Salmonella enterica'],
+          ],
+)
+
+OTHER_DF = pd.DataFrame(
+    columns=['filename'],
+    data=[['file1'], ['file2'], ['file3'], ['file4']]
+).set_index('filename')
+
+RGI_DF = pd.DataFrame(
+    columns=['filename', 'rgi_main.Cut_Off', 'rgi_main.Drug Class', 'rgi_main.Best_Hit_ARO'],
+    data=[['file1', 'Perfect', 'class1; class2', 'gene1'],
+          ['file2', 'Perfect', 'class1', 'gene1'],
+          ['file3', 'Strict', 'class2', 'gene2'],
+          ['file4', 'Perfect', 'class1; class2', 'gene1'],
+          ]
+).set_index('filename')
+
+DATA = CardLiveData(main_df=MAIN_DF,
+                    rgi_parser=RGIParser(RGI_DF),
+                    rgi_kmer_df=OTHER_DF,
+                    lmat_df=OTHER_DF,
+                    mlst_df=OTHER_DF)
+
+
+def test_bin_timeline():
+    timestamps = pd.to_datetime(MAIN_DF['timestamp'])
+    bin_centers, bin_width, counts = figures.bin_timeline(timestamps, nbins=10)
+
+    assert 10 == len(bin_centers)
+    assert pd.Timestamp('2020-08-01 12:00:00') == bin_centers[0]
+    assert pd.Timestamp('2020-08-10 12:00:00') == bin_centers[-1]
+    assert 24 * 60 * 60 * 1000 == bin_width
+    assert (1, 10) == counts.shape
+    assert [1, 2, 0, 0, 0, 0, 0, 0, 0, 1] == counts[0].tolist()
+
+
+def test_bin_timeline_cumulative_fraction():
+    timestamps = pd.to_datetime(MAIN_DF['timestamp'])
+    bin_centers, bin_width, counts = figures.bin_timeline(timestamps, nbins=10, cumulative=True, fraction=True)
+
+    assert [0.25, 0.75, 0.75, 0.75, 0.75, 0.75, 0.75, 0.75, 0.75, 1.0] == counts[0].tolist()
+
+
+def test_bin_timeline_groups():
+    timestamps = pd.to_datetime(MAIN_DF['timestamp'])
+    groups = pd.Categorical(MAIN_DF['geo_area_name_standard'], categories=['Northern Africa', 'Antarctica'])
+    bin_centers, bin_width, counts = figures.bin_timeline(timestamps, groups=groups, nbins=10)
+
+    assert (2, 10) == counts.shape
+    assert [0, 1, 0, 0, 0, 0, 0, 0, 0, 1] == counts[0].tolist()
+    assert [1, 1, 0, 0, 0, 0, 0, 0, 0, 0] == counts[1].tolist()
+
+
+def test_bin_timeline_single_time():
+    timestamps = pd.to_datetime(pd.Series(['2020-08-01 00:00:00', '2020-08-01 00:00:00']))
+    bin_centers, bin_width, counts = figures.bin_timeline(timestamps, nbins=2)
+
+    assert [pd.Timestamp('2020-07-31 18:00:00'), pd.Timestamp('2020-08-01 06:00:00')] == bin_centers.tolist()
+    assert [0, 2] == counts[0].tolist()
+
+
+def test_downsample_timestamps():
+    timestamps = pd.Series(pd.date_range('2020-08-01', periods=101, freq='D'))
+
+    assert 101 == len(figures.downsample_timestamps(timestamps, 200))
+
+    downsampled = figures.downsample_timestamps(timestamps, 11)
+    assert 11 == len(downsampled)
+    assert pd.Timestamp('2020-08-01') == downsampled[0]
+    assert pd.Timestamp('2020-08-11') == downsampled[1]
+    assert pd.Timestamp('2020-11-09') == downsampled[-1]
+
+
+def test_build_time_histogram_default():
+    fig = figures.build_time_histogram(DATA, fig_type='cumulative_counts', color_by='default')
+
+    assert ['bar', 'box'] == [trace.type for trace in fig.data]
+    assert figures.TIMELINE_BINS == len(fig.data[0].x)
+    assert 4 == fig.data[0].y[-1]
+    assert 4 == len(fig.data[1].x)
+
+
+def test_build_time_histogram_color():
+    fig = figures.build_time_histogram(DATA, fig_type='percent', color_by='geographic')
+
+    assert ['bar', 'bar'] == [trace.type for trace in fig.data]
+    assert {'Northern Africa', 'Antarctica'} == {trace.name for trace in fig.data}
+    assert np.isclose(0.5, sum(fig.data[0].y))
+    assert np.isclose(0.5, sum(fig.data[1].y))
+    assert 'Geographic region' == fig.layout.legend.title.text
+
+
+def test_rgi_intersection_figure():
+    fig = figures.rgi_intersection_figure(DATA, type_value='drug_class')
+
+    cardinality, totals, grid, membership = fig.data
+    assert [2, 1, 1] == list(cardinality.y)
+    assert 'class1<br>class2' == cardinality.x[0]
+    assert {'class1', 'class2'} == set(cardinality.x[1:])
+
+    assert 6 == len(grid.x)
+    assert [0, 1, 2, 0, 1, 2] == list(grid.x)
+    assert [0, 0, 0, 1, 1, 1] == list(grid.y)
+
+    assert 4 == len(membership.x)
+    names_by_position = {(x, y): name for x, y, name in zip(membership.x, membership.y, membership.hovertext)}
+    category_rows = {name: y for (x, y), name in names_by_position.items()}
+    assert {'class1', 'class2'} == set(category_rows.keys())
+    assert {(0, category_rows['class1']), (0, category_rows['class2'])}.issubset(names_by_position.keys())
+
+    ticktext = list(fig.layout.yaxis3.ticktext)
+    assert 2 == len(ticktext)
+    assert category_rows['class1'] == ticktext.index('class1')
+    assert category_rows['class2'] == ticktext.index('class2')
+    assert [-0.5, 2.5] == list(fig.layout.xaxis3.range)
+
+
+def test_build_figure_shared_template():
+    fig1 = figures.build_figure([{'type': 'bar', 'x': [1], 'y': ['a']}], {'height': 400})
+    fig2 = figures.build_figure([{'type': 'bar', 'x': [2], 'y': ['b']}], {'height': 500})
+
+    assert 400 == fig1.layout.height
+    assert ['b'] == list(fig2.data[0].y)
+    assert fig1.layout.template == fig2.layout.template
+    assert figures.figure_template() is figures.figure_template()
+
+
+def test_totals_figure_default():
+    fig = figures.totals_figure(DATA, 'geographic', 'default')
+
+    assert 1 == len(fig.data)
+    assert 'h' == fig.data[0].orientation
+    assert {'Antarctica': 2, 'Northern Africa': 2} == dict(zip(fig.data[0].y, fig.data[0].x))
+    assert 'Totals by geographic region' == fig.layout.title.text
+    assert 'Samples count' == fig.layout.xaxis.title.text
+
+
+def test_totals_figure_color():
+    fig = figures.totals_figure(DATA, 'geographic', 'organism_lmat')
+
+    assert ['Salmonella enterica', 'Enterobacteriaceae'] == [trace.name for trace in fig.data]
+    assert {'Antarctica': 1, 'Northern Africa': 2} == dict(zip(fig.data[0].y, fig.data[0].x))
+    assert {'Antarctica': 1} == dict(zip(fig.data[1].y, fig.data[1].x))
+    assert fig.data[1].hovertemplate.startswith('Organism=Enterobacteriaceae<br>')
+    assert 'Organism' == fig.layout.legend.title.text
+
+
+def test_rgi_breakdown_figure():
+    fig = figures.rgi_breakdown_figure(DATA, 'drug_class', 'default')
+
+    assert 1 == len(fig.data)
+    assert {'class1': 0.75, 'class2': 0.75} == dict(zip(fig.data[0].y, fig.data[0].x))
+    assert [[3], [3]] == fig.data[0].customdata.tolist()
+    assert 1 == fig.layout.yaxis.dtick
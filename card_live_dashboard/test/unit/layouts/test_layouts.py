@@ -0,0 +1,65 @@
+import plotly.graph_objects as go
+
+import card_live_dashboard.layouts as layouts
+import card_live_dashboard.layouts.figures as figures
+
+
+def find_props(component, component_id):
+    if getattr(component, 'id', None) == component_id:
+        return component
+    children = getattr(component, 'children', None)
+    if children is None:
+        return None
+    if not isinstance(children, (list, tuple)):
+        children = [children]
+    for child in children:
+        found = find_props(child, component_id)
+        if found is not None:
+            return found
+    return None
+
+
+def test_default_layout_no_initial_state():
+    layout = layouts.default_layout()
+
+    assert [layouts.LOADING] == find_props(layout, 'global-sample-count').children
+    assert figures.EMPTY_MAP is find_props(layout, 'figure-geographic-map-id').figure
+    assert 'options' not in find_props(layout, 'drug-class-select').to_plotly_json()['props']
+
+
+def test_default_layout_initial_state():
+    fig = go.Figure(go.Bar(x=[1], y=['a']))
+    options = [{'label': 'a', 'value': 'a'}]
+    layout = layouts.default_layout(initial_state={
+        'global-sample-count.children': 10,
+        'sample-count-figure.children': '5/10',
+        'drug-class-select.options': options,
+        'figure-rgi-intersections.figure': fig,
+    })
+
+    assert [10] == find_props(layout, 'global-sample-count').children
+    assert ['5/10'] == find_props(layout, 'sample-count-figure').children
+    assert [layouts.LOADING] == find_props(layout, 'selected-samples-count').children
+    assert options == find_props(layout, 'drug-class-select').options
+    assert fig is find_props(layout, 'figure-rgi-intersections').figure
+    assert figures.EMPTY_FIGURE is find_props(layout, 'figure-rgi-id').figure
+
+
+def test_default_layout_loading():
+    layout = layouts.default_layout()
+    assert not find_props(layout, 'data-loading-status').is_open
+    assert find_props(layout, 'data-loading-interval').disabled
+
+    layout = layouts.default_layout(loading_status='Loading')
+    assert find_props(layout, 'data-loading-status').is_open
+    assert 'Loading' == find_props(layout, 'data-loading-status').children
+    assert not find_props(layout, 'data-loading-interval').disabled
+
+
+def test_loading_message():
+    progress = {'stage': 'reading files', 'done': 10, 'total': 100, 'elapsed': 1.0}
+    assert 'Loading the CARD:Live data (reading files: 10/100).' == layouts.loading_message(
+        {'status': 'loading', 'progress': progress})
+    assert 'Loading the CARD:Live data (building tables).' == layouts.loading_message(
+        {'status': 'loading', 'progress': {**progress, 'stage': 'building tables', 'done': None, 'total': None}})
+    assert 'retrying' in layouts.loading_message({'status': 'failed', 'progress': progress})
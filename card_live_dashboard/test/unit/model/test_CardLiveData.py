@@ -1,8 +1,11 @@
+import threading
+import time
 from datetime import datetime
 
 import numpy as np
 import pandas as pd
 
+import card_live_dashboard.model.CardLiveData as card_live_data
 from card_live_dashboard.model.CardLiveData import CardLiveData
 from card_live_dashboard.model.RGIParser import RGIParser
 from card_live_dashboard.model.data_modifiers.AntarcticaNAModifier import AntarcticaNAModifier
@@ -569,3 +572,26 @@ def test_switch_antarctica_na_none():
     assert 10 == data.main_df.loc['file1', 'geo_area_code']
     assert 10 == data.main_df.loc['file2', 'geo_area_code']
     assert 1 == data.main_df.loc['file3', 'geo_area_code']
+
+
+def test_category_index_built_once(monkeypatch):
+    built = []
+
+    class SlowCategoryIndex:
+        def __init__(self, main_df, rgi_parser):
+            built.append(self)
+            time.sleep(0.1)
+
+    monkeypatch.setattr(card_live_data, 'CategoryIndex', SlowCategoryIndex)
+    data = CardLiveData(main_df=MAIN_DF, rgi_parser=RGI_PARSER, rgi_kmer_df=OTHER_DF, lmat_df=OTHER_DF,
+                        mlst_df=OTHER_DF)
+
+    indexes = []
+    threads = [threading.Thread(target=lambda: indexes.append(data.category_index)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert 1 == len(built)
+    assert [built[0]] * 4 == indexes
@@ -0,0 +1,103 @@
+import pandas as pd
+
+from card_live_dashboard.model.CardLiveData import CardLiveData
+from card_live_dashboard.model.CategoryIndex import CategoryIndex
+from card_live_dashboard.model.RGIParser import RGIParser
+
+MAIN_DF = pd.DataFrame(
+    columns=['filename', 'timestamp', 'geo_area_code', 'lmat_taxonomy', 'rgi_kmer_taxonomy'],
+    data=[['file1', '2020-08-05 16:27:32.996157', 10, 'Salmonella enterica', 'Enterobacteriaceae'],
+          ['file2', '2020-08-06 16:27:32.996157', 10, 'Enterobacteriaceae', 'Salmonella enterica'],
+          ['file3', '2020-08-07 16:27:32.996157', 1, 'Salmonella enterica', 'Enterobacteriaceae'],
+          ],
+)
+
+OTHER_DF = pd.DataFrame(
+    columns=['filename'],
+    data=[['file1'],
+          ['file2'],
+          ['file3'],
+          ]
+).set_index('filename')
+
+RGI_DF = pd.DataFrame(
+    columns=['filename', 'rgi_main.Cut_Off', 'rgi_main.Drug Class', 'rgi_main.Best_Hit_ARO',
+             'rgi_main.Resistance Mechanism', 'rgi_main.AMR Gene Family'],
+    data=[['file1', 'Perfect', 'class1; class2', 'gene1', 'antibiotic efflux; antibiotic target alteration', 'family1'],
+          ['file1', 'Strict', 'class1; class2; class3', 'gene2', 'antibiotic inactivation', 'family2'],
+          ['file2', 'Perfect', 'class1; class2; class4', 'gene1', 'antibiotic efflux; antibiotic target alteration',
+           'family1'],
+          ['file3', None, None, None, None, None],
+          ]
+).set_index('filename')
+
+DATA = CardLiveData(main_df=MAIN_DF,
+                    rgi_parser=RGIParser(RGI_DF),
+                    rgi_kmer_df=OTHER_DF,
+                    lmat_df=OTHER_DF,
+                    mlst_df=OTHER_DF)
+
+
+def test_categories_all_files():
+    index = DATA.category_index
+    files = DATA.main_df.index
+
+    assert ['class1', 'class2', 'class3', 'class4'] == index.categories('drug_class', files)
+    assert ['family1', 'family2'] == index.categories('amr_gene_family', files)
+    assert ['antibiotic efflux', 'antibiotic inactivation',
+            'antibiotic target alteration'] == index.categories('resistance_mechanism', files)
+    assert ['gene1', 'gene2'] == index.categories('amr_gene', files)
+    assert ['Enterobacteriaceae', 'Salmonella enterica'] == index.categories('lmat_taxonomy', files)
+
+
+def test_categories_same_as_rgi_parser():
+    index = DATA.category_index
+
+    for data, cutoff in [(DATA, 'all'),
+                         (DATA.select(table='rgi', by='cutoff', type='row', level='perfect'), 'perfect'),
+                         (DATA.select(table='rgi', by='drug', type='file', elements=['class4']), 'all')]:
+        files = data.main_df.index
+        assert sorted(data.rgi_parser.all_drugs()) == index.categories('drug_class', files, cutoff)
+        assert sorted(data.rgi_parser.all_amr_genes()) == index.categories('amr_gene', files, cutoff)
+        assert sorted(data.rgi_parser.all_amr_gene_family()) == index.categories('amr_gene_family', files, cutoff)
+
+
+def test_categories_subset_files():
+    index = DATA.category_index
+    files = pd.Index(['file2', 'file3'])
+
+    assert ['class1', 'class2', 'class4'] == index.categories('drug_class', files)
+    assert ['Enterobacteriaceae', 'Salmonella enterica'] == index.categories('lmat_taxonomy', files)
+    assert ['Enterobacteriaceae'] == index.categories('lmat_taxonomy', pd.Index(['file2']))
+    assert [] == index.categories('drug_class', pd.Index(['file3']))
+    assert [] == index.categories('drug_class', pd.Index([]))
+
+
+def test_categories_cutoff():
+    index = DATA.category_index
+    files = pd.Index(['file1'])
+
+    assert ['class1', 'class2', 'class3'] == index.categories('drug_class', files, 'all')
+    assert ['class1', 'class2'] == index.categories('drug_class', files, 'perfect')
+    assert ['gene2'] == index.categories('amr_gene', files, 'strict')
+    assert [] == index.categories('amr_gene', files, 'loose')
+
+
+def test_options():
+    index = CategoryIndex(DATA.main_df, DATA.rgi_parser)
+    files = pd.Index(['file2'])
+
+    options = index.options('amr_gene_family', files)
+    assert [{'label': 'family1', 'value': 'family1'}] == options
+    assert options is index.options('amr_gene_family', files)
+    assert options is index.options('amr_gene_family', pd.Index(['file2']), selected_options=['family1'])
+
+
+def test_options_selected_missing():
+    index = DATA.category_index
+
+    assert [{'label': 'a', 'value': 'a'}, {'label': 'family1', 'value': 'family1'},
+            {'label': 'z', 'value': 'z'}] == index.options('amr_gene_family', pd.Index(['file2']),
+                                                           selected_options=['z', 'a'])
+    assert [{'label': 'Enterobacteriaceae', 'value': 'Enterobacteriaceae'}] == index.options(
+        'lmat_taxonomy', pd.Index(['file2']), selected_options=[None])
@@ -0,0 +1,121 @@
+import threading
+
+import pytest
+
+from card_live_dashboard.service.AdmissionController import AdmissionController, Overloaded
+
+
+class BlockingComputation:
+    """
+    A computation which blocks until released.
+    """
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.started.set()
+        self.release.wait(5)
+        return 'result'
+
+
+def start_in_thread(controller, computation):
+    results = []
+    thread = threading.Thread(target=lambda: results.append(controller.run(computation)))
+    thread.start()
+    assert computation.started.wait(5)
+    return thread, results
+
+
+@pytest.fixture(params=['process', 'host'])
+def make_controller(request, tmp_path):
+    def make(**kwargs):
+        lock_dir = tmp_path if request.param == 'host' else None
+        return AdmissionController(lock_dir=lock_dir, **kwargs)
+
+    return make
+
+
+def test_run(make_controller):
+    controller = make_controller()
+    assert 'result' == controller.run(lambda: 'result')
+
+
+def test_run_error_releases_slot(make_controller):
+    controller = make_controller(max_running=1, max_waiting=0)
+
+    def fail():
+        raise ValueError('error')
+
+    with pytest.raises(ValueError):
+        controller.run(fail)
+    assert 'result' == controller.run(lambda: 'result')
+
+
+def test_reject_when_queue_full(make_controller):
+    controller = make_controller(max_running=1, max_waiting=0)
+    computation = BlockingComputation()
+    thread, results = start_in_thread(controller, computation)
+
+    with pytest.raises(Overloaded):
+        controller.run(lambda: 'other')
+
+    computation.release.set()
+    thread.join()
+    assert ['result'] == results
+    assert 'other' == controller.run(lambda: 'other')
+
+
+def test_reject_after_wait_timeout(make_controller):
+    controller = make_controller(max_running=1, max_waiting=1, wait_timeout=0.1)
+    computation = BlockingComputation()
+    thread, results = start_in_thread(controller, computation)
+
+    with pytest.raises(Overloaded, match='Timed out'):
+        controller.run(lambda: 'other')
+
+    computation.release.set()
+    thread.join()
+
+
+def test_wait_for_running_computation(make_controller):
+    controller = make_controller(max_running=1, max_waiting=1, wait_timeout=5)
+    computation = BlockingComputation()
+    thread, results = start_in_thread(controller, computation)
+
+    threading.Timer(0.1, computation.release.set).start()
+    assert 'other' == controller.run(lambda: 'other')
+    thread.join()
+
+
+def test_invalid_limits():
+    with pytest.raises(Exception, match='max_running'):
+        AdmissionController(max_running=0)
+    with pytest.raises(Exception, match='max_waiting'):
+        AdmissionController(max_waiting=-1)
+
+
+def test_host_slots_shared_between_controllers(tmp_path):
+    # Separate controllers (as in separate processes) share the slots through the lock files
+    controller1 = AdmissionController(max_running=1, max_waiting=0, lock_dir=tmp_path)
+    controller2 = AdmissionController(max_running=1, max_waiting=0, lock_dir=tmp_path)
+    computation = BlockingComputation()
+    thread, results = start_in_thread(controller1, computation)
+
+    with pytest.raises(Overloaded):
+        controller2.run(lambda: 'other')
+
+    computation.release.set()
+    thread.join()
+    assert 'other' == controller2.run(lambda: 'other')
+
+
+def test_host_slot_files_opened_once(tmp_path):
+    controller = AdmissionController(max_running=2, max_waiting=1, lock_dir=tmp_path)
+    controller.run(lambda: 'result')
+    slot_files = dict(controller._slot_files)
+
+    for i in range(3):
+        controller.run(lambda: 'result')
+    assert slot_files == controller._slot_files
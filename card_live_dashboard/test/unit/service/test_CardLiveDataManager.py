@@ -0,0 +1,205 @@
+import os
+import signal
+import threading
+import time
+
+from card_live_dashboard.service.CardLiveDataManager import CardLiveDataManager
+from card_live_dashboard.test.unit.service.test_DataVersion import build_data
+
+
+def fork_hooks(monkeypatch):
+    # Records the fork hooks instead of registering them in the test process
+    hooks = {}
+    monkeypatch.setattr(os, 'register_at_fork', lambda **kwargs: hooks.update(kwargs))
+    return hooks
+
+
+def fork_worker(hooks):
+    hooks['before']()
+    hooks['after_in_parent']()
+
+
+class FakeDataLoader:
+    """
+    A data loader which counts the number of times data is loaded, with new data available when [changed] is set.
+    """
+
+    def __init__(self):
+        self.loads = 0
+        self.changed = False
+        self.error = None
+        self.release = threading.Event()
+        self.release.set()
+
+    def read_or_update_data(self, existing_data=None, progress=None):
+        self.release.wait()
+        if self.error is not None:
+            raise Exception(self.error)
+        if existing_data is None or self.changed:
+            self.loads += 1
+            self.changed = False
+            return build_data()
+        else:
+            return existing_data
+
+
+def build_manager(tmp_path, monkeypatch, **kwargs):
+    loader = FakeDataLoader()
+    monkeypatch.setattr(CardLiveDataManager, 'create_data_loader', staticmethod(lambda home, **kwargs: loader))
+    return loader, CardLiveDataManager(tmp_path, **kwargs)
+
+
+def test_reload_workers_on_update(tmp_path, monkeypatch):
+    signals = []
+    monkeypatch.setattr(os, 'kill', lambda pid, sig: signals.append((pid, sig)))
+    hooks = fork_hooks(monkeypatch)
+
+    loader, manager = build_manager(tmp_path, monkeypatch)
+    try:
+        loader.changed = True
+        manager.update_job()
+        assert [] == signals
+
+        manager.reload_workers_on_update(1234)
+        fork_worker(hooks)
+        manager.update_job()
+        assert [] == signals
+
+        loader.changed = True
+        manager.update_job()
+        assert [(1234, signal.SIGHUP)] == signals
+        assert {'file1', 'file2'} == manager.card_data.files()
+    finally:
+        manager._scheduler.shutdown()
+
+
+def test_reload_workers_not_forked(tmp_path, monkeypatch):
+    signals = []
+    monkeypatch.setattr(os, 'kill', lambda pid, sig: signals.append((pid, sig)))
+    hooks = fork_hooks(monkeypatch)
+
+    loader, manager = build_manager(tmp_path, monkeypatch)
+    try:
+        manager.reload_workers_on_update(1234)
+
+        # Workers forked after new data is loaded already have the new data
+        loader.changed = True
+        manager.update_job()
+        fork_worker(hooks)
+        assert [] == signals
+    finally:
+        manager._scheduler.shutdown()
+
+
+def test_data_version_increases(tmp_path, monkeypatch):
+    loader, manager = build_manager(tmp_path, monkeypatch)
+    try:
+        first = manager.data_version
+        assert 1 == first.version
+
+        manager.update_job()
+        assert first is manager.data_version
+
+        loader.changed = True
+        manager.update_job()
+
+        # Readers of the old version keep reading the same data
+        assert 1 == first.version
+        assert first.data is not manager.card_data
+        assert 2 == manager.data_version.version
+        assert manager.data_version.data is manager.card_data
+    finally:
+        manager._scheduler.shutdown()
+
+
+def wait_until_ready(manager):
+    for i in range(100):
+        if manager.status()['status'] == 'ready':
+            return
+        time.sleep(0.05)
+    raise AssertionError(f'Data not loaded: {manager.status()}')
+
+
+def shutdown_background(manager):
+    # The scheduler is started by the loading thread after the data is loaded (or fails to load)
+    for i in range(100):
+        if manager._scheduler.running:
+            break
+        time.sleep(0.05)
+    manager._scheduler.shutdown()
+
+
+def test_background_load_no_data(tmp_path, monkeypatch):
+    loader = FakeDataLoader()
+    loader.release.clear()
+    monkeypatch.setattr(CardLiveDataManager, 'create_data_loader', staticmethod(lambda home, **kwargs: loader))
+
+    manager = CardLiveDataManager(tmp_path, background_load=True)
+    try:
+        status = manager.status()
+        assert 'loading' == status['status']
+        assert status['data_version'] is None
+        assert manager.data_version is None
+        assert manager.card_data is None
+
+        loader.release.set()
+        wait_until_ready(manager)
+        assert 1 == manager.data_version.version
+        assert 'loaded' == manager.status()['progress']['stage']
+    finally:
+        loader.release.set()
+        shutdown_background(manager)
+
+
+def test_background_load_failed(tmp_path, monkeypatch):
+    loader = FakeDataLoader()
+    loader.error = 'no data'
+    monkeypatch.setattr(CardLiveDataManager, 'create_data_loader', staticmethod(lambda home, **kwargs: loader))
+
+    manager = CardLiveDataManager(tmp_path, background_load=True)
+    try:
+        for i in range(100):
+            if manager.status()['status'] == 'failed':
+                break
+            time.sleep(0.05)
+        assert 'failed' == manager.status()['status']
+        assert 'no data' == manager.status()['error']
+
+        # Loaded by the scheduled job instead
+        loader.error = None
+        manager.update_job()
+        assert 'ready' == manager.status()['status']
+        assert manager.status()['error'] is None
+    finally:
+        shutdown_background(manager)
+
+
+def test_fork_not_blocked_by_background_load(tmp_path, monkeypatch):
+    signals = []
+    monkeypatch.setattr(os, 'kill', lambda pid, sig: signals.append((pid, sig)))
+    hooks = fork_hooks(monkeypatch)
+    loader = FakeDataLoader()
+    loader.release.clear()
+    monkeypatch.setattr(CardLiveDataManager, 'create_data_loader', staticmethod(lambda home, **kwargs: loader))
+
+    manager = CardLiveDataManager(tmp_path, background_load=True)
+    forked = threading.Event()
+    thread = threading.Thread(target=lambda: (fork_worker(hooks), forked.set()))
+    try:
+        manager.reload_workers_on_update(1234)
+
+        # Workers are forked while the data is loading (and serve the loading page)
+        thread.start()
+        assert forked.wait(1)
+        assert 'loading' == manager.status()['status']
+        assert [] == signals
+
+        # Then replaced once the data has loaded
+        loader.release.set()
+        wait_until_ready(manager)
+        assert 1 == manager.data_version.version
+        assert [(1234, signal.SIGHUP)] == signals
+    finally:
+        loader.release.set()
+        thread.join(5)
+        shutdown_background(manager)
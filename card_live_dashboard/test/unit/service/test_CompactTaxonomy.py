@@ -0,0 +1,112 @@
+import os
+import sqlite3
+import warnings
+
+import pandas as pd
+from ete3 import NCBITaxa
+
+from card_live_dashboard.service.CompactTaxonomy import CompactTaxonomy
+from card_live_dashboard.service.TaxonomicParser import TaxonomicParser
+
+# taxid: (parent, name, rank)
+SPECIES = {
+    1: (None, 'root', 'no rank'),
+    2: (1, 'Bacteria', 'superkingdom'),
+    543: (2, 'Enterobacteriaceae', 'family'),
+    590: (543, 'Salmonella', 'genus'),
+    28901: (590, 'Salmonella enterica', 'species'),
+    90371: (28901, 'Salmonella enterica subsp. enterica serovar Typhimurium', 'no rank'),
+    99287: (90371, 'Salmonella enterica subsp. enterica serovar Typhimurium str. LT2', 'strain'),
+    561: (543, 'Escherichia', 'genus'),
+    562: (561, 'Escherichia coli', 'species'),
+    1637: (2, 'Listeria', 'genus'),
+    1639: (1637, 'Listeria monocytogenes', 'species'),
+}
+
+# taxid_old: taxid_new
+MERGED = {
+    12345: 99287,
+    54321: 999999,
+}
+
+
+def build_taxa_file(tmp_path, species=None):
+    """
+    Builds a (small) NCBI taxa database in the same format as the ete3 toolkit.
+    """
+    species = species if species is not None else SPECIES
+    taxa_file = tmp_path / 'taxa.sqlite'
+    if taxa_file.exists():
+        taxa_file.unlink()
+
+    db = sqlite3.connect(taxa_file)
+    db.executescript('''
+        CREATE TABLE stats (version INT PRIMARY KEY);
+        CREATE TABLE species (taxid INT PRIMARY KEY, parent INT, spname VARCHAR(50) COLLATE NOCASE,
+                              common VARCHAR(50) COLLATE NOCASE, rank VARCHAR(50), track TEXT);
+        CREATE TABLE synonym (taxid INT,spname VARCHAR(50) COLLATE NOCASE, PRIMARY KEY (spname, taxid));
+        CREATE TABLE merged (taxid_old INT, taxid_new INT);
+        INSERT INTO stats (version) VALUES (2);
+    ''')
+    for taxid, (parent, name, rank) in species.items():
+        track = [taxid]
+        while species[track[-1]][0] is not None:
+            track.append(species[track[-1]][0])
+        db.execute('INSERT INTO species (taxid, parent, spname, common, rank, track) VALUES (?, ?, ?, ?, ?, ?);',
+                   (taxid, parent if parent is not None else '', name, '', rank, ','.join(map(str, track))))
+    for taxid_old, taxid_new in MERGED.items():
+        db.execute('INSERT INTO merged (taxid_old, taxid_new) VALUES (?, ?);', (taxid_old, taxid_new))
+    db.commit()
+    db.close()
+
+    return taxa_file
+
+
+def test_limit_to_rank(tmp_path):
+    taxonomy = CompactTaxonomy(build_taxa_file(tmp_path))
+
+    assert {99287: 28901, 90371: 28901, 28901: 28901, 590: 590, 562: 562, 1: 1,
+            12345: 28901, 54321: 54321, 777: 777} == taxonomy.limit_to_rank(
+        [99287, 90371, 28901, 590, 562, 1, 12345, 54321, 777], 'species')
+    assert {99287: 590, 1639: 1637, 543: 543} == taxonomy.limit_to_rank([99287, 1639, 543], 'genus')
+    assert {99287: 99287} == taxonomy.limit_to_rank([99287], 'no such rank')
+    assert {} == taxonomy.limit_to_rank([], 'species')
+
+
+def test_get_names(tmp_path):
+    taxonomy = CompactTaxonomy(build_taxa_file(tmp_path))
+
+    assert {28901: 'Salmonella enterica', 1: 'root',
+            12345: 'Salmonella enterica subsp. enterica serovar Typhimurium str. LT2'} == taxonomy.get_names(
+        [28901, 1, 12345, 54321, 777, 0, 10 ** 9])
+
+
+def test_database_updated(tmp_path):
+    taxa_file = build_taxa_file(tmp_path)
+    taxonomy = CompactTaxonomy(taxa_file)
+    assert {} == taxonomy.get_names([620])
+
+    build_taxa_file(tmp_path, species={**SPECIES, 620: (543, 'Shigella', 'genus')})
+    stat = os.stat(taxa_file)
+    os.utime(taxa_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert {620: 'Shigella'} == taxonomy.get_names([620])
+
+
+def test_same_as_ncbi_taxa(tmp_path):
+    taxa_file = build_taxa_file(tmp_path)
+    taxon_ids = list(SPECIES.keys()) + list(MERGED.keys()) + [777, None]
+
+    lmat_df = pd.DataFrame(columns=['filename', 'lmat.taxonomy_label', 'lmat.count', 'lmat.ncbi_taxon_id'],
+                           data=[[f'file{i % 3}', 'label', '10', taxon_id] for i, taxon_id in
+                                 enumerate(taxon_ids * 2)]).set_index('filename')
+    rgi_kmer_df = pd.DataFrame(columns=['filename', 'rgi_kmer.CARD*kmer Prediction'],
+                               data=[['file1', 'Salmonella enterica (chromosome)']]).set_index('filename')
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        expected = TaxonomicParser(ncbi_taxa=NCBITaxa(dbfile=str(taxa_file)), df_lmat=lmat_df,
+                                   df_rgi_kmer=rgi_kmer_df)._df_lmat
+    actual = TaxonomicParser(compact_taxonomy=CompactTaxonomy(taxa_file), df_lmat=lmat_df,
+                             df_rgi_kmer=rgi_kmer_df)._df_lmat
+
+    pd.testing.assert_frame_equal(expected, actual)
@@ -0,0 +1,65 @@
+import gc
+
+import pandas as pd
+import pytest
+
+from card_live_dashboard.model.CardLiveData import CardLiveData
+from card_live_dashboard.model.RGIParser import RGIParser
+from card_live_dashboard.service.DataVersion import DataVersion
+
+MAIN_DF = pd.DataFrame(
+    columns=['filename', 'timestamp', 'geo_area_code', 'lmat_taxonomy', 'rgi_kmer_taxonomy'],
+    data=[['file1', '2020-08-05 16:27:32.996157', 10, 'Salmonella enterica', 'Enterobacteriaceae'],
+          ['file2', '2020-08-06 16:27:32.996157', 10, 'Enterobacteriaceae', 'Salmonella enterica'],
+          ],
+)
+
+OTHER_DF = pd.DataFrame(columns=['filename'], data=[['file1'], ['file2']]).set_index('filename')
+
+RGI_DF = pd.DataFrame(
+    columns=['filename', 'rgi_main.Cut_Off', 'rgi_main.Drug Class', 'rgi_main.Best_Hit_ARO',
+             'rgi_main.Resistance Mechanism', 'rgi_main.AMR Gene Family'],
+    data=[['file1', 'Perfect', 'class1; class2', 'gene1', 'antibiotic efflux', 'family1'],
+          ['file2', 'Strict', 'class1', 'gene2', 'antibiotic inactivation', 'family2'],
+          ]
+).set_index('filename')
+
+
+def build_data():
+    return CardLiveData(main_df=MAIN_DF, rgi_parser=RGIParser(RGI_DF), rgi_kmer_df=OTHER_DF, lmat_df=OTHER_DF,
+                        mlst_df=OTHER_DF)
+
+
+def test_data_version():
+    data = build_data()
+    data_version = DataVersion(3, data)
+
+    assert 3 == data_version.version
+    assert data is data_version.data
+    assert (3, len(data), str(data.latest_update())) == data_version.key
+
+
+def test_data_version_immutable():
+    data_version = DataVersion(1, build_data())
+
+    with pytest.raises(AttributeError):
+        data_version._data = build_data()
+    with pytest.raises(AttributeError):
+        data_version.version = 2
+
+
+def test_data_version_released_after_readers(caplog):
+    caplog.set_level('DEBUG', logger='card_live_dashboard.service.DataVersion')
+
+    current = DataVersion(1, build_data())
+    reader = current
+
+    current = DataVersion(2, build_data())
+    gc.collect()
+    assert 'Released data version [1]' not in caplog.text
+    assert 1 == reader.version
+
+    del reader
+    gc.collect()
+    assert 'Released data version [1]' in caplog.text
+    assert 'Released data version [2]' not in caplog.text
@@ -1,7 +1,10 @@
+import shutil
 from os import path
 from pathlib import Path
 
+import geopandas
 import pandas as pd
+from shapely.geometry import Polygon
 
 from card_live_dashboard.service.GeographicRegionCodesService import GeographicRegionCodesService
 
@@ -75,3 +78,96 @@ def test_add_region_standard_names_no_missing_mappings():
     assert [15, -1, 0] == new_data['region_codes'].tolist()
     assert set(data.columns.tolist()).union(
         {'geo_area_name_standard', 'geo_area_toplevel_m49code'}) == set(new_data.columns.tolist())
+
+
+def test_regions_geojson():
+    world = geopandas.GeoDataFrame(
+        {'name': ['Region A', 'Region B'],
+         'un_m49_numeric': [15, 143],
+         'geometry': [Polygon([(0.0, 0.0), (10.123456, 0.0), (10.123456, 10.0), (5.0, 10.05), (0.0, 10.0)]),
+                      Polygon([(20.0, 20.0), (21.0, 20.0), (21.0, 21.0), (20.0, 21.0)])]},
+        index=pd.Index(['15', '143'], name='id'))
+
+    geojson = region_codes.regions_geojson(world, tolerance=0.1, precision=2)
+
+    assert 'FeatureCollection' == geojson['type']
+    assert 2 == len(geojson['features'])
+    assert ['15', '143'] == [f['id'] for f in geojson['features']]
+    assert [15, 143] == [f['properties']['un_m49_numeric'] for f in geojson['features']]
+    assert ['Region A', 'Region B'] == [f['properties']['name'] for f in geojson['features']]
+
+    # Point (5.0, 10.05) removed by simplification and coordinates rounded
+    assert [[[0.0, 0.0], [10.12, 0.0], [10.12, 10.0], [0.0, 10.0], [0.0, 0.0]]] == geojson['features'][0]['geometry'][
+        'coordinates']
+    assert [[[20.0, 20.0], [21.0, 20.0], [21.0, 21.0], [20.0, 21.0], [20.0, 20.0]]] == geojson['features'][1][
+        'geometry']['coordinates']
+
+
+def test_get_un_m49_regions_geojson_cached(tmp_path, monkeypatch):
+    unm49_file = tmp_path / 'UNSD-Methodology.csv'
+    shutil.copy(Path(path.dirname(__file__), '..', '..', '..', 'service', 'data', 'UN-M49', 'UNSD-Methodology.csv'),
+                unm49_file)
+
+    world = geopandas.GeoDataFrame(
+        {'name': ['Region A'],
+         'un_m49_numeric': [15],
+         'geometry': [Polygon([(0.0, 0.0), (10.0, 0.0), (10.0, 10.0), (0.0, 10.0)])]},
+        index=pd.Index(['15'], name='id'))
+    builds = []
+
+    def get_un_m49_regions_naturalearth(self):
+        builds.append(1)
+        return world
+
+    monkeypatch.setattr(GeographicRegionCodesService, 'get_un_m49_regions_naturalearth',
+                        get_un_m49_regions_naturalearth)
+    cached_region_codes = GeographicRegionCodesService(unm49_file)
+    cache_dir = tmp_path / 'cache'
+
+    geojson = cached_region_codes.get_un_m49_regions_geojson(cache_dir=cache_dir)
+    assert 1 == len(builds)
+    assert 1 == len(list(cache_dir.glob('un-m49-regions-*.json')))
+
+    assert geojson == cached_region_codes.get_un_m49_regions_geojson(cache_dir=cache_dir)
+    assert 1 == len(builds)
+
+    # Different parameters or inputs are built again, replacing the cached regions
+    cached_region_codes.get_un_m49_regions_geojson(cache_dir=cache_dir, precision=1)
+    assert 2 == len(builds)
+
+    with open(unm49_file, 'a') as f:
+        f.write('\n')
+    cached_region_codes.get_un_m49_regions_geojson(cache_dir=cache_dir)
+    assert 3 == len(builds)
+    assert 1 == len(list(cache_dir.glob('un-m49-regions-*.json')))
+
+    # Not cached
+    cached_region_codes.get_un_m49_regions_geojson()
+    assert 4 == len(builds)
+
+
+def test_add_region_standard_names_mapping_once_per_code():
+    region_codes = GeographicRegionCodesService(Path(path.dirname(__file__), '..', '..', '..',
+                                                     'service', 'data', 'UN-M49', 'UNSD-Methodology.csv'),
+                                                use_default_additional_mappings=False)
+    mapped_codes = []
+
+    def mapping(x):
+        mapped_codes.append(x)
+        return f'Unknown {x}'
+
+    region_codes.insert_geo_name_na_mapping(mapping)
+
+    # Unnamed index and not in any particular order
+    data = pd.DataFrame({'region_codes': [-1, 15, -1, 10000, -1]}, index=[4, 3, 2, 1, 0])
+
+    new_data = region_codes.add_region_standard_names(data, 'region_codes')
+    assert [4, 3, 2, 1, 0] == new_data.index.tolist()
+    assert ['Unknown -1', 'Northern Africa', 'Unknown -1', 'Unknown 10000',
+            'Unknown -1'] == new_data['geo_area_name_standard'].tolist()
+    assert [-1, 10000] == mapped_codes
+    assert [False, True, False, False, False] == new_data['geo_area_toplevel_m49code'].notna().tolist()
+    assert '15' == new_data.at[3, 'geo_area_toplevel_m49code']
+
+    region_codes.add_region_standard_names(data, 'region_codes')
+    assert [-1, 10000] == mapped_codes
@@ -0,0 +1,28 @@
+from card_live_dashboard.service.LoadProgress import LoadProgress
+
+
+def test_load_progress():
+    progress = LoadProgress()
+    assert progress.as_dict()['stage'] is None
+
+    progress.start('reading files', total=3)
+    progress.advance()
+    progress.advance()
+    status = progress.as_dict()
+    assert ('reading files', 2, 3) == (status['stage'], status['done'], status['total'])
+
+    progress.start('building tables')
+    progress.advance()
+    status = progress.as_dict()
+    assert ('building tables', None, None) == (status['stage'], status['done'], status['total'])
+    assert status['elapsed'] >= 0
+
+
+def test_load_progress_after_fork_in_child():
+    progress = LoadProgress()
+    progress.start('reading files', total=3)
+
+    # As if another thread was updating the progress when forking
+    progress._lock.acquire()
+    progress.after_fork_in_child()
+    assert 'reading files' == progress.as_dict()['stage']
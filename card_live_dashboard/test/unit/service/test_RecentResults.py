@@ -0,0 +1,52 @@
+import pytest
+
+from card_live_dashboard.service.RecentResults import RecentResults
+
+
+def selections(**values):
+    return tuple(sorted(values.items()))
+
+
+def test_nearest_same_selections():
+    results = RecentResults()
+    results.add('data1', selections(a=1, b=2), 'result1')
+    results.add('data1', selections(a=2, b=2), 'result2')
+
+    assert (selections(a=1, b=2), 'result1') == results.nearest('data1', selections(a=1, b=2))
+
+
+def test_nearest_fewest_differences():
+    results = RecentResults()
+    results.add('data1', selections(a=1, b=1, c=1), 'result1')
+    results.add('data1', selections(a=2, b=2, c=1), 'result2')
+
+    assert 'result1' == results.nearest('data1', selections(a=1, b=1, c=2))[1]
+    assert 'result2' == results.nearest('data1', selections(a=2, b=2, c=2))[1]
+
+
+def test_nearest_ties_most_recent():
+    results = RecentResults()
+    results.add('data1', selections(a=1), 'result1')
+    results.add('data1', selections(a=2), 'result2')
+
+    assert 'result2' == results.nearest('data1', selections(a=3))[1]
+
+
+def test_nearest_other_data():
+    results = RecentResults()
+    results.add('data1', selections(a=1), 'result1')
+
+    assert results.nearest('data2', selections(a=1)) is None
+
+
+def test_max_size():
+    results = RecentResults(max_size=2)
+    results.add('data1', selections(a=1), 'result1')
+    results.add('data1', selections(a=2), 'result2')
+    results.add('data1', selections(a=3), 'result3')
+
+    assert 'result2' == results.nearest('data1', selections(a=2))[1]
+    assert 'result3' == results.nearest('data1', selections(a=1))[1]
+
+    with pytest.raises(Exception):
+        RecentResults(max_size=0)
@@ -0,0 +1,229 @@
+import fcntl
+import hashlib
+import os
+import threading
+import time
+
+import pytest
+
+from card_live_dashboard.service.RequestCoalescer import RequestCoalescer
+
+
+class SlowComputation:
+    """
+    A computation which blocks until released, keeping track of how many times it was run.
+    """
+
+    def __init__(self, result='result'):
+        self.calls = 0
+        self.result = result
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        return self.result
+
+
+def run_in_threads(funcs):
+    results = [None] * len(funcs)
+
+    def run(i):
+        results[i] = funcs[i]()
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(funcs))]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_run_single():
+    coalescer = RequestCoalescer()
+    assert 'value' == coalescer.run('key', lambda: 'value')
+
+
+def test_run_invalid_timeout():
+    with pytest.raises(Exception):
+        RequestCoalescer(timeout=0)
+
+
+def test_run_same_key_coalesced():
+    coalescer = RequestCoalescer()
+    computation = SlowComputation()
+
+    threads, results = run_in_threads([lambda: coalescer.run('key', computation)])
+    computation.started.wait(5)
+    more_threads, more_results = run_in_threads([lambda: coalescer.run('key', computation)] * 4)
+    time.sleep(0.1)
+    computation.release.set()
+    for thread in threads + more_threads:
+        thread.join(5)
+
+    assert 1 == computation.calls
+    assert ['result'] == results
+    assert ['result'] * 4 == more_results
+
+
+def test_run_different_keys_not_coalesced():
+    coalescer = RequestCoalescer()
+    computation = SlowComputation()
+    computation.release.set()
+
+    assert 'result' == coalescer.run('key1', computation)
+    assert 'result' == coalescer.run('key2', computation)
+    assert 2 == computation.calls
+
+
+def test_run_timeout_fallback():
+    coalescer = RequestCoalescer(timeout=0.1)
+    computation = SlowComputation()
+
+    threads, results = run_in_threads([lambda: coalescer.run('key', computation)])
+    computation.started.wait(5)
+
+    assert 'other' == coalescer.run('key', lambda: 'other')
+
+    computation.release.set()
+    threads[0].join(5)
+    assert ['result'] == results
+
+
+def test_run_leader_exception_fallback():
+    coalescer = RequestCoalescer()
+    started = threading.Event()
+    release = threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise Exception('failed')
+
+    errors = []
+
+    def run_failing():
+        try:
+            coalescer.run('key', failing)
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run_failing)
+    thread.start()
+    started.wait(5)
+
+    threads, results = run_in_threads([lambda: coalescer.run('key', lambda: 'fallback')])
+    time.sleep(0.1)
+    release.set()
+    for t in [thread] + threads:
+        t.join(5)
+
+    assert 1 == len(errors)
+    assert ['fallback'] == results
+
+
+def test_run_coalesced_across_processes(tmp_path):
+    # Separate RequestCoalescer objects share nothing in memory, so this only coalesces through the lock directory
+    coalescer1 = RequestCoalescer(lock_dir=tmp_path)
+    coalescer2 = RequestCoalescer(lock_dir=tmp_path)
+    computation = SlowComputation(result={'figure': [1, 2, 3]})
+
+    threads, results = run_in_threads([lambda: coalescer1.run(('key', 1), computation)])
+    computation.started.wait(5)
+    more_threads, more_results = run_in_threads([lambda: coalescer2.run(('key', 1), computation)])
+    time.sleep(0.2)
+    computation.release.set()
+    for thread in threads + more_threads:
+        thread.join(5)
+
+    assert 1 == computation.calls
+    assert [{'figure': [1, 2, 3]}] == results
+    assert [{'figure': [1, 2, 3]}] == more_results
+
+
+def test_run_across_processes_no_waiters_no_result(tmp_path):
+    coalescer = RequestCoalescer(lock_dir=tmp_path)
+    assert 'value' == coalescer.run('key', lambda: 'value')
+    assert [] == list(tmp_path.glob('*.pickle'))
+
+
+def test_run_across_processes_different_key_sharing_lock_not_waiting(tmp_path):
+    coalescer1 = RequestCoalescer(lock_dir=tmp_path)
+    coalescer2 = RequestCoalescer(lock_dir=tmp_path)
+    # All keys share the same lock file
+    coalescer1.LOCK_STRIPE_CHARS = 0
+    coalescer2.LOCK_STRIPE_CHARS = 0
+    computation = SlowComputation()
+
+    threads, results = run_in_threads([lambda: coalescer1.run('key1', computation)])
+    computation.started.wait(5)
+
+    start_time = time.monotonic()
+    assert 'other' == coalescer2.run('key2', lambda: 'other')
+    assert time.monotonic() - start_time < 1
+
+    computation.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert ['result'] == results
+    assert [] == list(tmp_path.glob('*.running'))
+
+
+def test_run_across_processes_removes_expired_files(tmp_path):
+    coalescer = RequestCoalescer(timeout=1, lock_dir=tmp_path)
+    expired_time = time.time() - 10
+    for name in ['a.running', 'b.waiting', 'c.pickle']:
+        (tmp_path / name).touch()
+        os.utime(tmp_path / name, (expired_time, expired_time))
+    (tmp_path / 'd.waiting').touch()
+
+    # Expired files are only removed once per timeout
+    assert 'value' == coalescer.run('key', lambda: 'value')
+    assert 3 == len(list(tmp_path.glob('[abc].*')))
+
+    coalescer._last_cleanup -= 1
+    assert 'value' == coalescer.run('key', lambda: 'value')
+    assert [] == list(tmp_path.glob('[abc].*'))
+    assert (tmp_path / 'd.waiting').exists()
+
+
+def test_run_across_processes_waits_on_own_key(tmp_path):
+    coalescer = RequestCoalescer(lock_dir=tmp_path)
+    coalescer.LOCK_STRIPE_CHARS = 0
+    digest = hashlib.sha1(repr('key').encode('utf-8')).hexdigest()
+
+    # Another process is computing 'key', and the shared lock stays held (e.g., by a computation for another key)
+    # after the result for 'key' is written
+    with open(tmp_path / '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        (tmp_path / f'{digest}.running').touch()
+
+        threads, results = run_in_threads([lambda: coalescer.run('key', lambda: 'direct')])
+        for i in range(100):
+            if (tmp_path / f'{digest}.waiting').exists():
+                break
+            time.sleep(0.01)
+
+        start_time = time.monotonic()
+        coalescer._write_result(tmp_path / f'{digest}.pickle', 'shared')
+        (tmp_path / f'{digest}.running').unlink()
+        for thread in threads:
+            thread.join(5)
+
+        assert ['shared'] == results
+        assert time.monotonic() - start_time < 1
+        fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def test_read_result_not_writable_by_others(tmp_path):
+    coalescer = RequestCoalescer(lock_dir=tmp_path / 'run')
+    result_file = tmp_path / 'run' / 'result.pickle'
+    coalescer._write_result(result_file, 'shared')
+
+    assert 0o700 == (tmp_path / 'run').stat().st_mode & 0o777
+    assert ('shared',) == coalescer._read_result(result_file, 0)
+
+    os.chmod(result_file, 0o666)
+    assert coalescer._read_result(result_file, 0) is None
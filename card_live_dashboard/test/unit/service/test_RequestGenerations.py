@@ -0,0 +1,55 @@
+import pytest
+
+from card_live_dashboard.service.RequestGenerations import RequestCancelled, RequestGenerations
+
+
+def test_latest_request_not_cancelled():
+    generations = RequestGenerations()
+    checkpoint = generations.start('session1')
+
+    checkpoint()
+    checkpoint()
+
+
+def test_superseded_request_cancelled():
+    generations = RequestGenerations()
+    old_checkpoint = generations.start('session1')
+    new_checkpoint = generations.start('session1')
+
+    with pytest.raises(RequestCancelled):
+        old_checkpoint()
+    new_checkpoint()
+
+
+def test_other_sessions_not_cancelled():
+    generations = RequestGenerations()
+    checkpoint1 = generations.start('session1')
+    checkpoint2 = generations.start('session2')
+    generations.start(None)
+
+    checkpoint1()
+    checkpoint2()
+
+
+def test_no_session_never_cancelled():
+    generations = RequestGenerations()
+    checkpoint = generations.start(None)
+    generations.start(None)
+
+    checkpoint()
+
+
+def test_superseded_request_cancelled_across_processes(tmp_path):
+    # Separate instances sharing a state directory act like separate processes
+    generations1 = RequestGenerations(state_dir=tmp_path)
+    generations2 = RequestGenerations(state_dir=tmp_path)
+
+    old_checkpoint = generations1.start('session1')
+    other_checkpoint = generations1.start('session2')
+    new_checkpoint = generations2.start('session1')
+
+    with pytest.raises(RequestCancelled):
+        old_checkpoint()
+    new_checkpoint()
+    other_checkpoint()
+    assert 2 == len(list(tmp_path.glob('*.generation')))
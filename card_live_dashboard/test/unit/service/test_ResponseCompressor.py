@@ -0,0 +1,156 @@
+import gzip
+
+import flask
+import pytest
+
+from card_live_dashboard.service.ResponseCompressor import ResponseCompressor
+
+LARGE_CONTENT = '{"values": [' + ','.join(['1'] * 1000) + ']}'
+
+
+@pytest.fixture
+def client(tmp_path):
+    static_dir = tmp_path / 'static'
+    static_dir.mkdir()
+    (static_dir / 'large.css').write_text('body { margin: 0; }\n' * 100)
+    (static_dir / 'small.css').write_text('body { margin: 0; }\n')
+
+    app = flask.Flask(__name__, static_folder=str(static_dir), static_url_path='/assets')
+
+    @app.route('/large')
+    def large():
+        return flask.Response(LARGE_CONTENT, mimetype='application/json')
+
+    @app.route('/small')
+    def small():
+        return flask.Response('{}', mimetype='application/json')
+
+    @app.route('/binary')
+    def binary():
+        return flask.Response(b'0' * 2000, mimetype='application/zip')
+
+    ResponseCompressor(min_size=100, static_paths=['/assets/'], static_max_age=60).init_app(app)
+    return app.test_client()
+
+
+def test_compress_gzip(client):
+    response = client.get('/large', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'gzip' == response.headers['Content-Encoding']
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert LARGE_CONTENT == gzip.decompress(response.data).decode('utf-8')
+
+
+def test_compress_not_accepted(client):
+    response = client.get('/large')
+
+    assert 'Content-Encoding' not in response.headers
+    assert LARGE_CONTENT == response.data.decode('utf-8')
+
+
+def test_compress_gzip_rejected(client):
+    response = client.get('/large', headers={'Accept-Encoding': 'gzip;q=0'})
+
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_compress_below_min_size(client):
+    response = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in response.headers
+    assert b'{}' == response.data
+
+
+def test_compress_not_compressible_mimetype(client):
+    response = client.get('/binary', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_compress_static(client):
+    response = client.get('/assets/large.css', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'gzip' == response.headers['Content-Encoding']
+    assert 'body { margin: 0; }\n' * 100 == gzip.decompress(response.data).decode('utf-8')
+    assert response.headers['ETag'].endswith('-gzip"')
+    assert response.cache_control.public
+    assert 60 == response.cache_control.max_age
+
+    # Served from the cache the second time
+    response2 = client.get('/assets/large.css', headers={'Accept-Encoding': 'gzip'})
+    assert response.data == response2.data
+    assert response.headers['ETag'] == response2.headers['ETag']
+
+
+def test_compress_static_not_modified(client):
+    response = client.get('/assets/large.css', headers={'Accept-Encoding': 'gzip'})
+    response = client.get('/assets/large.css', headers={'Accept-Encoding': 'gzip',
+                                                        'If-None-Match': response.headers['ETag']})
+
+    assert 304 == response.status_code
+    assert b'' == response.data
+
+
+def test_compress_static_below_min_size(client):
+    response = client.get('/assets/small.css', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in response.headers
+    assert response.cache_control.public
+    assert 60 == response.cache_control.max_age
+
+
+def test_compress_static_ignores_query_string(client):
+    response = client.get('/assets/large.css?v=1', headers={'Accept-Encoding': 'gzip'})
+    response2 = client.get('/assets/large.css?v=2', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.data == response2.data
+    assert response.headers['ETag'] == response2.headers['ETag']
+
+
+def build_static_app(tmp_path, compressor, files):
+    static_dir = tmp_path / 'static'
+    static_dir.mkdir()
+    for i in range(files):
+        (static_dir / f'file{i}.css').write_text(f'/* {i} */\n' + 'body { margin: 0; }\n' * 100)
+
+    app = flask.Flask(__name__, static_folder=str(static_dir), static_url_path='/assets')
+
+    @app.route('/')
+    def index():
+        links = ''.join(f'<link rel="stylesheet" href="/assets/file{i}.css?m=1">' for i in range(files))
+        return f'<html><head>{links}<script src="https://example.com/external.js"></script></head></html>'
+
+    compressor.init_app(app, precompress_pages=['/'])
+    return app
+
+
+def test_compress_static_cache_size(tmp_path):
+    compressor = ResponseCompressor(min_size=100, static_paths=['/assets/'], static_cache_size=2)
+    client = build_static_app(tmp_path, compressor, files=0).test_client()
+    (tmp_path / 'static' / 'file0.css').write_text('body { margin: 0; }\n' * 100)
+    (tmp_path / 'static' / 'file1.css').write_text('body { margin: 1; }\n' * 100)
+    (tmp_path / 'static' / 'file2.css').write_text('body { margin: 2; }\n' * 100)
+
+    for path in ['/assets/file0.css', '/assets/file1.css', '/assets/file0.css', '/assets/file2.css']:
+        client.get(path, headers={'Accept-Encoding': 'gzip'})
+
+    # The least recently used file is removed
+    assert [('/assets/file0.css', 'gzip'), ('/assets/file2.css', 'gzip')] == list(compressor._static_cache.keys())
+
+
+def test_precompress(tmp_path):
+    compressor = ResponseCompressor(min_size=100, static_paths=['/assets/'])
+    build_static_app(tmp_path, compressor, files=3)
+
+    assert {f'/assets/file{i}.css' for i in range(3)} == {path for path, encoding in compressor._static_cache}
+    assert 'gzip' in {encoding for path, encoding in compressor._static_cache}
+
+
+def test_invalid_min_size():
+    with pytest.raises(Exception):
+        ResponseCompressor(min_size=-1)
+
+
+def test_invalid_static_cache_size():
+    with pytest.raises(Exception):
+        ResponseCompressor(static_cache_size=0)
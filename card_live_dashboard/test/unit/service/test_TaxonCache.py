@@ -0,0 +1,72 @@
+import os
+
+from card_live_dashboard.service.TaxonCache import TaxonCache
+
+
+def build_taxa_file(tmp_path):
+    taxa_file = tmp_path / 'taxa.sqlite'
+    taxa_file.write_bytes(b'taxa')
+    return taxa_file
+
+
+def test_lookup_added(tmp_path):
+    taxa_file = build_taxa_file(tmp_path)
+    cache = TaxonCache(tmp_path / 'db', taxa_file)
+
+    assert {} == cache.lookup({28901, 543}, 'species')
+
+    cache.add({28901: ('28901', 'Salmonella enterica'), 1: ('1', None)}, 'species')
+
+    # Read by other caches (e.g., in other processes) for the same database
+    other_cache = TaxonCache(tmp_path / 'db', taxa_file)
+    assert {28901: ('28901', 'Salmonella enterica')} == other_cache.lookup({28901, 543}, 'species')
+    assert {1: ('1', None)} == other_cache.lookup({1}, 'species')
+    assert {} == other_cache.lookup({28901}, 'genus')
+
+
+def test_add_keeps_existing(tmp_path):
+    taxa_file = build_taxa_file(tmp_path)
+    cache = TaxonCache(tmp_path / 'db', taxa_file)
+
+    cache.add({28901: ('28901', 'Salmonella enterica')}, 'species')
+    TaxonCache(tmp_path / 'db', taxa_file).add({543: ('543', 'Enterobacteriaceae')}, 'species')
+
+    assert {28901: ('28901', 'Salmonella enterica'),
+            543: ('543', 'Enterobacteriaceae')} == cache.lookup({28901, 543}, 'species')
+
+
+def test_database_updated(tmp_path):
+    taxa_file = build_taxa_file(tmp_path)
+    cache = TaxonCache(tmp_path / 'db', taxa_file)
+    cache.add({28901: ('28901', 'Salmonella enterica')}, 'species')
+    assert 1 == len(list((tmp_path / 'db').glob('taxa-cache-*.json')))
+
+    stat = os.stat(taxa_file)
+    os.utime(taxa_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert {} == cache.lookup({28901}, 'species')
+
+    # Ids cached for the old database are removed
+    cache.add({543: ('543', 'Enterobacteriaceae')}, 'species')
+    assert 1 == len(list((tmp_path / 'db').glob('taxa-cache-*.json')))
+    assert {543: ('543', 'Enterobacteriaceae')} == cache.lookup({28901, 543}, 'species')
+
+
+def test_no_database(tmp_path):
+    cache = TaxonCache(tmp_path / 'db', tmp_path / 'taxa.sqlite')
+
+    cache.add({28901: ('28901', 'Salmonella enterica')}, 'species')
+    assert {} == cache.lookup({28901}, 'species')
+    assert not (tmp_path / 'db').exists()
+
+
+def test_invalid_cache_file(tmp_path):
+    taxa_file = build_taxa_file(tmp_path)
+    cache = TaxonCache(tmp_path / 'db', taxa_file)
+    cache.add({28901: ('28901', 'Salmonella enterica')}, 'species')
+
+    for cache_file in (tmp_path / 'db').glob('taxa-cache-*.json'):
+        cache_file.write_text('{invalid')
+    assert {} == cache.lookup({28901}, 'species')
+
+    cache.add({543: ('543', 'Enterobacteriaceae')}, 'species')
+    assert {543: ('543', 'Enterobacteriaceae')} == cache.lookup({28901, 543}, 'species')
@@ -1,8 +1,10 @@
+from collections import Counter
 from typing import List, Dict, Optional
 
 import pandas as pd
 from ete3 import NCBITaxa
 
+from card_live_dashboard.service.TaxonCache import TaxonCache
 from card_live_dashboard.service.TaxonomicParser import TaxonomicParser
 
 
@@ -19,18 +21,25 @@ class NCBITaxaMock(NCBITaxa):
     }
 
     def __init__(self):
-        pass
+        self.calls = Counter()
 
     def get_lineage(self, lineage: int) -> Optional[List[int]]:
+        self.calls['get_lineage'] += 1
         return [lineage]
 
+    def get_lineage_translator(self, taxids: List[int]) -> Dict[int, List[int]]:
+        self.calls['get_lineage_translator'] += 1
+        return {taxid: [taxid] for taxid in taxids if taxid in self.LINEAGES}
+
     def get_rank(self, lineages: List[int]) -> Dict[int, str]:
+        self.calls['get_rank'] += 1
         ranks = {}
         for lineage in lineages:
             ranks[lineage] = 'species'
         return ranks
 
     def get_taxid_translator(self, taxids: List[int], try_synonyms: bool = True) -> Dict[int, str]:
+        self.calls['get_taxid_translator'] += 1
         names = {}
         for id in taxids:
             names[id] = self.LINEAGES[id]
@@ -179,3 +188,88 @@ def test_taxonomic_parser_tie_case2():
     assert ['Salmonella enterica'] == file_matches['lmat.taxonomy_label'].tolist()
     assert ['Salmonella enterica'] == file_matches['rgi_kmer.taxonomy_label'].tolist()
     assert [True] == file_matches['matches'].tolist()
+
+
+def test_taxonomic_parser_resolves_distinct_taxa():
+    lmat_df = pd.DataFrame(columns=['filename', 'lmat.taxonomy_label', 'lmat.count', 'lmat.ncbi_taxon_id'],
+                           data=[
+                               ['file1', 'Salmonella enterica', '20', 28901],
+                               ['file1', 'Enterobacteriaceae', '10', 543],
+                               ['file2', 'Salmonella enterica', '20', 28901],
+                               ['file2', 'Unknown', '5', None],
+                               ['file3', 'Listeria monocytogenes', '10', 1639],
+                           ] * 100).set_index('filename')
+
+    rgi_kmer_df = pd.DataFrame(columns=['filename', 'rgi_kmer.CARD*kmer Prediction'],
+                               data=[
+                                   ['file1', 'Salmonella enterica (chromosome)'],
+                                   ['file2', 'Salmonella enterica (chromosome)'],
+                                   ['file3', 'Listeria monocytogenes (chromosome)'],
+                               ]).set_index('filename')
+
+    ncbi_taxa = NCBITaxaMock()
+    tax = TaxonomicParser(ncbi_taxa=ncbi_taxa, df_lmat=lmat_df, df_rgi_kmer=rgi_kmer_df)
+
+    assert {'get_lineage_translator': 1, 'get_rank': 1, 'get_taxid_translator': 1} == ncbi_taxa.calls
+
+    file_matches = tax.create_file_matches()
+    assert ['Salmonella enterica', 'Salmonella enterica', 'Listeria monocytogenes'] == file_matches[
+        'lmat.taxonomy_label'].tolist()
+    assert [True, True, True] == file_matches['matches'].tolist()
+
+
+def test_taxonomic_parser_lineage_not_in_batch():
+    lmat_df = pd.DataFrame(columns=['filename', 'lmat.taxonomy_label', 'lmat.count', 'lmat.ncbi_taxon_id'],
+                           data=[
+                               ['file1', 'Salmonella enterica', '20', 28901],
+                               ['file1', 'Merged', '10', 1],
+                               ['file1', 'Merged', '10', 1],
+                           ]).set_index('filename')
+
+    rgi_kmer_df = pd.DataFrame(columns=['filename', 'rgi_kmer.CARD*kmer Prediction'],
+                               data=[
+                                   ['file1', 'Salmonella enterica (chromosome)'],
+                               ]).set_index('filename')
+
+    # Ids not returned by the batched lookup (e.g., merged ids) are looked up individually
+    ncbi_taxa = NCBITaxaMock()
+    ncbi_taxa.get_lineage = lambda taxid: [28901]
+    tax = TaxonomicParser(ncbi_taxa=ncbi_taxa, df_lmat=lmat_df, df_rgi_kmer=rgi_kmer_df)
+
+    assert ['28901', '28901', '28901'] == tax._df_lmat['lmat.ncbi_taxon_id_adjusted'].tolist()
+    assert ['Salmonella enterica'] * 3 == tax._df_lmat['lmat.taxonomy_label_adjusted'].tolist()
+
+
+def test_taxonomic_parser_taxon_cache(tmp_path):
+    taxa_file = tmp_path / 'taxa.sqlite'
+    taxa_file.write_bytes(b'taxa')
+
+    lmat_df = pd.DataFrame(columns=['filename', 'lmat.taxonomy_label', 'lmat.count', 'lmat.ncbi_taxon_id'],
+                           data=[
+                               ['file1', 'Salmonella enterica', '20', 28901],
+                               ['file1', 'Enterobacteriaceae', '10', 543],
+                               ['file2', 'Unknown', '10', 1],
+                           ]).set_index('filename')
+
+    rgi_kmer_df = pd.DataFrame(columns=['filename', 'rgi_kmer.CARD*kmer Prediction'],
+                               data=[
+                                   ['file1', 'Salmonella enterica (chromosome)'],
+                               ]).set_index('filename')
+
+    ncbi_taxa = NCBITaxaMock()
+    ncbi_taxa.get_lineage = lambda taxid: [taxid]
+    ncbi_taxa.get_taxid_translator = lambda taxids: {
+        taxid: NCBITaxaMock.LINEAGES[taxid] for taxid in taxids if taxid in NCBITaxaMock.LINEAGES}
+    tax = TaxonomicParser(ncbi_taxa=ncbi_taxa, df_lmat=lmat_df, df_rgi_kmer=rgi_kmer_df,
+                          taxon_cache=TaxonCache(tmp_path, taxa_file))
+    assert 0 < sum(ncbi_taxa.calls.values())
+
+    # Taxonomic ids resolved before are not looked up in the database again
+    cached_ncbi_taxa = NCBITaxaMock()
+    cached_tax = TaxonomicParser(ncbi_taxa=cached_ncbi_taxa, df_lmat=lmat_df, df_rgi_kmer=rgi_kmer_df,
+                                 taxon_cache=TaxonCache(tmp_path, taxa_file))
+    assert 0 == sum(cached_ncbi_taxa.calls.values())
+
+    pd.testing.assert_frame_equal(tax._df_lmat, cached_tax._df_lmat)
+    assert ['Salmonella enterica', 'Enterobacteriaceae', pd.NA] == cached_tax._df_lmat[
+        'lmat.taxonomy_label_adjusted'].tolist()
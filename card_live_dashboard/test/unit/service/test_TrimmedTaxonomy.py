@@ -0,0 +1,99 @@
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from card_live_dashboard.service.CompactTaxonomy import CompactTaxonomy
+from card_live_dashboard.service.TaxonomicParser import TaxonomicParser
+from card_live_dashboard.service.TrimmedTaxonomy import TrimmedTaxonomy
+from card_live_dashboard.test.unit.service.test_CompactTaxonomy import SPECIES, build_taxa_file
+
+
+def trimmed_taxids(trimmed_taxa_file):
+    db = sqlite3.connect(trimmed_taxa_file)
+    try:
+        return ({taxid for taxid, in db.execute('SELECT taxid FROM species')},
+                {taxid for taxid, in db.execute('SELECT taxid_old FROM merged')})
+    finally:
+        db.close()
+
+
+def test_extend(tmp_path):
+    taxa_file = build_taxa_file(tmp_path)
+    trimmed_taxonomy = TrimmedTaxonomy(taxa_file, tmp_path / 'taxa-trimmed.sqlite')
+
+    assert 2 == trimmed_taxonomy.extend([28901, 1639, 777])
+    assert ({1, 2, 543, 590, 28901, 1637, 1639}, set()) == trimmed_taxids(tmp_path / 'taxa-trimmed.sqlite')
+
+    # Only new ids are added
+    assert 0 == trimmed_taxonomy.extend([28901, 543])
+    assert 2 == trimmed_taxonomy.extend([12345, 562])
+    assert ({1, 2, 543, 590, 28901, 90371, 99287, 561, 562, 1637, 1639}, {12345}) == trimmed_taxids(
+        tmp_path / 'taxa-trimmed.sqlite')
+
+
+def test_same_as_full(tmp_path):
+    taxa_file = build_taxa_file(tmp_path)
+    taxon_ids = [99287, 90371, 590, 562, 1639, 12345, 54321, 777]
+    trimmed_taxonomy = TrimmedTaxonomy(taxa_file, tmp_path / 'taxa-trimmed.sqlite')
+    trimmed_taxonomy.extend(taxon_ids)
+
+    lmat_df = pd.DataFrame(columns=['filename', 'lmat.taxonomy_label', 'lmat.count', 'lmat.ncbi_taxon_id'],
+                           data=[[f'file{i}', 'label', '10', taxon_id] for i, taxon_id in
+                                 enumerate(taxon_ids)]).set_index('filename')
+    rgi_kmer_df = pd.DataFrame(columns=['filename', 'rgi_kmer.CARD*kmer Prediction'],
+                               data=[['file1', 'Salmonella enterica (chromosome)']]).set_index('filename')
+
+    expected = TaxonomicParser(compact_taxonomy=CompactTaxonomy(taxa_file), df_lmat=lmat_df,
+                               df_rgi_kmer=rgi_kmer_df)._df_lmat
+    actual = TaxonomicParser(compact_taxonomy=CompactTaxonomy(tmp_path / 'taxa-trimmed.sqlite'), df_lmat=lmat_df,
+                             df_rgi_kmer=rgi_kmer_df)._df_lmat
+    pd.testing.assert_frame_equal(expected, actual)
+
+
+def test_full_database_updated(tmp_path):
+    taxa_file = build_taxa_file(tmp_path)
+    trimmed_taxonomy = TrimmedTaxonomy(taxa_file, tmp_path / 'taxa-trimmed.sqlite')
+    trimmed_taxonomy.extend([28901])
+
+    # 28901 is now a subspecies of a new species
+    build_taxa_file(tmp_path, species={**SPECIES, 28900: (590, 'Salmonella new', 'species'),
+                                       28901: (28900, 'Salmonella enterica', 'subspecies')})
+    stat = os.stat(taxa_file)
+    os.utime(taxa_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    trimmed_taxonomy.extend([1639])
+    species, merged = trimmed_taxids(tmp_path / 'taxa-trimmed.sqlite')
+    assert {28900, 28901, 1639} <= species
+    assert {28901: 28900} == CompactTaxonomy(tmp_path / 'taxa-trimmed.sqlite').limit_to_rank([28901], 'species')
+
+
+def test_no_full_database(tmp_path):
+    trimmed_taxonomy = TrimmedTaxonomy(tmp_path / 'taxa.sqlite', tmp_path / 'taxa-trimmed.sqlite')
+    with pytest.raises(Exception) as execinfo:
+        trimmed_taxonomy.extend([28901])
+    assert 'does not exist' in str(execinfo.value)
+
+    # Once built, the trimmed database can be used without the full database
+    taxa_file = build_taxa_file(tmp_path)
+    trimmed_taxonomy.extend([28901])
+    taxa_file.unlink()
+    assert 0 == trimmed_taxonomy.extend([1639])
+    assert {28901: 'Salmonella enterica'} == CompactTaxonomy(tmp_path / 'taxa-trimmed.sqlite').get_names([28901])
+
+
+def test_no_full_database_missing_ids(tmp_path, caplog):
+    taxa_file = build_taxa_file(tmp_path)
+    trimmed_taxonomy = TrimmedTaxonomy(taxa_file, tmp_path / 'taxa-trimmed.sqlite')
+    trimmed_taxonomy.extend([28901])
+    taxa_file.unlink()
+
+    # Ids already in the trimmed database are not reported
+    trimmed_taxonomy.extend([28901])
+    assert [] == [r for r in caplog.records if r.levelname == 'ERROR']
+
+    assert 0 == trimmed_taxonomy.extend([28901, 1639])
+    errors = [r.getMessage() for r in caplog.records if r.levelname == 'ERROR']
+    assert 1 == len(errors)
+    assert '[1639]' in errors[0]
@@ -0,0 +1,40 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+# Slow to import, so only imported when first used (e.g., when loading the data or building the map geometry)
+LAZY_MODULES = ['geopandas', 'shapely', 'ete3', 'upsetplot', 'matplotlib', 'apscheduler']
+
+# Maximum time (in seconds) to import the application (mostly dash and pandas). Generous so that it only fails if
+# something slow is imported again, not because the machine running the tests is slow.
+IMPORT_TIME_BUDGET = 4
+
+
+def import_module(module: str) -> dict:
+    """
+    Imports a module in a new Python process.
+    :param module: The name of the module.
+    :return: A dictionary with the time (in seconds) taken to import the module and the lazily imported modules that
+             were imported.
+    """
+    code = ('import json, sys, time\n'
+            't = time.perf_counter()\n'
+            f'import {module}\n'
+            'imported = sorted({m.split(".")[0] for m in sys.modules} & set(json.loads(sys.argv[1])))\n'
+            'print(json.dumps({"time": time.perf_counter() - t, "imported": imported}))\n')
+    output = subprocess.run([sys.executable, '-W', 'ignore', '-c', code, json.dumps(LAZY_MODULES)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize('module', ['card_live_dashboard.app', 'card_live_dashboard.model',
+                                    'card_live_dashboard.service.CardLiveDataManager'])
+def test_lazy_imports(module):
+    assert [] == import_module(module)['imported']
+
+
+def test_import_time_budget():
+    import_time = min(import_module('card_live_dashboard.app')['time'] for i in range(2))
+    assert import_time < IMPORT_TIME_BUDGET
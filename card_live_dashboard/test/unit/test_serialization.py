@@ -0,0 +1,131 @@
+import importlib
+import inspect
+import json
+
+import dash
+import dash_html_components as html
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+from dash import Input, Output
+
+import card_live_dashboard.serialization as serialization
+
+
+def test_dumps_numpy():
+    obj = {
+        'ints': np.arange(3),
+        'floats': np.array([1.5, np.nan]),
+        'strings': np.array(['a', 'b'], dtype=object),
+        'not_contiguous': np.arange(6).reshape(2, 3)[:, 0],
+        'scalar': np.int64(5),
+    }
+
+    assert {'ints': [0, 1, 2], 'floats': [1.5, None], 'strings': ['a', 'b'], 'not_contiguous': [0, 3],
+            'scalar': 5} == json.loads(serialization.dumps(obj))
+
+
+def test_dumps_pandas():
+    obj = {
+        'series': pd.Series([1, 2]),
+        'index': pd.Index(['a', 'b']),
+        'timestamp': pd.Timestamp('2020-08-01 10:00:00'),
+        'datetimes': pd.to_datetime(['2020-08-01 10:00:00']),
+    }
+
+    assert {'series': [1, 2], 'index': ['a', 'b'], 'timestamp': '2020-08-01T10:00:00',
+            'datetimes': ['2020-08-01T10:00:00']} == json.loads(serialization.dumps(obj))
+
+
+def test_to_json_same_as_plotly():
+    fig = go.Figure(go.Bar(x=np.array(['a', 'b'], dtype=object), y=np.array([1, 2])))
+    obj = {'response': {'figure': fig, 'children': html.Div(['text', html.B('bold')])}}
+
+    assert json.loads(pio.json.to_json_plotly(obj)) == json.loads(serialization.to_json(obj))
+
+
+def test_loads():
+    assert {'a': [1, 2]} == serialization.loads(b'{"a": [1, 2]}')
+
+
+def undo_install(monkeypatch):
+    # Restores the functions install() replaces in Dash when the test finishes, so other tests are not affected
+    for module_name in serialization.DASH_SERIALIZING_MODULES:
+        module = importlib.import_module(module_name)
+        monkeypatch.setattr(module, 'to_json', module.to_json)
+
+
+def test_patch_targets_exist():
+    # Fails if an upgrade of dash or plotly removes what the serialization relies on
+    for module_name in serialization.DASH_SERIALIZING_MODULES:
+        module = importlib.import_module(module_name)
+        assert callable(module.to_json), module_name
+        # Replacing to_json only has an effect if the module calls it by this name
+        assert 'to_json(' in inspect.getsource(module), module_name
+
+    fig = go.Figure(go.Bar(x=['a'], y=[1]))
+    assert fig.to_plotly_json()['data'] == fig._data
+    assert fig.to_plotly_json()['layout'] == fig._layout
+
+
+def test_install(monkeypatch):
+    undo_install(monkeypatch)
+    app = dash.Dash(__name__)
+    serialization.install(app)
+
+    with app.server.app_context():
+        assert '{"a":[1,2]}' == app.server.json.dumps({'a': np.array([1, 2])})
+
+
+def test_install_callback_responses(monkeypatch):
+    undo_install(monkeypatch)
+    app = dash.Dash(__name__)
+    app.layout = html.Div([html.Div(id='input'), html.Div(id='output')])
+
+    @app.callback(Output('output', 'children'), Input('input', 'children'))
+    def update(value):
+        return 'updated'
+
+    serialization.install(app)
+    calls = []
+    dumps = serialization.dumps
+    monkeypatch.setattr(serialization, 'dumps', lambda obj: calls.append(obj) or dumps(obj))
+
+    response = app.server.test_client().post('/_dash-update-component', json={
+        'output': 'output.children', 'outputs': {'id': 'output', 'property': 'children'},
+        'inputs': [{'id': 'input', 'property': 'children', 'value': None}], 'changedPropIds': ['input.children'],
+    })
+
+    assert 200 == response.status_code
+    assert 'updated' == response.get_json()['response']['output']['children']
+    assert {'output': {'children': 'updated'}} == calls[-1]['response']
+
+
+def test_install_layout_responses(monkeypatch):
+    undo_install(monkeypatch)
+    app = dash.Dash(__name__)
+    app.layout = html.Div(id='layout')
+
+    @app.callback(Output('layout', 'children'), Input('layout', 'id'))
+    def update(value):
+        return value
+
+    serialization.install(app)
+    calls = []
+    dumps = serialization.dumps
+    monkeypatch.setattr(serialization, 'dumps', lambda obj: calls.append(obj) or dumps(obj))
+    client = app.server.test_client()
+
+    # Fails if Dash stops serializing the index page, the layout or the callback list with the replaced to_json
+    assert 200 == client.get('/').status_code
+    assert any(isinstance(obj, dict) and 'url_base_pathname' in obj for obj in calls)
+
+    calls.clear()
+    assert 200 == client.get('/_dash-layout').status_code
+    assert [app.layout] == calls
+
+    calls.clear()
+    assert 200 == client.get('/_dash-dependencies').status_code
+    assert 1 == len(calls)
+    assert 'layout.children' == calls[0][0]['output']
@@ -30,11 +30,12 @@ setup(name='card-live-dashboard',
           'pandas',
           'geopandas',
           'numpy',
-          'dash',
+          'orjson',
+          'dash>=2.9,<3',
           'upsetplot',
-          'flask',
+          'flask>=2.2',
           'dash-bootstrap-components',
-          'plotly',
+          'plotly>=5,<6',
           'shapely',
           'gunicorn',
           'pytest',
@@ -48,5 +49,6 @@ setup(name='card-live-dashboard',
       scripts=['bin/card-live-dash-dev',
                'bin/card-live-dash-prod',
                'bin/card-live-dash-profiler',
-               'bin/card-live-dash-init'],
+               'bin/card-live-dash-init',
+               'bin/card-live-dash-trim-taxonomy'],
       )